@@ -1 +1,13 @@
-# Settings module
\ No newline at end of file
+# Settings module
+import os
+
+
+def default_settings_module():
+    """
+    Settings por defecto de manage.py y de los scripts que configuran Django
+    por su cuenta: producción en PythonAnywhere, desarrollo en local
+    """
+    if 'pythonanywhere.com' in os.environ.get('SERVER_NAME', '') or \
+       os.environ.get('PYTHONANYWHERE_DOMAIN'):
+        return "apyma_site.settings.production"
+    return "apyma_site.settings.development"
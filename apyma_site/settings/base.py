@@ -54,6 +54,7 @@ TEMPLATES = [
                 "django.template.context_processors.media",
                 "django.template.context_processors.i18n",
                 "usuarios.context_processors.css_version",
+                "usuarios.context_processors.public_page_csrf",
             ],
         },
     },
@@ -106,6 +107,25 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Envío de archivos de media delegado al servidor web (ver docs/MEDIA_OFFLOAD.md)
+# None: Django transmite el archivo | 'nginx': X-Accel-Redirect | 'apache': X-Sendfile
+MEDIA_OFFLOAD = None
+# Location "internal" de nginx que apunta a MEDIA_ROOT
+MEDIA_OFFLOAD_PREFIX = '/protected-media/'
+
+# /media/ se sirve en la capa WSGI, antes de los middleware de Django
+# (usuarios/media_wsgi.py). Las URLs sin ?v= se cachean estos segundos
+MEDIA_WSGI = True
+MEDIA_CACHE_MAX_AGE = 3600
+
+# Archivos subidos que esperan a ser procesados por el worker procesar_tareas
+# (fuera de MEDIA_ROOT para que no se puedan descargar)
+TAREAS_UPLOAD_DIR = BASE_DIR / 'tareas_pendientes'
+
+# Anchos (px) de las imágenes que se generan de cada página de los menús para
+# mostrarlas con srcset. Necesita pdftoppm (poppler-utils); lista vacía para desactivarlo
+MENU_IMAGENES_ANCHOS = [480, 960, 1600]
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
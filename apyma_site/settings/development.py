@@ -21,6 +21,9 @@ DATABASES = {
     }
 }
 
+# Para probar el envío delegado con un nginx local (docs/MEDIA_OFFLOAD.md)
+MEDIA_OFFLOAD = config('MEDIA_OFFLOAD', default='') or None
+
 # Email Configuration para desarrollo
 # Para desarrollo, usa el backend de consola para ver emails en terminal
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -124,6 +124,19 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Delegar el envío de PDFs e imágenes a nginx/Apache si hay proxy delante
+MEDIA_OFFLOAD = config('MEDIA_OFFLOAD', default='') or None
+MEDIA_OFFLOAD_PREFIX = config('MEDIA_OFFLOAD_PREFIX', default='/protected-media/')
+
+# Caché compartida por todos los procesos del servidor (la de memoria es por
+# proceso y no vería las invalidaciones hechas desde otro worker)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+    }
+}
+
 # Configuración adicional de seguridad
 SECURE_HSTS_SECONDS = 31536000  # 1 año
 SECURE_HSTS_INCLUDE_SUBDOMAINS = True
@@ -15,12 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
-from usuarios.views import simple_set_language
+from usuarios.views import serve_media, simple_set_language
 
 # Personalizar el admin site
 admin.site.site_header = 'Administración APYMA Remontival'
@@ -38,8 +40,13 @@ urlpatterns += i18n_patterns(
 )
 
 # Servir archivos de media
-# En desarrollo y también en producción simple (PythonAnywhere)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Normalmente no llegan aquí: apyma_site/wsgi.py los sirve antes de Django
+# (usuarios/media_wsgi.py). Esta vista queda para MEDIA_WSGI = False y el
+# cliente de pruebas. Valida la ruta y, si MEDIA_OFFLOAD está configurado,
+# delega el envío a nginx/Apache
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='serve_media'),
+]
 
 # Servir archivos estáticos adicionales si es necesario
 if settings.DEBUG:
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "apyma_site.settings.production")
 
 application = get_wsgi_application()
+
+# /media/ se sirve antes de Django (sin sesión, idioma ni CSRF)
+from usuarios.media_wsgi import wrap_application  # noqa: E402
+
+application = wrap_application(application)
@@ -7,15 +7,12 @@ import sys
 def main():
     """Run administrative tasks."""
     # Detectar si estamos en PythonAnywhere (producción) o desarrollo local
-    if 'pythonanywhere.com' in os.environ.get('SERVER_NAME', '') or \
-       os.environ.get('PYTHONANYWHERE_DOMAIN'):
-        # Estamos en PythonAnywhere (producción)
+    from apyma_site.settings import default_settings_module
+    default_settings = default_settings_module()
+    if default_settings.endswith('.production'):
         print("Cargando configuración de producción...")
-        default_settings = "apyma_site.settings.production"
     else:
-        # Estamos en desarrollo local
         print("Cargando configuración de desarrollo...")
-        default_settings = "apyma_site.settings.development"
     
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", default_settings)
     try:
@@ -6,7 +6,6 @@ Script para descargar automáticamente los menús del comedor desde la web de El
 import os
 import sys
 import requests
-from urllib.parse import urlparse
 from datetime import datetime
 import django
 
@@ -15,6 +14,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apyma_site.settings')
 django.setup()
 
+from menu_fetch import DownloadError, build_session, download_pdf
+
 class MenuDownloader:
     def __init__(self):
         self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -29,29 +30,23 @@ class MenuDownloader:
             'septiembre_euskera': 'https://www.elgustodecrecer.es/Users/Menus/Archivos/20250908_135206_BASALA%20IRAILA%20in.pdf'
         }
         
+        # Sesión del motor común (User-Agent, keep-alive y reintentos con backoff)
+        self.session = build_session()
+        
     def download_file(self, url, filename):
         """Descarga un archivo desde una URL"""
         try:
             print(f"Descargando: {url}")
             
-            # Headers para simular un navegador
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()  # Lanza excepción si hay error HTTP
-            
-            # Guardar el archivo
+            # Descarga por bloques a un .part, reanudable y verificada antes de
+            # renombrarla al archivo final
             filepath = os.path.join(self.media_dir, filename)
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            result = download_pdf(self.session, url, filepath, timeout=30)
             
-            file_size = len(response.content)
-            print(f"✅ Descargado: {filename} ({file_size:,} bytes)")
+            print(f"✅ Descargado: {filename} ({result.size:,} bytes)")
             return True
             
-        except requests.RequestException as e:
+        except (requests.RequestException, DownloadError) as e:
             print(f"❌ Error descargando {filename}: {e}")
             return False
         except Exception as e:
@@ -6,20 +6,34 @@ Requiere credenciales de login para acceder al área personal
 
 import os
 import sys
-import requests
-from bs4 import BeautifulSoup
 import re
-from datetime import datetime, timedelta
-import django
-from urllib.parse import urljoin, urlparse
+from datetime import datetime
 import time
 import json
-from pypdf import PdfReader, PdfWriter
 
-# Configurar Django
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apyma_site.settings')
-django.setup()
+from menu_fetch import (
+    DatePatternStrategy, DirectoryListingStrategy, MenuFetchEngine, PersonalAreaStrategy, download_pdf
+)
+from menu_sources import MenuSourceCache
+
+def setup_django():
+    """
+    Configura Django la primera vez que hace falta (separar y registrar un
+    menú en el catálogo). Buscar y descargar no lo necesitan, así que importar
+    este módulo es rápido. Desde manage.py Django ya está configurado.
+    """
+    from django.apps import apps
+    if apps.ready:
+        return
+
+    import django
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if base_dir not in sys.path:
+        sys.path.append(base_dir)
+    # Mismos settings que manage.py (producción en PythonAnywhere, p. ej. desde cron)
+    from apyma_site.settings import default_settings_module
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings_module())
+    django.setup()
 
 class AutomatedMenuDownloader:
     def __init__(self, email=None, password=None):
@@ -32,14 +46,20 @@ class AutomatedMenuDownloader:
         # Configuración de login
         self.email = email
         self.password = password
-        self.base_url = "https://www.elgustodecrecer.es"
-        self.login_url = f"{self.base_url}/AreaPersonal"
         
-        # Sesión para mantener cookies
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
-        })
+        # Motor común: sesión compartida (keep-alive, reintentos, límite por host)
+        # y estrategias de búsqueda que se ejecutan en paralelo
+        self.personal_area = PersonalAreaStrategy(email, password)
+        self.engine = MenuFetchEngine([
+            DirectoryListingStrategy(),
+            DatePatternStrategy(),
+            self.personal_area,
+        ])
+        self.session = self.engine.session
+        
+        # ETag, Last-Modified y SHA-256 de los PDFs ya descargados y separados
+        self.source_cache = MenuSourceCache(os.path.join(self.base_dir, '.menu_sources.json'), self.media_dir)
+        self.force = False  # True para descargar y separar aunque no haya cambios
         
         # Archivo para guardar credenciales de forma segura
         self.credentials_file = os.path.join(self.base_dir, '.menu_credentials.json')
@@ -79,417 +99,64 @@ class AutomatedMenuDownloader:
     
     def login(self):
         """Realiza el login en el área personal"""
-        try:
-            print("🔐 Iniciando sesión en El Gusto de Crecer...")
-            
-            # Primero, obtener la página de login para extraer tokens CSRF si es necesario
-            response = self.session.get(self.login_url, timeout=30)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Buscar el formulario de login
-            login_form = soup.find('form')
-            if not login_form:
-                print("❌ No se encontró formulario de login")
-                return False
-            
-            # Extraer la action del formulario
-            form_action = login_form.get('action', '')
-            if form_action:
-                login_post_url = urljoin(self.base_url, form_action)
-            else:
-                login_post_url = self.login_url
-            
-            # Buscar campos ocultos (tokens CSRF, etc.)
-            hidden_fields = {}
-            for input_field in login_form.find_all('input', type='hidden'):
-                name = input_field.get('name')
-                value = input_field.get('value', '')
-                if name:
-                    hidden_fields[name] = value
-            
-            # Buscar los nombres de los campos de email y password
-            email_field = login_form.find('input', {'type': 'email'}) or login_form.find('input', {'name': re.compile(r'email|usuario|user', re.I)})
-            password_field = login_form.find('input', {'type': 'password'}) or login_form.find('input', {'name': re.compile(r'password|pass|contraseña', re.I)})
-            
-            if not email_field or not password_field:
-                print("❌ No se encontraron campos de email/password")
-                return False
-            
-            email_field_name = email_field.get('name', 'email')
-            password_field_name = password_field.get('name', 'password')
-            
-            # Datos del formulario
-            form_data = {
-                email_field_name: self.email,
-                password_field_name: self.password,
-                **hidden_fields
-            }
-            
-            print(f"📧 Enviando credenciales a: {login_post_url}")
-            
-            # Realizar el login
-            response = self.session.post(
-                login_post_url,
-                data=form_data,
-                timeout=30,
-                allow_redirects=True
-            )
-            response.raise_for_status()
-            
-            # Verificar si el login fue exitoso
-            # Buscar indicadores de login exitoso
-            success_indicators = [
-                'logout', 'cerrar sesión', 'salir', 'mi cuenta', 'perfil',
-                'área personal', 'dashboard', 'menús'
-            ]
-            
-            page_text = response.text.lower()
-            login_success = any(indicator in page_text for indicator in success_indicators)
-            
-            # También verificar si seguimos en la página de login
-            login_failed_indicators = [
-                'error de login', 'credenciales incorrectas', 'usuario o contraseña',
-                'email o password', 'acceso denegado'
-            ]
-            login_failed = any(indicator in page_text for indicator in login_failed_indicators)
-            
-            if login_failed:
-                print("❌ Login fallido: credenciales incorrectas")
-                return False
-            
-            if login_success or response.url != self.login_url:
-                print("✅ Login exitoso")
-                return True
-            else:
-                print("⚠️ Estado de login incierto, continuando...")
-                return True
-                
-        except Exception as e:
-            print(f"❌ Error durante el login: {e}")
-            return False
+        self.personal_area.email = self.email
+        self.personal_area.password = self.password
+        return self.personal_area.login(self.engine)
     
     def find_menu_links(self):
-        """Busca enlaces a menús en el área personal y URLs directas"""
-        try:
-            print("🔍 Buscando menús disponibles...")
-            
-            menu_links = []
-            
-            # Estrategia 1: Buscar en URLs directas conocidas (más confiable)
-            print("📁 Buscando en URLs directas conocidas...")
-            direct_menu_patterns = self.find_direct_menu_urls()
-            menu_links.extend(direct_menu_patterns)
-            
-            # Estrategia 2: Buscar en el área personal
-            print("🔐 Buscando en área personal...")
-            personal_area_links = self.find_personal_area_menus()
-            menu_links.extend(personal_area_links)
-            
-            # Eliminar duplicados
-            unique_links = []
-            seen_urls = set()
-            for link in menu_links:
-                if link['url'] not in seen_urls:
-                    unique_links.append(link)
-                    seen_urls.add(link['url'])
-            
-            return unique_links
-            
-        except Exception as e:
-            print(f"❌ Error buscando menús: {e}")
-            return []
-    
-    def find_direct_menu_urls(self):
-        """Busca menús usando patrones de URL directas conocidas"""
-        menu_links = []
-        
-        # Estrategia 1: Explorar el directorio de archivos para encontrar menús automáticamente
-        print("🔍 Explorando directorio de menús...")
-        discovered_menus = self.discover_menus_from_directory()
-        menu_links.extend(discovered_menus)
-        
-        # Estrategia 2: Patrones de URL basados en el formato conocido
-        print("📅 Buscando con patrones de fecha...")
-        pattern_menus = self.find_menus_by_date_patterns()
-        menu_links.extend(pattern_menus)
-        
-        return menu_links
-    
-    def discover_menus_from_directory(self):
-        """Intenta descubrir menús explorando el directorio web"""
-        menu_links = []
-        base_archive_url = f"{self.base_url}/Users/Menus/Archivos/"
-        
-        try:
-            # Intentar acceder al directorio de archivos
-            response = self.session.get(base_archive_url, timeout=30)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Buscar enlaces a archivos PDF
-                links = soup.find_all('a', href=True)
-                
-                for link in links:
-                    href = link.get('href')
-                    text = link.get_text(strip=True)
-                    
-                    # Filtrar solo PDFs de menús
-                    if (href and href.endswith('.pdf') and 
-                        any(keyword in href.upper() for keyword in ['BASAL', 'MENU', 'REMONTIVAL'])):
-                        
-                        # Extraer información del nombre del archivo
-                        full_url = urljoin(base_archive_url, href)
-                        
-                        # Intentar extraer el mes del nombre del archivo
-                        month_match = re.search(r'(ENERO|FEBRERO|MARZO|ABRIL|MAYO|JUNIO|JULIO|AGOSTO|SEPTIEMBRE|OCTUBRE|NOVIEMBRE|DICIEMBRE)', href.upper())
-                        
-                        if month_match:
-                            month_name = month_match.group(1).title()
-                            display_text = f"Menu {month_name} 2025"
-                        else:
-                            display_text = text or "Menu del Comedor"
-                        
-                        menu_links.append({
-                            'url': full_url,
-                            'text': display_text,
-                            'source_page': 'directory_listing'
-                        })
-                        print(f"✅ Descubierto en directorio: {display_text}")
-                        
-        except Exception as e:
-            print(f"⚠️ No se pudo explorar el directorio: {e}")
-        
-        return menu_links
+        """
+        Busca enlaces a menús con las estrategias del motor (directorio,
+        patrones de fecha y área personal) y se queda con la primera que
+        encuentra alguno
+        """
+        print("🔍 Buscando menús disponibles...")
+        return self.engine.find_menus()
     
-    def find_menus_by_date_patterns(self):
-        """Busca menús usando patrones de fecha inteligentes"""
-        menu_links = []
-        
-        # Patrones de URL basados en el formato conocido
-        current_date = datetime.now()
-        
-        # Generar posibles URLs para el mes actual y siguiente
-        months_to_check = [
-            (current_date.year, current_date.month),
-        ]
-        
-        # Si estamos en los últimos días del mes, también buscar el siguiente
-        if current_date.day > 25:
-            next_month = current_date.month + 1 if current_date.month < 12 else 1
-            next_year = current_date.year if current_date.month < 12 else current_date.year + 1
-            months_to_check.append((next_year, next_month))
-        
-        month_names = {
-            1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL', 5: 'MAYO', 6: 'JUNIO',
-            7: 'JULIO', 8: 'AGOSTO', 9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
-        }
-        
-        # Patrones de nombre de archivo más completos
-        file_patterns = [
-            'BASAL%20REMONTIVAL%20{month}',
-            'BASAL%20{month}',
-            'MENU%20REMONTIVAL%20{month}',
-            'MENU%20{month}',
-            'REMONTIVAL%20{month}',
-            '{month}%20REMONTIVAL',
-            '{month}%20BASAL'
-        ]
-        
-        base_archive_url = f"{self.base_url}/Users/Menus/Archivos/"
-        
-        for year, month in months_to_check:
-            month_name = month_names.get(month, '')
-            print(f"🗓️ Buscando menús para {month_name} {year}...")
-            
-            for pattern in file_patterns:
-                filename_part = pattern.format(month=month_name)
-                
-                # Generar posibles URLs con diferentes fechas del mes
-                # Buscar en fechas más probables primero
-                days_to_check = []
-                
-                # Si es el mes actual, buscar desde el día actual hacia atrás
-                if year == current_date.year and month == current_date.month:
-                    days_to_check = list(range(current_date.day, 0, -1))  # Del día actual hacia atrás
-                else:
-                    days_to_check = [1, 2, 3, 15, 30, 31]  # Días típicos de publicación
-                
-                for day in days_to_check[:10]:  # Limitar a 10 intentos por patrón
-                    if day > 31:
-                        continue
-                        
-                    date_prefix = f"{year:04d}{month:02d}{day:02d}"
-                    
-                    # Diferentes formatos de hora (ordenados por probabilidad)
-                    time_patterns = ['152623', '150000', '120000', '134856', '135206', '100000', '140000', '160000']
-                    
-                    for time_part in time_patterns:
-                        url_candidate = f"{base_archive_url}{date_prefix}_{time_part}_{filename_part}.pdf"
-                        
-                        try:
-                            # Verificar si la URL existe (HEAD request es más rápido)
-                            response = self.session.head(url_candidate, timeout=5)
-                            if response.status_code == 200:
-                                menu_links.append({
-                                    'url': url_candidate,
-                                    'text': f"Menu {month_name.title()} {year}",
-                                    'source_page': 'pattern_search'
-                                })
-                                print(f"✅ Encontrado por patrón: Menu {month_name.title()} {year}")
-                                # Una vez encontrado el menú del mes, pasar al siguiente mes
-                                break
-                        except:
-                            continue  # URL no existe, continuar
-                    else:
-                        continue  # No break, seguir con el siguiente tiempo
-                    break  # Se encontró, salir del loop de días
-                else:
-                    continue  # No break, seguir con el siguiente patrón
-                break  # Se encontró, salir del loop de patrones
-        
-        return menu_links
-    
-    def find_personal_area_menus(self):
-        """Busca menús en el área personal después del login"""
-        menu_links = []
-        
-        # Intentar diferentes URLs del área personal
-        possible_urls = [
-            f"{self.base_url}/AreaPersonal",
-            f"{self.base_url}/menus",
-            f"{self.base_url}/documentos",
-            f"{self.base_url}/descargas",
-            f"{self.base_url}/Users/Menus"
-        ]
-        
-        for url in possible_urls:
-            try:
-                response = self.session.get(url, timeout=30)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Buscar enlaces a PDFs de múltiples formas
-                    pdf_links = []
-                    
-                    # Método 1: Enlaces directos a PDF
-                    pdf_links.extend(soup.find_all('a', href=re.compile(r'\.pdf$', re.I)))
-                    
-                    # Método 2: Enlaces que contienen "pdf" en el href
-                    pdf_links.extend(soup.find_all('a', href=re.compile(r'pdf', re.I)))
-                    
-                    # Método 3: Buscar enlaces en el directorio de menús
-                    menu_dir_links = soup.find_all('a', href=re.compile(r'/Users/Menus/', re.I))
-                    pdf_links.extend(menu_dir_links)
-                    
-                    for link in pdf_links:
-                        href = link.get('href')
-                        text = link.get_text(strip=True)
-                        
-                        if not href:
-                            continue
-                            
-                        # Filtrar solo menús (buscar palabras clave)
-                        menu_keywords = ['menu', 'menú', 'comedor', 'basal', 'alimentación', 'remontival']
-                        text_lower = text.lower()
-                        href_lower = href.lower()
-                        
-                        if (any(keyword in text_lower for keyword in menu_keywords) or
-                            any(keyword in href_lower for keyword in menu_keywords)):
-                            
-                            full_url = urljoin(self.base_url, href)
-                            menu_links.append({
-                                'url': full_url,
-                                'text': text or 'Menu del comedor',
-                                'source_page': url
-                            })
-                            
-            except Exception as e:
-                print(f"⚠️ Error verificando {url}: {e}")
-                continue
-        
-        return menu_links
+    def extract_year(self, menu_text):
+        """Extrae el año del texto del menú (p. ej. 'Menu Enero 2026') o usa el actual"""
+        year_match = re.search(r'(20\d{2})', menu_text)
+        if year_match:
+            return int(year_match.group(1))
+        return datetime.now().year
     
     def split_menu_pdf(self, pdf_path, menu_text):
-        """Separa un PDF de menú en castellano y euskera"""
+        """
+        Separa un PDF de menú en un PDF por idioma (más 'adicional' si sobran páginas).
+        Retorna la lista de archivos creados, o False si no se pudo separar.
+        """
+        setup_django()
+        from usuarios.menu_catalog import MESES, mes_numero
+        from usuarios.menu_split import MenuSplitError, split_menu
+        
         try:
             print(f"📄 Separando páginas del PDF: {os.path.basename(pdf_path)}")
             
-            # Leer el PDF
-            reader = PdfReader(pdf_path)
-            total_pages = len(reader.pages)
-            
-            print(f"   Total de páginas: {total_pages}")
-            
-            if total_pages < 2:
-                print(f"⚠️ El PDF solo tiene {total_pages} página(s), no se puede separar")
-                return False
-            
             # Extraer el mes del texto del menú
             month_match = re.search(r'(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)', menu_text.lower())
             if month_match:
                 month_name = month_match.group(1)
             else:
                 # Fallback: usar mes actual
-                month_names = {
-                    1: 'enero', 2: 'febrero', 3: 'marzo', 4: 'abril', 5: 'mayo', 6: 'junio',
-                    7: 'julio', 8: 'agosto', 9: 'septiembre', 10: 'octubre', 11: 'noviembre', 12: 'diciembre'
-                }
-                month_name = month_names.get(datetime.now().month, 'mes')
+                month_name = MESES[datetime.now().month - 1]
             
-            # Crear directorio base para los archivos separados
-            base_dir = os.path.dirname(pdf_path)
+            year = self.extract_year(menu_text)
             
-            # Crear PDF para castellano (primera página)
-            castellano_filename = f"menu_{month_name}_castellano.pdf"
-            castellano_path = os.path.join(base_dir, castellano_filename)
+            # Se preparan todos los PDFs y se publican a la vez; si algo falla
+            # no se toca ningún menú publicado
+            creados = split_menu(pdf_path, year, mes_numero(month_name), destino=self.media_dir)
+            for filename in creados:
+                print(f"✅ Creado: {filename}")
             
-            writer_castellano = PdfWriter()
-            writer_castellano.add_page(reader.pages[0])
-            
-            with open(castellano_path, 'wb') as output_file:
-                writer_castellano.write(output_file)
-            
-            print(f"✅ Creado: {castellano_filename}")
-            
-            # Crear PDF para euskera (segunda página)
-            euskera_filename = f"menu_{month_name}_euskera.pdf"
-            euskera_path = os.path.join(base_dir, euskera_filename)
-            
-            writer_euskera = PdfWriter()
-            writer_euskera.add_page(reader.pages[1])
-            
-            with open(euskera_path, 'wb') as output_file:
-                writer_euskera.write(output_file)
-            
-            print(f"✅ Creado: {euskera_filename}")
-            
-            # Si hay más páginas, crear un PDF con todas las páginas adicionales
-            if total_pages > 2:
-                extra_filename = f"menu_{month_name}_adicional.pdf"
-                extra_path = os.path.join(base_dir, extra_filename)
-                
-                writer_extra = PdfWriter()
-                for page_num in range(2, total_pages):
-                    writer_extra.add_page(reader.pages[page_num])
-                
-                with open(extra_path, 'wb') as output_file:
-                    writer_extra.write(output_file)
-                
-                print(f"✅ Creado: {extra_filename} (páginas adicionales)")
-            
-            # Opcional: eliminar el archivo original después de separar
+            # Eliminar el archivo original después de separar
             try:
                 os.remove(pdf_path)
                 print(f"🗑️ Eliminado archivo original: {os.path.basename(pdf_path)}")
             except:
                 print(f"⚠️ No se pudo eliminar el archivo original: {os.path.basename(pdf_path)}")
             
-            return True
+            return creados
             
-        except Exception as e:
+        except MenuSplitError as e:
             print(f"❌ Error separando PDF: {e}")
             return False
             
@@ -512,51 +179,32 @@ class AutomatedMenuDownloader:
             temp_filename = f"menu_{clean_text}_{current_month}_temp.pdf"
             temp_filepath = os.path.join(self.media_dir, temp_filename)
             
-            # Extraer nombre del mes para los archivos separados
-            month_match = re.search(r'(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)', text.lower())
-            if month_match:
-                month_name = month_match.group(1)
-            else:
-                # Fallback: usar mes actual
-                month_names = {
-                    1: 'enero', 2: 'febrero', 3: 'marzo', 4: 'abril', 5: 'mayo', 6: 'junio',
-                    7: 'julio', 8: 'agosto', 9: 'septiembre', 10: 'octubre', 11: 'noviembre', 12: 'diciembre'
-                }
-                month_name = month_names.get(datetime.now().month, 'mes')
-            
-            # Verificar si los archivos separados ya existen
-            castellano_filepath = os.path.join(self.media_dir, f"menu_{month_name}_castellano.pdf")
-            euskera_filepath = os.path.join(self.media_dir, f"menu_{month_name}_euskera.pdf")
+            # Petición condicional: si ya separamos este PDF y los archivos siguen
+            # en disco, el servidor puede responder 304 sin enviar nada.
+            # La descarga va por bloques a un .part que se verifica y se renombra
+            headers = {} if self.force else self.source_cache.conditional_headers(url)
+            result = download_pdf(self.session, url, temp_filepath, headers=headers)
             
-            if os.path.exists(castellano_filepath) and os.path.exists(euskera_filepath):
-                print(f"⏭️ Los archivos separados ya existen:")
-                print(f"   - {os.path.basename(castellano_filepath)}")
-                print(f"   - {os.path.basename(euskera_filepath)}")
-                
-                # Verificar tamaños para asegurarse de que están completos
-                castellano_size = os.path.getsize(castellano_filepath)
-                euskera_size = os.path.getsize(euskera_filepath)
-                
-                if castellano_size > 10000 and euskera_size > 10000:  # Al menos 10KB cada uno
-                    print(f"   Archivos válidos (tamaños: {castellano_size:,} y {euskera_size:,} bytes)")
-                    return True
-                else:
-                    print(f"   ⚠️ Archivos parecen incompletos, re-descargando...")
-            
-            # Descargar el archivo
-            response = self.session.get(url, timeout=60)
-            response.raise_for_status()
+            if result.not_modified:
+                self.source_cache.record(url, result)
+                print("⏭️ Sin cambios desde la última descarga (304), no se vuelve a separar")
+                return True
             
-            # Guardar el archivo temporal
-            with open(temp_filepath, 'wb') as f:
-                f.write(response.content)
+            # Mismo contenido que el ya separado (el servidor no envía validadores
+            # o los ha cambiado sin cambiar el PDF)
+            if not self.force and self.source_cache.is_unchanged(url, result.sha256):
+                os.remove(temp_filepath)
+                self.source_cache.record(url, result)
+                print("⏭️ El PDF no ha cambiado (mismo SHA-256), no se vuelve a separar")
+                return True
             
-            file_size = len(response.content)
-            print(f"✅ Descargado archivo temporal: {temp_filename} ({file_size:,} bytes)")
+            print(f"✅ Descargado archivo temporal: {temp_filename} ({result.size:,} bytes)")
             
             # Separar las páginas
-            if self.split_menu_pdf(temp_filepath, text):
-                print(f"✅ Menú separado exitosamente en castellano y euskera")
+            creados = self.split_menu_pdf(temp_filepath, text)
+            if creados:
+                self.source_cache.record(url, result, sha256=result.sha256, outputs=creados)
+                print("✅ Menú separado exitosamente por idiomas")
                 return True
             else:
                 print(f"❌ Error separando el menú")
@@ -5,16 +5,12 @@ Este script se puede usar cuando los menús están disponibles públicamente
 """
 
 import os
-import sys
-import requests
 import re
 from datetime import datetime
-import django
 
-# Configurar Django
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apyma_site.settings')
-django.setup()
+# No necesita Django: solo busca y descarga PDFs a media/comedor/
+from menu_fetch import DatePatternStrategy, MenuFetchEngine, TIME_PATTERNS, download_pdf
+from menu_sources import MenuSourceCache
 
 class SimpleMenuDownloader:
     def __init__(self):
@@ -24,137 +20,27 @@ class SimpleMenuDownloader:
         # Crear directorio si no existe
         os.makedirs(self.media_dir, exist_ok=True)
         
-        self.base_url = "https://www.elgustodecrecer.es"
-        
-        # Sesión para requests
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
-        })
+        # Motor común con una sola estrategia: patrones de fecha del mes actual
+        # (un menú por patrón) y, si no hay nada, del mes anterior
+        self.engine = MenuFetchEngine([
+            DatePatternStrategy(
+                time_patterns=TIME_PATTERNS,
+                max_days=15,  # Limitar a los últimos 15 días
+                per_pattern=True,
+                include_next_month=False,
+                fallback_previous_month=True,
+            ),
+        ])
+        self.session = self.engine.session
+        
+        # ETag, Last-Modified y SHA-256 de los PDFs ya descargados (este script
+        # guarda el PDF entero, así que no comparte caché con el automático)
+        self.source_cache = MenuSourceCache(os.path.join(self.base_dir, '.menu_sources_simple.json'), self.media_dir)
+        self.force = False  # True para descargar aunque no haya cambios
     
     def find_current_month_menus(self):
-        """Busca menús del mes actual usando patrones inteligentes"""
-        menu_links = []
-        current_date = datetime.now()
-        
-        # Información del mes actual
-        month_names = {
-            1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL', 5: 'MAYO', 6: 'JUNIO',
-            7: 'JULIO', 8: 'AGOSTO', 9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
-        }
-        
-        year = current_date.year
-        month = current_date.month
-        month_name = month_names.get(month, '')
-        
-        print(f"🗓️ Buscando menús para {month_name} {year}...")
-        
-        # Patrones de nombre de archivo
-        file_patterns = [
-            'BASAL%20REMONTIVAL%20{month}',
-            'BASAL%20{month}',
-            'MENU%20REMONTIVAL%20{month}',
-            'MENU%20{month}',
-            'REMONTIVAL%20{month}',
-            '{month}%20REMONTIVAL',
-            '{month}%20BASAL'
-        ]
-        
-        base_archive_url = f"{self.base_url}/Users/Menus/Archivos/"
-        
-        for pattern in file_patterns:
-            filename_part = pattern.format(month=month_name)
-            
-            # Buscar desde el día actual hacia atrás
-            days_to_check = list(range(current_date.day, 0, -1))
-            
-            for day in days_to_check[:15]:  # Limitar a los últimos 15 días
-                date_prefix = f"{year:04d}{month:02d}{day:02d}"
-                
-                # Patrones de hora más comunes
-                time_patterns = ['152623', '150000', '120000', '134856', '135206', '100000', '140000', '160000', '090000', '110000']
-                
-                for time_part in time_patterns:
-                    url_candidate = f"{base_archive_url}{date_prefix}_{time_part}_{filename_part}.pdf"
-                    
-                    try:
-                        # Verificar si la URL existe
-                        response = self.session.head(url_candidate, timeout=5)
-                        if response.status_code == 200:
-                            menu_links.append({
-                                'url': url_candidate,
-                                'text': f"Menu {month_name.title()} {year}",
-                                'pattern': pattern,
-                                'date': f"{year}-{month:02d}-{day:02d}",
-                                'time': time_part
-                            })
-                            print(f"✅ Encontrado: Menu {month_name.title()} {year} (fecha: {day:02d}/{month:02d}/{year})")
-                            # Una vez encontrado, pasar al siguiente patrón
-                            break
-                    except:
-                        continue  # URL no existe, continuar
-                else:
-                    continue  # No break, seguir con el siguiente día
-                break  # Se encontró, salir del loop de días
-        
-        # Si no se encontró nada del mes actual, buscar el mes anterior
-        if not menu_links:
-            print(f"⚠️ No se encontraron menús para {month_name}, buscando mes anterior...")
-            prev_month = month - 1 if month > 1 else 12
-            prev_year = year if month > 1 else year - 1
-            prev_month_name = month_names.get(prev_month, '')
-            
-            menu_links.extend(self._search_month_menus(prev_year, prev_month, prev_month_name))
-        
-        return menu_links
-    
-    def _search_month_menus(self, year, month, month_name):
-        """Busca menús de un mes específico"""
-        menu_links = []
-        
-        file_patterns = [
-            'BASAL%20REMONTIVAL%20{month}',
-            'BASAL%20{month}',
-            'MENU%20REMONTIVAL%20{month}',
-        ]
-        
-        base_archive_url = f"{self.base_url}/Users/Menus/Archivos/"
-        
-        for pattern in file_patterns:
-            filename_part = pattern.format(month=month_name)
-            
-            # Días más probables de publicación
-            days_to_check = [1, 2, 3, 15, 30, 31]
-            
-            for day in days_to_check:
-                if day > 31:
-                    continue
-                    
-                date_prefix = f"{year:04d}{month:02d}{day:02d}"
-                time_patterns = ['152623', '150000', '120000', '134856']
-                
-                for time_part in time_patterns:
-                    url_candidate = f"{base_archive_url}{date_prefix}_{time_part}_{filename_part}.pdf"
-                    
-                    try:
-                        response = self.session.head(url_candidate, timeout=5)
-                        if response.status_code == 200:
-                            menu_links.append({
-                                'url': url_candidate,
-                                'text': f"Menu {month_name.title()} {year}",
-                                'pattern': pattern,
-                                'date': f"{year}-{month:02d}-{day:02d}",
-                                'time': time_part
-                            })
-                            print(f"✅ Encontrado: Menu {month_name.title()} {year}")
-                            break
-                    except:
-                        continue
-                else:
-                    continue
-                break
-        
-        return menu_links
+        """Busca menús del mes actual (o del anterior) usando patrones inteligentes"""
+        return self.engine.find_menus()
     
     def download_menu(self, menu_data):
         """Descarga un menú específico"""
@@ -173,22 +59,29 @@ class SimpleMenuDownloader:
             filename = f"menu_{clean_text}_{date_part}.pdf"
             filepath = os.path.join(self.media_dir, filename)
             
-            # Verificar si ya existe
-            if os.path.exists(filepath):
-                existing_size = os.path.getsize(filepath)
-                print(f"⏭️ Archivo ya existe: {filename} ({existing_size:,} bytes)")
+            # Descargar con petición condicional: si el archivo ya está en disco
+            # y no ha cambiado, el servidor responde 304 sin enviar nada.
+            # Si cambió, se descarga a un temporal y solo se reemplaza al final
+            headers = {} if self.force else self.source_cache.conditional_headers(url)
+            temp_filepath = os.path.join(self.media_dir, f"{filename}.descarga")
+            result = download_pdf(self.session, url, temp_filepath, headers=headers)
+            
+            if result.not_modified:
+                self.source_cache.record(url, result)
+                print(f"⏭️ Sin cambios: {filename} (304)")
                 return True
             
-            # Descargar
-            response = self.session.get(url, timeout=60)
-            response.raise_for_status()
+            # Mismo contenido que el ya guardado: no se reescribe
+            if not self.force and self.source_cache.is_unchanged(url, result.sha256):
+                os.remove(temp_filepath)
+                self.source_cache.record(url, result)
+                print(f"⏭️ Sin cambios: {filename} (mismo SHA-256)")
+                return True
             
-            # Guardar
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            os.replace(temp_filepath, filepath)
+            self.source_cache.record(url, result, sha256=result.sha256, outputs=[filename])
             
-            file_size = len(response.content)
-            print(f"✅ Descargado: {filename} ({file_size:,} bytes)")
+            print(f"✅ Descargado: {filename} ({result.size:,} bytes)")
             
             return True
             
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+"""
+Sincronización de media/ con el servidor por SFTP
+
+Cada lado tiene un manifiesto con el SHA-256 y el tamaño de cada archivo:
+- En local, .media_sync_cache.json guarda el hash junto con el tamaño y la
+  fecha de modificación, así que solo se vuelven a calcular los que cambian.
+- En el servidor, <media remoto>/.media_manifest.json guarda el hash de lo
+  que se ha subido. Se actualiza al final de cada sincronización.
+
+Solo se sube lo que tiene distinto hash que el manifiesto remoto o no está
+en el servidor con el tamaño esperado. Las subidas van en paralelo por varios
+canales SFTP sobre una sola conexión SSH, a un archivo .part con el hash en el
+nombre: si se corta, la siguiente ejecución continúa donde se quedó. Al
+terminar se comprueba el tamaño y se renombra.
+
+Nunca se borra nada en el servidor: allí también hay archivos subidos desde la
+web que no existen en local.
+
+No depende de Django, así que se puede probar contra un servidor SFTP local
+hecho con paramiko.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import paramiko
+
+REMOTE_MANIFEST = '.media_manifest.json'
+
+UPLOAD_CHUNK_SIZE = 32 * 1024
+
+# Archivos temporales que nunca se suben
+EXCLUDED_SUFFIXES = ('.part', '.part.json', '.separando', '.descarga', '.linearizando', '.tmp')
+
+
+def file_sha256(path):
+    """SHA-256 de un archivo leyéndolo por bloques"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def is_excluded(name):
+    return name.startswith('.') or name.endswith(EXCLUDED_SUFFIXES)
+
+
+class LocalManifest:
+    """Hashes de los archivos de un directorio local, con caché por tamaño y fecha"""
+
+    def __init__(self, media_dir, cache_path):
+        self.media_dir = media_dir
+        self.cache_path = cache_path
+        self.cache = {}
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self.cache = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Error cargando caché de hashes: {e}")
+
+    def build(self, subdir=None):
+        """
+        Retorna {ruta relativa (con /): {'sha256', 'size'}} de los archivos
+        de media_dir (o solo de media_dir/subdir)
+        """
+        top = os.path.join(self.media_dir, subdir) if subdir else self.media_dir
+        manifest = {}
+
+        for root, dirs, files in os.walk(top):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if is_excluded(name):
+                    continue
+
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, self.media_dir).replace(os.sep, '/')
+                st = os.stat(path)
+
+                cached = self.cache.get(relative)
+                if cached and cached['size'] == st.st_size and cached['mtime'] == st.st_mtime:
+                    sha256 = cached['sha256']
+                else:
+                    sha256 = file_sha256(path)
+                    self.cache[relative] = {'sha256': sha256, 'size': st.st_size, 'mtime': st.st_mtime}
+
+                manifest[relative] = {'sha256': sha256, 'size': st.st_size}
+
+        return manifest
+
+    def save(self):
+        try:
+            temp_path = f'{self.cache_path}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self.cache, f, indent=2)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            print(f"⚠️ Error guardando caché de hashes: {e}")
+
+
+def part_path(remote_path, sha256):
+    """Temporal remoto de una subida; el hash en el nombre permite reanudarla"""
+    return f'{remote_path}.{sha256[:16]}.part'
+
+
+class MediaSyncer:
+    """
+    Sube a remote_root los archivos de un manifiesto local que faltan o han
+    cambiado, con `workers` canales SFTP sobre el mismo transporte SSH
+    """
+
+    def __init__(self, transport, local_dir, remote_root, workers=4):
+        self.transport = transport
+        self.local_dir = local_dir
+        self.remote_root = remote_root.rstrip('/')
+        self.workers = workers
+        self._local = threading.local()
+        self._clients = []
+        self._lock = threading.Lock()
+        self._created_dirs = set()
+
+    def sftp(self):
+        """Canal SFTP del hilo actual (se abre la primera vez)"""
+        client = getattr(self._local, 'sftp', None)
+        if client is None:
+            client = paramiko.SFTPClient.from_transport(self.transport)
+            self._local.sftp = client
+            with self._lock:
+                self._clients.append(client)
+        return client
+
+    def close(self):
+        for client in self._clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+        self._clients = []
+
+    def remote_path(self, relative):
+        return posixpath.join(self.remote_root, relative)
+
+    def makedirs(self, path):
+        """Crea un directorio remoto y sus padres si no existen"""
+        with self._lock:
+            if path in self._created_dirs:
+                return
+
+        sftp = self.sftp()
+        pendientes = []
+        actual = path
+        while actual and actual != '/':
+            try:
+                if stat.S_ISDIR(sftp.stat(actual).st_mode):
+                    break
+            except IOError:
+                pendientes.append(actual)
+                actual = posixpath.dirname(actual)
+        for directorio in reversed(pendientes):
+            try:
+                sftp.mkdir(directorio)
+            except IOError:
+                pass  # Lo ha creado otro hilo
+
+        with self._lock:
+            self._created_dirs.add(path)
+
+    def load_remote_manifest(self):
+        """Manifiesto del servidor ({} si todavía no hay)"""
+        try:
+            with self.sftp().open(self.remote_path(REMOTE_MANIFEST), 'r') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except IOError:
+            return {}
+        except ValueError as e:
+            print(f"⚠️ Manifiesto remoto no válido, se ignora: {e}")
+            return {}
+
+    def save_remote_manifest(self, manifest):
+        """Escribe el manifiesto remoto a un temporal y lo renombra"""
+        final = self.remote_path(REMOTE_MANIFEST)
+        temp = f'{final}.tmp'
+        sftp = self.sftp()
+        self.makedirs(self.remote_root)
+        with sftp.open(temp, 'w') as f:
+            f.write(json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+        self.rename(temp, final)
+
+    def rename(self, source, dest):
+        """Renombra sobrescribiendo el destino (posix-rename si el servidor lo soporta)"""
+        sftp = self.sftp()
+        try:
+            sftp.posix_rename(source, dest)
+        except IOError:
+            try:
+                sftp.remove(dest)
+            except IOError:
+                pass
+            sftp.rename(source, dest)
+
+    def remote_sizes(self, relatives):
+        """Tamaño en el servidor de cada ruta relativa (None si no existe)"""
+        directorios = {posixpath.dirname(relative) for relative in relatives}
+        tamanos = {}
+
+        def listar(directorio):
+            try:
+                entradas = self.sftp().listdir_attr(self.remote_path(directorio) if directorio else self.remote_root)
+            except IOError:
+                return directorio, {}
+            return directorio, {entrada.filename: entrada.st_size for entrada in entradas}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for directorio, entradas in executor.map(listar, sorted(directorios)):
+                for nombre, size in entradas.items():
+                    tamanos[posixpath.join(directorio, nombre) if directorio else nombre] = size
+
+        return {relative: tamanos.get(relative) for relative in relatives}
+
+    def plan(self, local_manifest, remote_manifest, force=False):
+        """Rutas relativas que hay que subir"""
+        sizes = self.remote_sizes(list(local_manifest))
+        pendientes = []
+        for relative, local in local_manifest.items():
+            remote = remote_manifest.get(relative)
+            if (
+                force
+                or remote is None
+                or remote.get('sha256') != local['sha256']
+                or sizes.get(relative) != local['size']
+            ):
+                pendientes.append(relative)
+        return pendientes
+
+    def upload(self, relative, entry):
+        """
+        Sube un archivo a su .part (continuando si ya existe uno del mismo
+        contenido), comprueba el tamaño y lo renombra.
+        Retorna (bytes enviados, bytes que ya estaban en el .part).
+        """
+        local_path = os.path.join(self.local_dir, *relative.split('/'))
+        remote_path = self.remote_path(relative)
+        temp_path = part_path(remote_path, entry['sha256'])
+        sftp = self.sftp()
+
+        self.makedirs(posixpath.dirname(remote_path))
+
+        offset = 0
+        try:
+            offset = sftp.stat(temp_path).st_size
+            if offset > entry['size']:
+                sftp.remove(temp_path)
+                offset = 0
+        except IOError:
+            pass
+
+        enviados = 0
+        with open(local_path, 'rb') as local_file:
+            local_file.seek(offset)
+            with sftp.open(temp_path, 'ab' if offset else 'wb') as remote_file:
+                remote_file.set_pipelined(True)
+                for chunk in iter(lambda: local_file.read(UPLOAD_CHUNK_SIZE), b''):
+                    remote_file.write(chunk)
+                    enviados += len(chunk)
+
+        size = sftp.stat(temp_path).st_size
+        if size != entry['size']:
+            raise IOError(f'Tamaño incorrecto tras la subida ({size} de {entry["size"]} bytes)')
+
+        self.rename(temp_path, remote_path)
+        return enviados, offset
+
+    def sync(self, local_manifest, force=False):
+        """
+        Sube lo que ha cambiado y actualiza el manifiesto remoto.
+        Retorna (subidos, sin cambios, errores).
+        """
+        remote_manifest = self.load_remote_manifest()
+        pendientes = self.plan(local_manifest, remote_manifest, force)
+        sin_cambios = len(local_manifest) - len(pendientes)
+        print(f"📋 {len(local_manifest)} archivos en local, {len(pendientes)} por subir, {sin_cambios} sin cambios")
+
+        subidos = []
+        errores = []
+        # Los grandes primero para repartir mejor el trabajo entre los canales
+        pendientes.sort(key=lambda relative: -local_manifest[relative]['size'])
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self.upload, relative, local_manifest[relative]): relative
+                for relative in pendientes
+            }
+            for future in as_completed(futures):
+                relative = futures[future]
+                try:
+                    enviados, offset = future.result()
+                except Exception as e:
+                    print(f"❌ Error subiendo {relative}: {e}")
+                    errores.append(relative)
+                    continue
+
+                reanudado = f" (reanudado desde {offset:,} bytes)" if offset else ''
+                print(f"✅ {relative} ({enviados:,} bytes){reanudado}")
+                subidos.append(relative)
+                remote_manifest[relative] = local_manifest[relative]
+
+        if subidos or not remote_manifest:
+            self.save_remote_manifest(remote_manifest)
+
+        return subidos, sin_cambios, errores
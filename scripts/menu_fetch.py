@@ -0,0 +1,628 @@
+#!/usr/bin/env python
+"""
+Motor común de búsqueda y descarga de menús
+
+Los descargadores (automático con login, simple y el antiguo de URLs fijas)
+comparten aquí:
+
+- Una sesión HTTP con conexiones keep-alive reutilizables, reintentos con
+  espera creciente (backoff) y un límite de peticiones simultáneas por host.
+- Las estrategias para encontrar los menús: listado del directorio
+  /Users/Menus/Archivos/, patrones de fecha en el nombre del archivo y área
+  personal después del login.
+- MenuFetchEngine, que lanza las estrategias en paralelo y se queda con el
+  primer resultado válido.
+- download_pdf(), que descarga por bloques a un archivo .part, reanuda con
+  Range si la conexión se corta, comprueba que el PDF está completo y solo
+  entonces lo renombra al destino.
+
+No depende de Django.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from menu_probing import MenuUrlProber, ProbeCandidate, ProbeHistory
+
+BASE_URL = "https://www.elgustodecrecer.es"
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
+
+# Peticiones simultáneas como máximo contra un mismo host
+MAX_PER_HOST = 8
+
+MONTH_NAMES = {
+    1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL', 5: 'MAYO', 6: 'JUNIO',
+    7: 'JULIO', 8: 'AGOSTO', 9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
+}
+
+# Patrones de nombre de archivo, de más a menos probable
+FILE_PATTERNS = [
+    'BASAL%20REMONTIVAL%20{month}',
+    'BASAL%20{month}',
+    'MENU%20REMONTIVAL%20{month}',
+    'MENU%20{month}',
+    'REMONTIVAL%20{month}',
+    '{month}%20REMONTIVAL',
+    '{month}%20BASAL'
+]
+
+# Horas de publicación, de más a menos probable
+TIME_PATTERNS = ['152623', '150000', '120000', '134856', '135206', '100000', '140000', '160000', '090000', '110000']
+
+# Días típicos de publicación para meses que no son el actual
+TYPICAL_DAYS = [1, 2, 3, 15, 30, 31]
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Intentos de descarga (cada uno reanuda donde se quedó el anterior)
+DOWNLOAD_ATTEMPTS = 3
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class HostLimitedSession(requests.Session):
+    """Sesión que limita las peticiones simultáneas a cada host"""
+
+    def __init__(self, max_per_host=MAX_PER_HOST):
+        super().__init__()
+        self.max_per_host = max_per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+    def request(self, method, url, *args, **kwargs):
+        with self._semaphore(url):
+            return super().request(method, url, *args, **kwargs)
+
+
+def build_session(max_per_host=MAX_PER_HOST, retries=3, backoff_factor=0.5):
+    """
+    Sesión compartida: keep-alive con un pool por host, reintentos con backoff
+    en errores de conexión y respuestas 429/5xx, y límite por host.
+    """
+    session = HostLimitedSession(max_per_host)
+    session.headers.update({'User-Agent': USER_AGENT})
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['HEAD', 'GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=max_per_host, pool_maxsize=max_per_host, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_html(content):
+    """Parser HTML común para todas las estrategias"""
+    from bs4 import BeautifulSoup  # Solo lo usan el listado y el área personal
+    return BeautifulSoup(content, 'html.parser')
+
+
+class MenuFetchStrategy:
+    """Estrategia para encontrar menús. find() retorna una lista de enlaces"""
+
+    name = 'estrategia'
+
+    def find(self, engine):
+        raise NotImplementedError
+
+
+class DirectoryListingStrategy(MenuFetchStrategy):
+    """Explora el listado del directorio /Users/Menus/Archivos/"""
+
+    name = 'listado del directorio'
+
+    def find(self, engine):
+        menu_links = []
+        base_archive_url = f"{engine.base_url}/Users/Menus/Archivos/"
+
+        try:
+            response = engine.session.get(base_archive_url, timeout=30)
+            if response.status_code != 200:
+                return menu_links
+
+            soup = parse_html(response.content)
+
+            for link in soup.find_all('a', href=True):
+                href = link.get('href')
+                text = link.get_text(strip=True)
+
+                # Filtrar solo PDFs de menús
+                if not (href.endswith('.pdf') and
+                        any(keyword in href.upper() for keyword in ['BASAL', 'MENU', 'REMONTIVAL'])):
+                    continue
+
+                full_url = urljoin(base_archive_url, href)
+
+                # Intentar extraer el mes del nombre del archivo
+                month_match = re.search(r'(ENERO|FEBRERO|MARZO|ABRIL|MAYO|JUNIO|JULIO|AGOSTO|SEPTIEMBRE|OCTUBRE|NOVIEMBRE|DICIEMBRE)', href.upper())
+
+                if month_match:
+                    month_name = month_match.group(1).title()
+                    # El nombre empieza por la fecha de publicación: 20250908_134856_...
+                    year_match = re.search(r'(20\d{2})\d{4}_', href)
+                    year = year_match.group(1) if year_match else datetime.now().year
+                    display_text = f"Menu {month_name} {year}"
+                else:
+                    display_text = text or "Menu del Comedor"
+
+                menu_links.append({
+                    'url': full_url,
+                    'text': display_text,
+                    'source_page': 'directory_listing'
+                })
+                print(f"✅ Descubierto en directorio: {display_text}")
+
+        except requests.RequestException as e:
+            print(f"⚠️ No se pudo explorar el directorio: {e}")
+
+        return menu_links
+
+
+class DatePatternStrategy(MenuFetchStrategy):
+    """
+    Genera las URLs candidatas (patrón × día × hora) y las sondea en paralelo.
+
+    - per_pattern: un menú por patrón de nombre en lugar de uno por mes.
+    - include_next_month: en los últimos días del mes busca también el siguiente.
+    - fallback_previous_month: si no hay nada del mes actual, busca el anterior
+      (con los patrones y horas más probables).
+    """
+
+    name = 'patrones de fecha'
+
+    def __init__(self, file_patterns=None, time_patterns=None, max_days=10,
+                 per_pattern=False, include_next_month=True, fallback_previous_month=False):
+        self.file_patterns = file_patterns or FILE_PATTERNS
+        self.time_patterns = time_patterns or TIME_PATTERNS[:8]
+        self.max_days = max_days
+        self.per_pattern = per_pattern
+        self.include_next_month = include_next_month
+        self.fallback_previous_month = fallback_previous_month
+
+    def months_to_check(self, today):
+        months = [(today.year, today.month)]
+        # Si estamos en los últimos días del mes, también buscar el siguiente
+        if self.include_next_month and today.day > 25:
+            next_month = today.month + 1 if today.month < 12 else 1
+            next_year = today.year if today.month < 12 else today.year + 1
+            months.append((next_year, next_month))
+        return months
+
+    def candidates(self, engine, year, month, today, file_patterns, time_patterns):
+        """URLs candidatas de un mes, en orden de prioridad"""
+        month_name = MONTH_NAMES[month]
+        base_archive_url = f"{engine.base_url}/Users/Menus/Archivos/"
+        history = engine.probe_history
+
+        # Días que acertaron en meses anteriores primero; en el mes actual,
+        # desde hoy hacia atrás
+        if (year, month) == (today.year, today.month):
+            days = history.preferred_days(range(today.day, 0, -1), max_day=today.day, limit=self.max_days)
+        else:
+            days = history.preferred_days(TYPICAL_DAYS, limit=self.max_days)
+
+        return [
+            ProbeCandidate(
+                f"{base_archive_url}{year:04d}{month:02d}{day:02d}_{time_part}_{pattern.format(month=month_name)}.pdf",
+                group=pattern if self.per_pattern else (year, month),
+                year=year,
+                month=month,
+                pattern=pattern,
+                day=day,
+                time=time_part,
+            )
+            for pattern in file_patterns
+            for day in days
+            for time_part in time_patterns
+        ]
+
+    def search(self, engine, months, today, file_patterns, time_patterns):
+        candidates = []
+        for year, month in months:
+            print(f"🗓️ Buscando menús para {MONTH_NAMES[month]} {year}...")
+            candidates.extend(self.candidates(engine, year, month, today, file_patterns, time_patterns))
+
+        menu_links = []
+        for hit in engine.prober.probe(candidates):
+            year, month, day = hit.data['year'], hit.data['month'], hit.data['day']
+            month_name = MONTH_NAMES[month]
+            menu_links.append({
+                'url': hit.url,
+                'text': f"Menu {month_name.title()} {year}",
+                'source_page': 'pattern_search',
+                'pattern': hit.data['pattern'],
+                'date': f"{year}-{month:02d}-{day:02d}",
+                'time': hit.data['time']
+            })
+            print(f"✅ Encontrado por patrón: Menu {month_name.title()} {year} (fecha: {day:02d}/{month:02d}/{year})")
+        return menu_links
+
+    def find(self, engine):
+        today = datetime.now()
+        menu_links = self.search(engine, self.months_to_check(today), today,
+                                 self.file_patterns, self.time_patterns)
+
+        if not menu_links and self.fallback_previous_month and not engine.stop_event.is_set():
+            print(f"⚠️ No se encontraron menús para {MONTH_NAMES[today.month]}, buscando mes anterior...")
+            prev_month = today.month - 1 if today.month > 1 else 12
+            prev_year = today.year if today.month > 1 else today.year - 1
+            menu_links = self.search(engine, [(prev_year, prev_month)], today,
+                                     self.file_patterns[:3], self.time_patterns[:4])
+
+        return menu_links
+
+
+class PersonalAreaStrategy(MenuFetchStrategy):
+    """Busca enlaces a menús en el área personal (hace login si hace falta)"""
+
+    name = 'área personal'
+
+    def __init__(self, email, password):
+        self.email = email
+        self.password = password
+        self.logged_in = False
+
+    def login(self, engine):
+        """Realiza el login en el área personal"""
+        login_url = f"{engine.base_url}/AreaPersonal"
+
+        try:
+            print("🔐 Iniciando sesión en El Gusto de Crecer...")
+
+            # Primero, obtener la página de login para extraer tokens CSRF si es necesario
+            response = engine.session.get(login_url, timeout=30)
+            response.raise_for_status()
+
+            soup = parse_html(response.content)
+
+            # Buscar el formulario de login
+            login_form = soup.find('form')
+            if not login_form:
+                print("❌ No se encontró formulario de login")
+                return False
+
+            # Extraer la action del formulario
+            form_action = login_form.get('action', '')
+            login_post_url = urljoin(engine.base_url, form_action) if form_action else login_url
+
+            # Buscar campos ocultos (tokens CSRF, etc.)
+            hidden_fields = {}
+            for input_field in login_form.find_all('input', type='hidden'):
+                name = input_field.get('name')
+                if name:
+                    hidden_fields[name] = input_field.get('value', '')
+
+            # Buscar los nombres de los campos de email y password
+            email_field = login_form.find('input', {'type': 'email'}) or login_form.find('input', {'name': re.compile(r'email|usuario|user', re.I)})
+            password_field = login_form.find('input', {'type': 'password'}) or login_form.find('input', {'name': re.compile(r'password|pass|contraseña', re.I)})
+
+            if not email_field or not password_field:
+                print("❌ No se encontraron campos de email/password")
+                return False
+
+            form_data = {
+                email_field.get('name', 'email'): self.email,
+                password_field.get('name', 'password'): self.password,
+                **hidden_fields
+            }
+
+            print(f"📧 Enviando credenciales a: {login_post_url}")
+
+            # Realizar el login
+            response = engine.session.post(login_post_url, data=form_data, timeout=30, allow_redirects=True)
+            response.raise_for_status()
+
+            # Verificar si el login fue exitoso
+            success_indicators = [
+                'logout', 'cerrar sesión', 'salir', 'mi cuenta', 'perfil',
+                'área personal', 'dashboard', 'menús'
+            ]
+            login_failed_indicators = [
+                'error de login', 'credenciales incorrectas', 'usuario o contraseña',
+                'email o password', 'acceso denegado'
+            ]
+
+            page_text = response.text.lower()
+
+            if any(indicator in page_text for indicator in login_failed_indicators):
+                print("❌ Login fallido: credenciales incorrectas")
+                return False
+
+            if any(indicator in page_text for indicator in success_indicators) or response.url != login_url:
+                print("✅ Login exitoso")
+            else:
+                print("⚠️ Estado de login incierto, continuando...")
+
+            self.logged_in = True
+            return True
+
+        except Exception as e:
+            print(f"❌ Error durante el login: {e}")
+            return False
+
+    def find(self, engine):
+        if not self.logged_in and not self.login(engine):
+            return []
+
+        menu_links = []
+
+        # Intentar diferentes URLs del área personal
+        possible_urls = [
+            f"{engine.base_url}/AreaPersonal",
+            f"{engine.base_url}/menus",
+            f"{engine.base_url}/documentos",
+            f"{engine.base_url}/descargas",
+            f"{engine.base_url}/Users/Menus"
+        ]
+        menu_keywords = ['menu', 'menú', 'comedor', 'basal', 'alimentación', 'remontival']
+
+        for url in possible_urls:
+            if engine.stop_event.is_set():
+                break
+
+            try:
+                response = engine.session.get(url, timeout=30)
+                if response.status_code != 200:
+                    continue
+
+                soup = parse_html(response.content)
+
+                # Enlaces a PDF, con "pdf" en el href o al directorio de menús
+                pdf_links = soup.find_all('a', href=re.compile(r'pdf|/Users/Menus/', re.I))
+
+                for link in pdf_links:
+                    href = link.get('href')
+                    text = link.get_text(strip=True)
+
+                    # Filtrar solo menús (buscar palabras clave)
+                    if (any(keyword in text.lower() for keyword in menu_keywords) or
+                            any(keyword in href.lower() for keyword in menu_keywords)):
+                        menu_links.append({
+                            'url': urljoin(engine.base_url, href),
+                            'text': text or 'Menu del comedor',
+                            'source_page': url
+                        })
+
+            except requests.RequestException as e:
+                print(f"⚠️ Error verificando {url}: {e}")
+
+        return menu_links
+
+
+class MenuFetchEngine:
+    """
+    Ejecuta las estrategias de búsqueda sobre una sesión compartida.
+
+    Con first_valid=True las estrategias corren en paralelo y gana la primera
+    que encuentra algún menú; las demás dejan de sondear en cuanto se avisa
+    por stop_event. Con first_valid=False se juntan los resultados de todas.
+    """
+
+    def __init__(self, strategies, base_url=BASE_URL, session=None, history_path=None,
+                 max_per_host=MAX_PER_HOST):
+        self.strategies = list(strategies)
+        self.base_url = base_url
+        self.session = session or build_session(max_per_host)
+        self.stop_event = threading.Event()
+
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.probe_history = ProbeHistory(history_path or os.path.join(base_dir, '.menu_probe_history.json'))
+        self.prober = MenuUrlProber(self.session, max_workers=max_per_host, timeout=5,
+                                    history=self.probe_history, stop_event=self.stop_event)
+
+    def run_strategy(self, strategy):
+        """Ejecuta una estrategia; un error se trata como resultado vacío"""
+        try:
+            return strategy.find(self) or []
+        except Exception as e:
+            print(f"⚠️ Error en la estrategia '{strategy.name}': {e}")
+            return []
+
+    def find_menus(self, first_valid=True):
+        """Lista de enlaces a menús ({'url', 'text', 'source_page', ...}) sin duplicados"""
+        self.stop_event.clear()
+
+        if len(self.strategies) == 1:
+            return unique_links(self.run_strategy(self.strategies[0]))
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=len(self.strategies)) as executor:
+            futures = {executor.submit(self.run_strategy, strategy): strategy for strategy in self.strategies}
+
+            for future in as_completed(futures):
+                strategy = futures[future]
+                links = future.result()
+                results[strategy] = links
+
+                if links and first_valid:
+                    print(f"🏁 Menús encontrados con: {strategy.name}")
+                    # Que el resto de estrategias terminen cuanto antes
+                    self.stop_event.set()
+                    return unique_links(links)
+
+        # Sin first_valid (o sin resultados), en el orden de las estrategias
+        return unique_links([link for strategy in self.strategies for link in results.get(strategy, [])])
+
+
+def unique_links(menu_links):
+    """Elimina enlaces con la misma URL conservando el orden"""
+    unique = []
+    seen_urls = set()
+    for link in menu_links:
+        if link['url'] not in seen_urls:
+            unique.append(link)
+            seen_urls.add(link['url'])
+    return unique
+
+
+class DownloadError(Exception):
+    """La descarga no se pudo completar o el archivo no es un PDF válido"""
+
+
+class DownloadResult:
+    """
+    Resultado de download_pdf(). Con not_modified=True el servidor respondió
+    304 y no se ha escrito nada. `headers` son los de la última respuesta
+    (para guardar ETag y Last-Modified).
+    """
+
+    def __init__(self, headers, not_modified=False, sha256=None, size=0, path=None):
+        self.headers = headers
+        self.not_modified = not_modified
+        self.sha256 = sha256
+        self.size = size
+        self.path = path
+
+
+def _read_part_state(part_path):
+    """Validadores de la descarga parcial (guardados junto al .part)"""
+    try:
+        with open(f'{part_path}.json', 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_part_state(part_path, url, response):
+    state = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    with open(f'{part_path}.json', 'w') as f:
+        json.dump(state, f)
+
+
+def _discard_part(part_path):
+    for path in (part_path, f'{part_path}.json'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def verify_pdf(path, expected_size=None, expected_sha256=None):
+    """
+    Comprueba que un PDF descargado está completo: tamaño, cabecera %PDF-,
+    %%EOF al final y, si se conoce, el SHA-256. Retorna (sha256, tamaño).
+    """
+    size = os.path.getsize(path)
+    if expected_size is not None and size != expected_size:
+        raise DownloadError(f"Tamaño incorrecto: {size:,} bytes de {expected_size:,}")
+
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if f.read(5) != b'%PDF-':
+            raise DownloadError("El archivo no empieza por %PDF-")
+        f.seek(0)
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+
+        f.seek(max(size - 1024, 0))
+        if b'%%EOF' not in f.read():
+            raise DownloadError("Falta el final del PDF (%%EOF), descarga truncada")
+
+    digest = sha256.hexdigest()
+    if expected_sha256 and digest != expected_sha256:
+        raise DownloadError("El SHA-256 no coincide")
+
+    return digest, size
+
+
+def download_pdf(session, url, dest_path, headers=None, expected_sha256=None,
+                 attempts=DOWNLOAD_ATTEMPTS, timeout=60):
+    """
+    Descarga un PDF a dest_path sin cargarlo en memoria.
+
+    Los bytes van a dest_path + '.part'. Si la conexión se corta, el siguiente
+    intento (o la siguiente ejecución) pide solo lo que falta con Range e
+    If-Range, para no mezclar dos versiones del archivo. Al terminar se
+    verifica el PDF y se renombra al destino de forma atómica.
+
+    `headers` se usan en la primera petición (p. ej. If-None-Match); si hay
+    una descarga parcial pendiente se ignoran.
+    """
+    part_path = f'{dest_path}.part'
+    last_error = None
+
+    for attempt in range(1, attempts + 1):
+        request_headers = {'Accept-Encoding': 'identity'}
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        state = _read_part_state(part_path) if offset else {}
+
+        # Solo se reanuda si sabemos que la parte descargada es de esta misma versión
+        validator = state.get('etag') or state.get('last_modified')
+        if offset and state.get('url') == url and validator:
+            request_headers['Range'] = f'bytes={offset}-'
+            request_headers['If-Range'] = validator
+        else:
+            offset = 0
+            request_headers.update(headers or {})
+
+        try:
+            with session.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304:
+                    return DownloadResult(response.headers, not_modified=True)
+
+                if response.status_code == 416:
+                    raise DownloadError("Rango no satisfacible, la descarga parcial no sirve")
+
+                if response.status_code == 206:
+                    match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+                    if not match or int(match.group(1)) != offset:
+                        raise DownloadError("Content-Range inesperado al reanudar")
+                    total = int(match.group(3)) if match.group(3) != '*' else None
+                    mode = 'ab'
+                    print(f"↪️ Reanudando descarga desde {offset:,} bytes")
+                else:
+                    # 200: el archivo ha cambiado o el servidor no admite Range
+                    response.raise_for_status()
+                    length = response.headers.get('Content-Length')
+                    total = int(length) if length and length.isdigit() else None
+                    mode = 'wb'
+
+                if mode == 'wb' or not state:
+                    _write_part_state(part_path, url, response)
+
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+
+                sha256, size = verify_pdf(part_path, expected_size=total, expected_sha256=expected_sha256)
+                os.replace(part_path, dest_path)
+                _discard_part(part_path)
+
+                return DownloadResult(response.headers, sha256=sha256, size=size, path=dest_path)
+
+        except requests.RequestException as e:
+            # Corte de conexión: el .part se conserva para reanudar
+            last_error = e
+            print(f"⚠️ Descarga interrumpida (intento {attempt}/{attempts}): {e}")
+        except DownloadError as e:
+            # Archivo corrupto o de otra versión: se empieza de cero
+            last_error = e
+            print(f"⚠️ Descarga no válida (intento {attempt}/{attempts}): {e}")
+            _discard_part(part_path)
+
+    raise DownloadError(f"No se pudo descargar {url}: {last_error}")
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""
+Sondeo concurrente de URLs de menús
+
+Los descargadores generan cientos de URLs candidatas (patrón de nombre × día ×
+hora) para /Users/Menus/Archivos/ y solo unas pocas existen. En lugar de hacer
+una petición HEAD detrás de otra, MenuUrlProber las lanza en paralelo con un
+número limitado de hilos, cancela las que ya no hacen falta en cuanto aparece
+un acierto y devuelve los aciertos en el orden de prioridad original.
+
+Con un ProbeHistory el sondeo aprende de ejecuciones anteriores: las
+candidatas se ordenan por los patrones, días y horas que ya acertaron en
+meses pasados y se saltan las URLs que dieron 404 hace poco.
+
+No depende de Django, así que se puede probar contra un servidor HTTP local
+que sirva un árbol falso de /Users/Menus/Archivos/.
+"""
+
+import json
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ProbeCandidate:
+    """URL candidata. `group` agrupa las alternativas de un mismo menú"""
+
+    def __init__(self, url, group=None, **data):
+        self.url = url
+        self.group = group
+        self.data = data
+
+    def __repr__(self):
+        return f"ProbeCandidate({self.url!r}, group={self.group!r})"
+
+
+class ProbeHistory:
+    """
+    Historial local de sondeos (JSON).
+
+    Guarda qué patrón, día del mes y hora tenía cada menú encontrado y las
+    URLs que respondieron 404. Solo se recuerdan los 404 de fechas ya
+    pasadas: una URL con la fecha de hoy puede aparecer más tarde.
+    """
+
+    # Días durante los que un 404 se da por bueno
+    NEGATIVE_TTL_DAYS = 40
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = {}
+        self.misses = {}
+        self.load()
+
+    def load(self):
+        """Carga el historial desde el archivo si existe"""
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.hits = data.get('hits', {})
+            self.misses = data.get('misses', {})
+        except Exception as e:
+            print(f"⚠️ Error cargando historial de sondeos: {e}")
+
+    def save(self):
+        """Guarda el historial, descartando los 404 caducados"""
+        limite = (datetime.now() - timedelta(days=self.NEGATIVE_TTL_DAYS)).isoformat()
+        self.misses = {url: fecha for url, fecha in self.misses.items() if fecha >= limite}
+
+        try:
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'hits': self.hits, 'misses': self.misses}, f, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Error guardando historial de sondeos: {e}")
+
+    def counts(self, field):
+        """Aciertos por valor de un campo ('pattern', 'day' o 'time')"""
+        return Counter(hit[field] for hit in self.hits.values() if field in hit)
+
+    def preferred_days(self, default_days, max_day=31, limit=None):
+        """
+        Días a comprobar: primero los que acertaron en meses anteriores y
+        después los de por defecto, sin pasar de max_day
+        """
+        learned = [day for day, _ in self.counts('day').most_common()]
+        days = []
+        for day in learned + list(default_days):
+            if 1 <= day <= max_day and day not in days:
+                days.append(day)
+        return days[:limit] if limit else days
+
+    def sort(self, candidates):
+        """
+        Reordena las candidatas de cada grupo por aciertos históricos de su
+        patrón, día y hora. Los grupos mantienen su orden y, a igualdad, se
+        respeta el orden original.
+        """
+        if not self.hits:
+            return list(candidates)
+
+        counts = {field: self.counts(field) for field in ('pattern', 'day', 'time')}
+        group_order = {}
+        for candidate in candidates:
+            group_order.setdefault(candidate.group, len(group_order))
+
+        def key(item):
+            index, candidate = item
+            return (
+                group_order[candidate.group],
+                *(-counts[field][candidate.data.get(field)] for field in ('pattern', 'day', 'time')),
+                index,
+            )
+
+        return [candidate for _, candidate in sorted(enumerate(candidates), key=key)]
+
+    def is_known_missing(self, url):
+        """True si la URL dio 404 hace menos de NEGATIVE_TTL_DAYS días"""
+        fecha = self.misses.get(url)
+        if not fecha:
+            return False
+        return datetime.fromisoformat(fecha) > datetime.now() - timedelta(days=self.NEGATIVE_TTL_DAYS)
+
+    def record_hit(self, candidate):
+        """Registra un menú encontrado"""
+        self.hits[candidate.url] = {
+            field: candidate.data[field]
+            for field in ('pattern', 'day', 'time', 'year', 'month')
+            if field in candidate.data
+        }
+        self.misses.pop(candidate.url, None)
+
+    def record_miss(self, candidate):
+        """Registra un 404 si la fecha de la candidata ya ha pasado"""
+        try:
+            fecha = date(candidate.data['year'], candidate.data['month'], candidate.data['day'])
+        except (KeyError, ValueError):
+            return
+        if fecha < date.today():
+            self.misses[candidate.url] = datetime.now().isoformat()
+
+
+class MenuUrlProber:
+    """
+    Comprueba URLs candidatas con peticiones HEAD concurrentes.
+
+    Las candidatas se pasan en orden de prioridad. Dentro de cada grupo gana
+    el primer acierto según ese orden: cuando aparece uno se cancelan las
+    candidatas posteriores del grupo, pero las anteriores que siguen en vuelo
+    terminan por si alguna también existe.
+
+    Si se le pasa un ProbeHistory, ordena las candidatas según el historial,
+    se salta los 404 recientes y guarda el resultado al terminar. Con
+    stop_event se puede interrumpir el sondeo desde fuera.
+    """
+
+    def __init__(self, session=None, max_workers=8, timeout=5, history=None, stop_event=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.history = history
+        self.stop_event = stop_event
+
+        if session is None:
+            # Una conexión keep-alive por hilo
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def head_status(self, url):
+        """Código HTTP de un HEAD a la URL, o None si hay un error de red"""
+        try:
+            response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+            return response.status_code
+        except requests.RequestException:
+            return None
+
+    def url_exists(self, url):
+        """HEAD a la URL; cualquier error de red cuenta como que no existe"""
+        return self.head_status(url) == 200
+
+    def probe(self, candidates, first_hit_only=True):
+        """
+        Sondea las candidatas y retorna las que existen, en orden de prioridad.
+        Con first_hit_only=True retorna como mucho una por grupo.
+        """
+        candidates = list(candidates)
+        if self.history is not None:
+            candidates = [
+                candidate for candidate in self.history.sort(candidates)
+                if not self.history.is_known_missing(candidate.url)
+            ]
+        if not candidates:
+            return []
+
+        lock = threading.Lock()
+        # Mejor acierto (índice de prioridad) encontrado por grupo
+        best_hit = {}
+        hits = set()
+
+        def superseded(index, group):
+            with lock:
+                return first_hit_only and group in best_hit and best_hit[group] < index
+
+        def check(index, candidate):
+            # Si ya hay un acierto mejor en el grupo no hace falta la petición
+            if superseded(index, candidate.group):
+                return index, None
+            if self.stop_event is not None and self.stop_event.is_set():
+                return index, None
+            return index, self.head_status(candidate.url)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(check, index, candidate): index
+                for index, candidate in enumerate(candidates)
+            }
+
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+
+                index, status = future.result()
+                if status == 404 and self.history is not None:
+                    self.history.record_miss(candidates[index])
+                if status != 200:
+                    continue
+
+                group = candidates[index].group
+                with lock:
+                    hits.add(index)
+                    if first_hit_only and (group not in best_hit or index < best_hit[group]):
+                        best_hit[group] = index
+
+                if first_hit_only:
+                    # Cancelar las candidatas pendientes del grupo con menos prioridad
+                    for other, other_index in futures.items():
+                        if other_index > index and candidates[other_index].group == group:
+                            other.cancel()
+
+        if first_hit_only:
+            hits = set(best_hit.values())
+
+        result = [candidates[index] for index in sorted(hits)]
+
+        if self.history is not None:
+            for candidate in result:
+                self.history.record_hit(candidate)
+            self.history.save()
+
+        return result
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Caché de los PDFs de origen de los menús
+
+Para cada URL descargada se guarda su ETag, Last-Modified, el SHA-256 del
+contenido y los archivos que se generaron a partir de él en media/comedor/.
+Así la siguiente ejecución hace una petición condicional: si el servidor
+responde 304, o el contenido descargado tiene el mismo hash, no se vuelve a
+separar ni a escribir nada.
+"""
+
+import json
+import os
+from datetime import datetime
+
+
+class MenuSourceCache:
+    """Validadores HTTP y hash de cada PDF de origen (archivo JSON)"""
+
+    def __init__(self, path, media_dir):
+        self.path = path
+        self.media_dir = media_dir
+        self.sources = {}
+        self.load()
+
+    def load(self):
+        """Carga la caché desde el archivo si existe"""
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                self.sources = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Error cargando caché de menús: {e}")
+
+    def save(self):
+        """Guarda la caché (escribe a un temporal y renombra)"""
+        try:
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self.sources, f, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Error guardando caché de menús: {e}")
+
+    def outputs_exist(self, url):
+        """True si siguen en disco todos los archivos generados desde la URL"""
+        entry = self.sources.get(url)
+        if not entry or not entry.get('outputs'):
+            return False
+        return all(
+            os.path.exists(os.path.join(self.media_dir, filename))
+            for filename in entry['outputs']
+        )
+
+    def conditional_headers(self, url):
+        """
+        Cabeceras If-None-Match / If-Modified-Since para la URL.
+        Solo se envían si los archivos generados siguen en disco; si falta
+        alguno hay que descargar el PDF completo para regenerarlo.
+        """
+        if not self.outputs_exist(url):
+            return {}
+
+        entry = self.sources[url]
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def is_unchanged(self, url, sha256):
+        """True si el contenido coincide con el ya separado en disco"""
+        entry = self.sources.get(url)
+        return bool(entry) and entry.get('sha256') == sha256 and self.outputs_exist(url)
+
+    def record(self, url, response, sha256=None, outputs=None):
+        """
+        Actualiza la entrada de la URL con los validadores de la respuesta.
+        sha256 y outputs solo se cambian si se pasan (tras un 304 se conservan).
+        """
+        entry = self.sources.setdefault(url, {})
+        if response.headers.get('ETag'):
+            entry['etag'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            entry['last_modified'] = response.headers['Last-Modified']
+        if sha256 is not None:
+            entry['sha256'] = sha256
+        if outputs is not None:
+            entry['outputs'] = list(outputs)
+        entry['comprobado'] = datetime.now().isoformat()
+        self.save()
+
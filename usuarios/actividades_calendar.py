@@ -0,0 +1,176 @@
+"""
+Calendario mensual de actividades
+
+La vista de actividades necesita, para cada celda del calendario, las
+actividades de ese día. Aquí se prepara una sola vez por (año, mes, idioma)
+la rejilla de semanas con las actividades ya colocadas en su celda y el JSON
+que usa el JavaScript de la página, y se guarda en la caché de Django.
+
+Al guardar o borrar una Actividad se sube la versión del calendario (señales
+en usuarios/signals.py), así que todas las entradas anteriores dejan de
+usarse sin tener que buscarlas.
+
+Las actividades que se repiten se expanden solo para el rango pedido (ver
+actividades_recurrencia.py).
+"""
+
+import calendar
+import hashlib
+import json
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.translation import get_language
+
+from .actividades_recurrencia import expand, range_filter
+
+VERSION_KEY = 'actividades:calendario:version'
+
+# Subir si cambia la estructura de lo que se guarda en la caché
+FORMATO = 3
+
+# Las entradas se invalidan con la versión; el tiempo solo limpia las que ya no se usan
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def calendar_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_calendar():
+    """Descarta los calendarios cacheados de todos los meses e idiomas"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # La clave no existía (caché vacía o reiniciada)
+        cache.set(VERSION_KEY, 2, None)
+
+
+def month_range(year, month):
+    """Primer y último día del mes"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def serialize_actividad(actividad):
+    """
+    Datos de una actividad para la plantilla y el JavaScript: los de la celda
+    del calendario y los del modal de detalle, para abrirlo sin otra petición.
+    No incluye es_hoy / es_pasada porque cambian con el día (ver serialize_detalle).
+    """
+    hora_fin = actividad.hora_finalizacion.strftime('%H:%M') if actividad.hora_finalizacion else None
+    return {
+        'id': actividad.id,
+        'titulo': actividad.titulo or f"{actividad.get_tipo_actividad_display()}",
+        'fecha': actividad.fecha.strftime('%d/%m/%Y'),
+        'fecha_iso': actividad.fecha.isoformat(),
+        'hora': actividad.hora_comienzo.strftime('%H:%M'),
+        'hora_fin': hora_fin,
+        'hora_comienzo': actividad.hora_comienzo.strftime('%H:%M'),
+        'hora_finalizacion': hora_fin,
+        'hora_completa': actividad.get_hora_completa(),
+        'duracion': actividad.get_duracion(),
+        'tipo': actividad.tipo_actividad,
+        'tipo_actividad': actividad.tipo_actividad,
+        'tipo_actividad_display': actividad.get_tipo_actividad_display(),
+        'descripcion': actividad.descripcion,
+        'donde': actividad.donde,
+        'link': actividad.link,
+        'imagen_url': actividad.imagen.url if actividad.imagen else '',
+        # Series: la fecha de arriba es la de esta ocurrencia; la serie empieza en inicio_serie
+        'recurrencia': actividad.recurrencia,
+        'intervalo': actividad.intervalo,
+        'recurrencia_hasta': actividad.recurrencia_hasta.isoformat() if actividad.recurrencia_hasta else None,
+        'inicio_serie': getattr(actividad, 'inicio_serie', actividad.fecha).isoformat() if actividad.recurrencia else None,
+    }
+
+
+def serialize_detalle(actividad):
+    """serialize_actividad más es_hoy y es_pasada"""
+    datos = serialize_actividad(actividad)
+    datos['es_hoy'] = actividad.es_hoy()
+    datos['es_pasada'] = actividad.es_pasada()
+    return datos
+
+
+def build_month(year, month):
+    """
+    Rejilla del mes: lista de semanas, cada una con 7 celdas
+    {'dia' (0 fuera del mes), 'weekday', 'actividades'}, y el JSON
+    {"año,mes,día": [actividades]} para el JavaScript
+    """
+    first_day, last_day = month_range(year, month)
+    actividades_mes = activities_in_range(first_day, last_day)
+
+    # Organizar actividades por día
+    actividades_por_dia = {}
+    for actividad in actividades_mes:
+        actividades_por_dia.setdefault(actividad.fecha.day, []).append(serialize_actividad(actividad))
+
+    # Cada celda lleva ya sus actividades: la plantilla no busca nada
+    cal = calendar.Calendar(firstweekday=0)  # Lunes como primer día
+    semanas = [
+        [
+            {'dia': day, 'weekday': weekday, 'actividades': actividades_por_dia.get(day, [])}
+            for day, weekday in week
+        ]
+        for week in cal.monthdays2calendar(year, month)
+    ]
+
+    actividades_json = {
+        f"{year},{month},{dia}": lista for dia, lista in actividades_por_dia.items()
+    }
+
+    return {
+        'semanas': semanas,
+        'actividades_json': json.dumps(actividades_json),
+    }
+
+
+def get_month(year, month):
+    """Rejilla del mes desde la caché (se construye si no está)"""
+    key = f'actividades:calendario:{FORMATO}:{calendar_version()}:{year}:{month}:{get_language()}'
+    datos = cache.get(key)
+    if datos is None:
+        datos = build_month(year, month)
+        cache.set(key, datos, CACHE_TIMEOUT)
+    return datos
+
+
+# Rango máximo de la API (un año)
+MAX_RANGE_DAYS = 366
+
+
+def activities_in_range(desde, hasta):
+    """Actividades activas entre dos fechas (incluidas) con las series expandidas, por fecha y hora"""
+    from .models import Actividad
+
+    return expand(Actividad.objects.filter(range_filter(desde, hasta), activa=True), desde, hasta)
+
+
+def range_etag(desde, hasta):
+    """
+    ETag de las actividades de un rango: la última fecha_actualizacion del
+    rango (también de las desactivadas, que cuentan como cambio), el número de
+    actividades activas (detecta los borrados), el idioma y el día de hoy
+    (es_hoy / es_pasada). Cuentan también las series que llegan al rango y las
+    fechas modificadas de una serie que estaban en el rango.
+    """
+    from .models import Actividad
+
+    filas = Actividad.objects.filter(
+        range_filter(desde, hasta)
+        | Q(serie__isnull=False, fecha_original__gte=desde, fecha_original__lte=hasta)
+    )
+    resumen = filas.aggregate(
+        ultima=Max('fecha_actualizacion'),
+        activas=Count('id', filter=Q(activa=True)),
+    )
+    ultima = resumen['ultima'].isoformat() if resumen['ultima'] else ''
+    clave = f"{desde}:{hasta}:{ultima}:{resumen['activas']}:{get_language()}:{timezone.localdate()}"
+    return '"%s"' % hashlib.sha1(clave.encode('utf-8')).hexdigest()[:20]
@@ -0,0 +1,209 @@
+"""
+Calendario de actividades en formato iCalendar (.ics)
+
+Las familias se suscriben desde Google Calendar, el calendario del móvil,
+Outlook... y la aplicación consulta el feed periódicamente. Para que esas
+consultas sean baratas:
+
+- Cada actividad se convierte en su VEVENT una sola vez por versión
+  (id + fecha_actualizacion + idioma) y se guarda en la caché, así que al
+  cambiar una actividad solo se regenera esa.
+- El feed completo se guarda por (idioma, tipo) con su ETag y Last-Modified
+  y se descarta al guardar o borrar una actividad (misma versión que el
+  calendario mensual, ver actividades_calendar.py).
+- La vista responde 304 a las peticiones condicionales.
+
+Las series (actividades que se repiten) se envían ya expandidas, una VEVENT
+por fecha y solo hasta DIAS_FUTUROS días vista: así no hace falta VTIMEZONE
+ni que cada aplicación interprete bien RRULE/EXDATE.
+
+Se escribe a mano (RFC 5545): escapes, líneas plegadas a 75 octetos y CRLF.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.translation import get_language, gettext as _
+
+from .actividades_calendar import CACHE_TIMEOUT, calendar_version
+from .actividades_recurrencia import expand, range_filter
+
+PRODID = '-//APYMA Remontival//Actividades//ES'
+
+UID_DOMAIN = 'apyma-remontival'
+
+# Las actividades pasadas hace más de esto no se incluyen (el feed no crece sin límite)
+DIAS_PASADOS = 365
+
+# Las series se expanden hasta esta distancia (el feed se vuelve a pedir cada hora)
+DIAS_FUTUROS = 365
+
+# Cada cuánto deben volver a consultar el feed las aplicaciones
+REFRESH_INTERVAL = 'PT1H'
+
+
+def escape_text(valor):
+    """Escapa un valor de texto (TEXT) de iCalendar"""
+    return (
+        str(valor)
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+        .replace('\r', '\\n')
+    )
+
+
+def fold_line(linea):
+    """Pliega una línea a 75 octetos (las continuaciones empiezan por un espacio)"""
+    datos = linea.encode('utf-8')
+    if len(datos) <= 75:
+        return linea
+
+    partes = []
+    actual = ''
+    limite = 75
+    for caracter in linea:
+        if len((actual + caracter).encode('utf-8')) > limite:
+            partes.append(actual)
+            actual = caracter
+            limite = 74  # El espacio inicial cuenta
+        else:
+            actual += caracter
+    partes.append(actual)
+    return '\r\n '.join(partes)
+
+
+def format_utc(valor):
+    return valor.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def event_times(actividad):
+    """Inicio y fin (o None) en UTC. Si termina antes de empezar, acaba al día siguiente"""
+    zona = ZoneInfo(settings.TIME_ZONE)
+    inicio = datetime.combine(actividad.fecha, actividad.hora_comienzo, tzinfo=zona)
+    fin = None
+    if actividad.hora_finalizacion:
+        fin = datetime.combine(actividad.fecha, actividad.hora_finalizacion, tzinfo=zona)
+        if fin < inicio:
+            fin += timedelta(days=1)
+    return inicio, fin
+
+
+def event_uid(actividad):
+    """UID estable: el id de la actividad y, en las series, la fecha de la ocurrencia"""
+    if actividad.recurrencia:
+        return f'actividad-{actividad.id}-{actividad.fecha:%Y%m%d}@{UID_DOMAIN}'
+    return f'actividad-{actividad.id}@{UID_DOMAIN}'
+
+
+def build_event(actividad):
+    """Texto del VEVENT de una actividad (en el idioma activo)"""
+    inicio, fin = event_times(actividad)
+    titulo = actividad.titulo or actividad.get_tipo_actividad_display()
+
+    lineas = [
+        'BEGIN:VEVENT',
+        f'UID:{event_uid(actividad)}',
+        f'DTSTAMP:{format_utc(actividad.fecha_actualizacion)}',
+        f'LAST-MODIFIED:{format_utc(actividad.fecha_actualizacion)}',
+        f'DTSTART:{format_utc(inicio)}',
+    ]
+    if fin:
+        lineas.append(f'DTEND:{format_utc(fin)}')
+    lineas += [
+        f'SUMMARY:{escape_text(titulo)}',
+        f'CATEGORIES:{escape_text(actividad.get_tipo_actividad_display())}',
+    ]
+    if actividad.descripcion:
+        lineas.append(f'DESCRIPTION:{escape_text(actividad.descripcion)}')
+    if actividad.donde:
+        lineas.append(f'LOCATION:{escape_text(actividad.donde)}')
+    if actividad.link:
+        lineas.append(f'URL:{actividad.link}')
+    lineas.append('END:VEVENT')
+
+    return '\r\n'.join(fold_line(linea) for linea in lineas)
+
+
+def event_cache_key(actividad, idioma):
+    return (
+        f'actividades:ical:evento:{actividad.id}:{actividad.fecha:%Y%m%d}:'
+        f'{actividad.fecha_actualizacion.timestamp()}:{idioma}'
+    )
+
+
+def build_feed(tipo=None):
+    """
+    Genera el feed del idioma activo (solo de un tipo si se indica).
+    Retorna {'ics': bytes, 'etag', 'last_modified' (timestamp)}.
+    """
+    from .models import Actividad
+
+    idioma = get_language()
+    hoy = timezone.localdate()
+    desde = hoy - timedelta(days=DIAS_PASADOS)
+    hasta = hoy + timedelta(days=DIAS_FUTUROS)
+    actividades = Actividad.objects.filter(
+        Q(recurrencia='', fecha__gte=desde) | range_filter(desde, hasta),
+        activa=True,
+    )
+    if tipo:
+        actividades = actividades.filter(tipo_actividad=tipo)
+    actividades = expand(actividades, desde, hasta)
+
+    # Solo se generan los VEVENT de las actividades nuevas o modificadas
+    claves = [event_cache_key(actividad, idioma) for actividad in actividades]
+    guardados = cache.get_many(claves)
+    nuevos = {}
+    eventos = []
+    for actividad, clave in zip(actividades, claves):
+        evento = guardados.get(clave)
+        if evento is None:
+            evento = build_event(actividad)
+            nuevos[clave] = evento
+        eventos.append(evento)
+    if nuevos:
+        cache.set_many(nuevos, CACHE_TIMEOUT)
+
+    nombre = _('Actividades APYMA Remontival')
+    if tipo:
+        nombre = f'{nombre} - {dict(Actividad.TIPO_ACTIVIDAD_CHOICES)[tipo]}'
+    cabecera = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        fold_line(f'X-WR-CALNAME:{escape_text(nombre)}'),
+        f'X-WR-TIMEZONE:{settings.TIME_ZONE}',
+        f'REFRESH-INTERVAL;VALUE=DURATION:{REFRESH_INTERVAL}',
+        f'X-PUBLISHED-TTL:{REFRESH_INTERVAL}',
+    ]
+    ics = '\r\n'.join(cabecera + eventos + ['END:VCALENDAR']) + '\r\n'
+    ics = ics.encode('utf-8')
+
+    # Last-Modified: el último cambio de cualquier actividad (también las
+    # desactivadas); los borrados los detecta el ETag, que depende del contenido
+    ultima = Actividad.objects.aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+    return {
+        'ics': ics,
+        'etag': '"%s"' % hashlib.sha1(ics).hexdigest()[:20],
+        'last_modified': int(ultima.timestamp()) if ultima else 0,
+    }
+
+
+def get_feed(tipo=None):
+    """Feed del idioma activo desde la caché (se regenera si alguna actividad ha cambiado)"""
+    key = f'actividades:ical:{calendar_version()}:{get_language()}:{tipo or "todas"}'
+    feed = cache.get(key)
+    if feed is None:
+        feed = build_feed(tipo)
+        cache.set(key, feed, CACHE_TIMEOUT)
+    return feed
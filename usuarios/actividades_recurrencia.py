@@ -0,0 +1,139 @@
+"""
+Actividades que se repiten
+
+Una reunión semanal o un taller mensual se guardan como una sola Actividad
+con `recurrencia` ('semanal' o 'mensual'), `intervalo` (cada cuántas semanas
+o meses), `recurrencia_hasta` (opcional) y `excepciones` (fechas que no se
+celebran). Sus fechas no se guardan: se calculan solo para el rango que se
+muestra (el mes del calendario, la API, las próximas de la portada, el feed).
+
+- La primera fecha del rango se calcula directamente (sin recorrer la serie
+  desde el principio), así que una serie de varios años cuesta lo mismo que
+  una de un mes: solo se generan las fechas del rango.
+- Para cambiar una sola fecha se crea una Actividad normal con `serie` y
+  `fecha_original`; esa fecha de la serie deja de mostrarse y en su lugar
+  aparece la modificada (que puede estar en otro día).
+- Las series mensuales se repiten el mismo día del mes; los meses que no
+  tienen ese día (31, 30 o 29 de febrero) se saltan, como en iCalendar.
+
+Las ocurrencias son copias de la serie con otra `fecha` (mismo id): sirven
+para mostrar, no se guardan.
+"""
+
+import calendar
+import copy
+from datetime import date, timedelta
+
+from django.db.models import Q
+
+
+def occurrence_dates(actividad, desde, hasta):
+    """Fechas de la serie entre desde y hasta (incluidas), sin quitar excepciones"""
+    inicio = actividad.fecha
+    fin = hasta
+    if actividad.recurrencia_hasta and actividad.recurrencia_hasta < fin:
+        fin = actividad.recurrencia_hasta
+    desde = max(desde, inicio)
+    if fin < desde:
+        return
+
+    intervalo = max(actividad.intervalo or 1, 1)
+
+    if actividad.recurrencia == 'semanal':
+        paso = 7 * intervalo
+        # Primera fecha >= desde sin recorrer las anteriores
+        saltos = -(-(desde - inicio).days // paso)
+        fecha = inicio + timedelta(days=saltos * paso)
+        while fecha <= fin:
+            yield fecha
+            fecha += timedelta(days=paso)
+
+    elif actividad.recurrencia == 'mensual':
+        mes_inicio = inicio.year * 12 + inicio.month - 1
+        mes_desde = desde.year * 12 + desde.month - 1
+        mes = mes_inicio + max(0, -(-(mes_desde - mes_inicio) // intervalo)) * intervalo
+        while True:
+            year, month = divmod(mes, 12)
+            month += 1
+            if date(year, month, 1) > fin:
+                break
+            if inicio.day <= calendar.monthrange(year, month)[1]:
+                fecha = date(year, month, inicio.day)
+                if desde <= fecha <= fin:
+                    yield fecha
+            mes += intervalo
+
+    elif desde <= inicio <= fin:
+        yield inicio
+
+
+def range_filter(desde, hasta):
+    """Q de las actividades que pueden tener alguna fecha entre desde y hasta"""
+    sueltas = Q(recurrencia='', fecha__gte=desde, fecha__lte=hasta)
+    series = (
+        ~Q(recurrencia='')
+        & Q(fecha__lte=hasta)
+        & (Q(recurrencia_hasta__isnull=True) | Q(recurrencia_hasta__gte=desde))
+    )
+    return sueltas | series
+
+
+def replaced_dates(series, desde, hasta):
+    """{id de la serie: {fechas}} que sustituye una fecha modificada (también las borradas)"""
+    from .models import Actividad
+
+    sustituidas = {}
+    if not series:
+        return sustituidas
+    filas = Actividad.objects.filter(
+        serie__in=[serie.id for serie in series],
+        fecha_original__gte=desde,
+        fecha_original__lte=hasta,
+    ).values_list('serie_id', 'fecha_original')
+    for serie_id, fecha_original in filas:
+        sustituidas.setdefault(serie_id, set()).add(fecha_original)
+    return sustituidas
+
+
+def expand(actividades, desde, hasta):
+    """
+    Ocurrencias de `actividades` (sueltas y series) por fecha y hora. Las
+    sueltas se dejan tal cual; de las series solo las fechas entre desde y
+    hasta, sin excepciones ni las que tienen una fecha modificada.
+    """
+    actividades = list(actividades)
+    series = [actividad for actividad in actividades if actividad.recurrencia]
+    ocurrencias = [actividad for actividad in actividades if not actividad.recurrencia]
+
+    sustituidas = replaced_dates(series, desde, hasta)
+    for serie in series:
+        excluidas = set(serie.excepciones or [])
+        modificadas = sustituidas.get(serie.id, set())
+        for fecha in occurrence_dates(serie, desde, hasta):
+            if fecha in modificadas or fecha.isoformat() in excluidas:
+                continue
+            ocurrencia = copy.copy(serie)
+            ocurrencia.inicio_serie = serie.fecha
+            ocurrencia.fecha = fecha
+            ocurrencias.append(ocurrencia)
+
+    ocurrencias.sort(key=lambda actividad: (actividad.fecha, actividad.hora_comienzo))
+    return ocurrencias
+
+
+def upcoming(desde, limite, horizonte_dias=365):
+    """
+    Las `limite` próximas ocurrencias desde `desde`. El rango llega hasta la
+    última de las `limite` próximas actividades sueltas (o `horizonte_dias`
+    si no hay tantas), así que las series solo se expanden hasta ahí.
+    """
+    from .models import Actividad
+
+    sueltas = Actividad.objects.filter(
+        activa=True, recurrencia='', fecha__gte=desde
+    ).order_by('fecha').values_list('fecha', flat=True)[:limite]
+    sueltas = list(sueltas)
+    hasta = sueltas[-1] if len(sueltas) == limite else desde + timedelta(days=horizonte_dias)
+
+    actividades = Actividad.objects.filter(range_filter(desde, hasta), activa=True)
+    return expand(actividades, desde, hasta)[:limite]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Contacto, Socio, Actividad, Noticia, ConcursoDibujo, ConsejoEducativo
+from .models import Contacto, Socio, Actividad, Noticia, ConcursoDibujo, ConsejoEducativo, MenuComedor, MenuDia, TareaSegundoPlano
 
 @admin.register(Contacto)
 class ContactoAdmin(admin.ModelAdmin):
@@ -43,8 +43,9 @@ class SocioAdmin(admin.ModelAdmin):
 
 @admin.register(Actividad)
 class ActividadAdmin(admin.ModelAdmin):
-    list_display = ('titulo', 'fecha', 'get_hora_completa', 'tipo_actividad', 'activa', 'fecha_creacion')
-    list_filter = ('tipo_actividad', 'activa', 'fecha', 'fecha_creacion')
+    list_display = ('titulo', 'fecha', 'get_hora_completa', 'tipo_actividad', 'recurrencia', 'activa', 'fecha_creacion')
+    list_filter = ('tipo_actividad', 'recurrencia', 'activa', 'fecha', 'fecha_creacion')
+    raw_id_fields = ('serie',)
     search_fields = ('titulo', 'descripcion', 'donde', 'tipo_actividad')
     readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
     list_editable = ('activa',)
@@ -57,6 +58,10 @@ class ActividadAdmin(admin.ModelAdmin):
         ('Fecha y hora', {
             'fields': ('fecha', 'hora_comienzo', 'hora_finalizacion')
         }),
+        ('Repetición', {
+            'fields': ('recurrencia', 'intervalo', 'recurrencia_hasta', 'excepciones', 'serie', 'fecha_original'),
+            'classes': ('collapse',)
+        }),
         ('Contenido adicional', {
             'fields': ('imagen', 'link'),
             'classes': ('collapse',)
@@ -152,3 +157,25 @@ class ConsejoEducativoAdmin(admin.ModelAdmin):
     
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
+
+
+@admin.register(MenuComedor)
+class MenuComedorAdmin(admin.ModelAdmin):
+    list_display = ('anio', 'mes', 'idioma', 'archivo', 'tamano', 'fecha_publicacion')
+    list_filter = ('anio', 'mes', 'idioma')
+    search_fields = ('archivo',)
+    readonly_fields = ('archivo', 'tamano', 'checksum', 'fecha_actualizacion')
+
+
+@admin.register(MenuDia)
+class MenuDiaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'idioma', 'menu', 'energia')
+    list_filter = ('idioma', 'menu')
+    date_hierarchy = 'fecha'
+
+
+@admin.register(TareaSegundoPlano)
+class TareaSegundoPlanoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'progreso', 'intentos', 'creada_por', 'fecha_creacion', 'fecha_fin')
+    list_filter = ('estado', 'tipo')
+    readonly_fields = ('fecha_creacion', 'fecha_inicio', 'fecha_fin')
@@ -0,0 +1,256 @@
+"""
+Búsqueda de texto completo en noticias, actividades y consejos
+
+Cada noticia, actividad o consejo visible tiene sus filas en EntradaBusqueda
+(una por idioma: título y texto ya localizados; las actividades solo tienen
+una, sin idioma, porque no se traducen). Encima de esa tabla hay un índice
+de texto completo que se crea en la migración según la base de datos:
+
+- SQLite: tabla FTS5 de contenido externo (usuarios_busqueda_fts) que se
+  mantiene con triggers. El tokenizador unicode61 quita las tildes; como
+  FTS5 no tiene stemmer de castellano ni de euskera, cada palabra se busca
+  como prefijo ("taller" encuentra "talleres", "bilera" encuentra "bileran").
+  Orden por bm25, con más peso para el título.
+- PostgreSQL: columna tsvector generada (configuración 'spanish' o 'simple'
+  para euskera, título con peso A) con índice GIN. Las palabras también se
+  buscan como prefijo (:*) y se ordena con ts_rank.
+- Otras bases de datos: icontains sobre EntradaBusqueda (sin índice).
+
+Las filas se actualizan al guardar o borrar (señales en usuarios/signals.py);
+`python manage.py reindexar_busqueda` las regenera todas.
+"""
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.html import strip_tags
+
+FTS_TABLE = 'usuarios_busqueda_fts'
+
+# Las búsquedas más largas se recortan
+MAX_TERMINOS = 8
+
+MAX_RESULTADOS = 20
+
+# Longitud del fragmento de texto de cada resultado
+LONGITUD_FRAGMENTO = 200
+
+SQLITE_SQL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        titulo, texto,
+        content='usuarios_entradabusqueda', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER usuarios_busqueda_ai AFTER INSERT ON usuarios_entradabusqueda BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, titulo, texto) VALUES (new.id, new.titulo, new.texto);
+    END""",
+    f"""CREATE TRIGGER usuarios_busqueda_ad AFTER DELETE ON usuarios_entradabusqueda BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, titulo, texto) VALUES ('delete', old.id, old.titulo, old.texto);
+    END""",
+    f"""CREATE TRIGGER usuarios_busqueda_au AFTER UPDATE ON usuarios_entradabusqueda BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, titulo, texto) VALUES ('delete', old.id, old.titulo, old.texto);
+        INSERT INTO {FTS_TABLE}(rowid, titulo, texto) VALUES (new.id, new.titulo, new.texto);
+    END""",
+]
+
+SQLITE_DROP_SQL = [
+    'DROP TRIGGER IF EXISTS usuarios_busqueda_ai',
+    'DROP TRIGGER IF EXISTS usuarios_busqueda_ad',
+    'DROP TRIGGER IF EXISTS usuarios_busqueda_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+# Configuración de texto de cada fila: sin stemmer de euskera en PostgreSQL
+PG_CONFIG = "CASE WHEN idioma = 'eu' THEN 'simple'::regconfig ELSE 'spanish'::regconfig END"
+
+POSTGRESQL_SQL = [
+    f"""ALTER TABLE usuarios_entradabusqueda ADD COLUMN vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector({PG_CONFIG}, coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector({PG_CONFIG}, coalesce(texto, '')), 'B')
+    ) STORED""",
+    'CREATE INDEX usuarios_busqueda_vector_idx ON usuarios_entradabusqueda USING GIN (vector)',
+]
+
+POSTGRESQL_DROP_SQL = [
+    'DROP INDEX IF EXISTS usuarios_busqueda_vector_idx',
+    'ALTER TABLE usuarios_entradabusqueda DROP COLUMN IF EXISTS vector',
+]
+
+
+def create_index(schema_editor):
+    """Crea el índice de texto completo de la base de datos (migración)"""
+    sentencias = {'sqlite': SQLITE_SQL, 'postgresql': POSTGRESQL_SQL}.get(schema_editor.connection.vendor, [])
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def drop_index(schema_editor):
+    sentencias = {'sqlite': SQLITE_DROP_SQL, 'postgresql': POSTGRESQL_DROP_SQL}.get(schema_editor.connection.vendor, [])
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+# Qué se indexa de cada modelo
+
+def noticia_documents(noticia):
+    if not noticia.publicada:
+        return []
+    return [
+        {'idioma': 'es', 'titulo': noticia.titulo,
+         'texto': f'{noticia.resumen}\n{noticia.contenido}'},
+        {'idioma': 'eu', 'titulo': noticia.titulo_eu or noticia.titulo,
+         'texto': f'{noticia.resumen_eu or noticia.resumen}\n{noticia.contenido_eu or noticia.contenido}'},
+    ]
+
+
+def actividad_documents(actividad):
+    if not actividad.activa:
+        return []
+    titulo = actividad.titulo or actividad.get_tipo_actividad_display()
+    return [{'idioma': '', 'titulo': titulo, 'texto': f'{actividad.descripcion}\n{actividad.donde}'}]
+
+
+def consejo_documents(consejo):
+    if not consejo.activo:
+        return []
+    return [
+        {'idioma': 'es', 'titulo': consejo.titulo,
+         'texto': f'{consejo.descripcion}\n{strip_tags(consejo.contenido_html)}'},
+        {'idioma': 'eu', 'titulo': consejo.titulo_eu or consejo.titulo,
+         'texto': f'{consejo.descripcion_eu or consejo.descripcion}\n'
+                  f'{strip_tags(consejo.contenido_html_eu or consejo.contenido_html)}'},
+    ]
+
+
+def object_type(instance):
+    """(tipo, documentos, fecha, slug) de una noticia, actividad o consejo"""
+    nombre = instance._meta.model_name
+    if nombre == 'noticia':
+        return 'noticia', noticia_documents(instance), instance.fecha_publicacion, instance.slug
+    if nombre == 'actividad':
+        fecha = timezone.make_aware(datetime.combine(instance.fecha, instance.hora_comienzo))
+        return 'actividad', actividad_documents(instance), fecha, ''
+    return 'consejo', consejo_documents(instance), instance.fecha_publicacion, instance.slug
+
+
+def index_object(instance, entrada_model=None):
+    """Sustituye las filas de búsqueda de `instance` (sin filas si no es visible)"""
+    if entrada_model is None:
+        from .models import EntradaBusqueda as entrada_model
+
+    tipo, documentos, fecha, slug = object_type(instance)
+    entrada_model.objects.filter(tipo=tipo, objeto_id=instance.pk).delete()
+    entrada_model.objects.bulk_create([
+        entrada_model(tipo=tipo, objeto_id=instance.pk, fecha=fecha, slug=slug,
+                      idioma=documento['idioma'], titulo=documento['titulo'][:200], texto=documento['texto'])
+        for documento in documentos
+    ])
+
+
+def unindex_object(instance):
+    from .models import EntradaBusqueda
+
+    tipo = object_type(instance)[0]
+    EntradaBusqueda.objects.filter(tipo=tipo, objeto_id=instance.pk).delete()
+
+
+def reindex_all(noticia_model=None, actividad_model=None, consejo_model=None, entrada_model=None):
+    """Regenera todas las filas (comando reindexar_busqueda y migración). Retorna cuántos objetos"""
+    if noticia_model is None:
+        from .models import Actividad, ConsejoEducativo, EntradaBusqueda, Noticia
+        noticia_model, actividad_model, consejo_model, entrada_model = Noticia, Actividad, ConsejoEducativo, EntradaBusqueda
+
+    entrada_model.objects.all().delete()
+    total = 0
+    for model in (noticia_model, actividad_model, consejo_model):
+        for instance in model.objects.iterator():
+            index_object(instance, entrada_model)
+            total += 1
+    return total
+
+
+# Consultas
+
+def terms(consulta):
+    """Palabras de la consulta (minúsculas, sin signos), como mucho MAX_TERMINOS"""
+    return re.findall(r'[^\W_]+', consulta.lower())[:MAX_TERMINOS]
+
+
+def search_rows(palabras, idioma, limite):
+    """(tipo, objeto_id, titulo, fragmento, fecha, slug) por relevancia"""
+    from .models import EntradaBusqueda
+
+    ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+    visibles = "e.idioma IN (%s, '') AND NOT (e.tipo = 'noticia' AND e.fecha > %s)"
+    columnas = f'e.tipo, e.objeto_id, e.titulo, substr(e.texto, 1, {LONGITUD_FRAGMENTO}), e.fecha, e.slug'
+
+    if connection.vendor == 'sqlite':
+        # Cada palabra entre comillas (sin operadores de FTS5) y como prefijo
+        match = ' '.join('"%s"*' % palabra.replace('"', '') for palabra in palabras)
+        sql = (
+            f'SELECT {columnas} FROM {FTS_TABLE} f JOIN usuarios_entradabusqueda e ON e.id = f.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s AND {visibles} '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s'
+        )
+        params = [match, idioma, ahora, limite]
+
+    elif connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{palabra}:*' for palabra in palabras)
+        sql = (
+            f"SELECT {columnas} FROM usuarios_entradabusqueda e, "
+            f"(to_tsquery('spanish', %s) || to_tsquery('simple', %s)) q "
+            f'WHERE e.vector @@ q AND {visibles} '
+            f'ORDER BY ts_rank(e.vector, q) DESC LIMIT %s'
+        )
+        params = [tsquery, tsquery, idioma, ahora, limite]
+
+    else:
+        entradas = EntradaBusqueda.objects.filter(idioma__in=[idioma, '']).exclude(tipo='noticia', fecha__gt=timezone.now())
+        for palabra in palabras:
+            entradas = entradas.filter(Q(titulo__icontains=palabra) | Q(texto__icontains=palabra))
+        return [
+            (e.tipo, e.objeto_id, e.titulo, e.texto[:LONGITUD_FRAGMENTO], e.fecha, e.slug)
+            for e in entradas[:limite]
+        ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def result_url(tipo, objeto_id, fecha, slug):
+    """Página donde se ve el resultado (en el idioma activo)"""
+    if tipo == 'consejo':
+        return reverse('consejo_detalle', args=[slug])
+    if tipo == 'actividad':
+        fecha = timezone.localtime(fecha)
+        return f"{reverse('actividades')}?year={fecha.year}&month={fecha.month}"
+    return reverse('noticias_lista')
+
+
+def search(consulta, idioma, limite=MAX_RESULTADOS):
+    """Resultados de la búsqueda en el idioma indicado, por relevancia"""
+    palabras = terms(consulta)
+    if not palabras:
+        return []
+
+    resultados = []
+    for tipo, objeto_id, titulo, fragmento, fecha, slug in search_rows(palabras, idioma, limite):
+        # En SQLite la consulta a mano devuelve la fecha sin zona (está en UTC)
+        if isinstance(fecha, str):
+            fecha = parse_datetime(fecha)
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha, dt_timezone.utc)
+        resultados.append({
+            'tipo': tipo,
+            'id': objeto_id,
+            'titulo': titulo,
+            'fragmento': ' '.join(fragmento.split()),
+            'url': result_url(tipo, objeto_id, fecha, slug),
+        })
+    return resultados
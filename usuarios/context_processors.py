@@ -6,4 +6,14 @@ def css_version(request):
     """
     return {
         'css_version': str(int(time.time()))
-    }
\ No newline at end of file
+    }
+
+def public_page_csrf(request):
+    """
+    En las páginas que guarda paginas_cache.public_page el token CSRF es una
+    marca que se sustituye por el de cada visitante al servir la página
+    """
+    if getattr(request, 'pagina_publica', False):
+        from .paginas_cache import CSRF_MARCA
+        return {'csrf_token': CSRF_MARCA}
+    return {}
@@ -0,0 +1,290 @@
+"""
+Entrega de archivos protegidos (menús, documentos)
+
+Las vistas hacen sus propias comprobaciones (extensión, contención en el
+directorio permitido) y delegan aquí el envío: el archivo se transmite por
+bloques con FileResponse, que usa wsgi.file_wrapper cuando el servidor lo
+ofrece, y las peticiones condicionales se responden con 304.
+
+También se atienden peticiones Range (206 Partial Content), de un rango o de
+varios (multipart/byteranges), para que los visores de PDF del navegador
+puedan mostrar la primera página sin descargar el archivo entero.
+
+Con settings.MEDIA_OFFLOAD = 'nginx' o 'apache' el envío se delega al
+servidor web (X-Accel-Redirect / X-Sendfile) y el worker de Django queda
+libre en cuanto termina las comprobaciones. Sin proxy configurado se
+transmite desde Python como siempre.
+"""
+
+import mimetypes
+import os
+import re
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Más rangos que estos en una misma petición se ignoran y se envía el archivo completo
+MAX_RANGES = 16
+
+RANGE_SPEC_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+# Temporales de descargas y separaciones que nunca se sirven
+EXCLUDED_SUFFIXES = ('.part', '.part.json', '.separando', '.descarga', '.linearizando', '.tmp')
+
+
+def is_private_path(relative):
+    """
+    Rutas de media/ que no se sirven aunque estén dentro de MEDIA_ROOT:
+    segmentos vacíos o que empiezan por punto ('..', .media_manifest.json),
+    bytes nulos y temporales (.part, .separando...)
+    """
+    partes = relative.split('/')
+    return (
+        '\x00' in relative
+        or not all(partes)
+        or any(parte.startswith('.') for parte in partes)
+        or relative.endswith(EXCLUDED_SUFFIXES)
+    )
+
+
+def file_etag(stat_result):
+    """ETag fuerte a partir del tamaño y la fecha de modificación (en ns)"""
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_range_header(header, size):
+    """
+    Interpreta una cabecera Range ('bytes=0-499,1000-') para un archivo de `size` bytes.
+
+    Retorna None si la cabecera no es válida (se ignora y se sirve el archivo
+    completo), una lista vacía si ningún rango es satisfacible, o la lista de
+    rangos (inicio, fin) inclusivos, ordenados y sin solapes.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        match = RANGE_SPEC_RE.match(part)
+        if not match:
+            return None
+
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            # Sufijo: los últimos N bytes
+            suffix = int(last)
+            if suffix == 0:
+                continue
+            start = max(size - suffix, 0)
+            end = size - 1
+        else:
+            return None
+
+        ranges.append((start, end))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Unir rangos solapados o contiguos
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def if_range_matches(if_range, etag, last_modified):
+    """
+    Comprueba el valor de If-Range: el rango solo se aplica si el archivo no
+    ha cambiado (lo usan las vistas y media_wsgi)
+    """
+    if_range = (if_range or '').strip()
+    if not if_range:
+        return True
+
+    if if_range.startswith('"'):
+        # Comparación fuerte de ETag
+        return if_range == etag
+
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def iter_file_range(file_path, start, end, chunk_size=STREAM_CHUNK_SIZE):
+    """Lee del archivo los bytes start..end (inclusivos) por bloques"""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def multipart_byteranges(file_path, ranges, size, content_type):
+    """
+    Prepara una respuesta multipart/byteranges.
+    Retorna (boundary, content_length, iterador del cuerpo).
+    """
+    boundary = uuid.uuid4().hex
+    partes = []
+    content_length = 0
+
+    for start, end in ranges:
+        cabecera = (
+            f'--{boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n'
+            '\r\n'
+        ).encode('ascii')
+        partes.append((cabecera, start, end))
+        content_length += len(cabecera) + (end - start + 1) + 2
+
+    cierre = f'--{boundary}--\r\n'.encode('ascii')
+    content_length += len(cierre)
+
+    def body():
+        for cabecera, start, end in partes:
+            yield cabecera
+            yield from iter_file_range(file_path, start, end)
+            yield b'\r\n'
+        yield cierre
+
+    return boundary, content_length, body()
+
+
+def offload_headers(file_path, media_root=None):
+    """
+    Cabecera [(nombre, valor)] para que nginx (X-Accel-Redirect) o Apache
+    (X-Sendfile) envíen el archivo (la usan las vistas y media_wsgi).
+    Retorna None si no hay proxy configurado o el archivo está fuera de MEDIA_ROOT.
+    """
+    mode = getattr(settings, 'MEDIA_OFFLOAD', None)
+    if mode not in ('nginx', 'apache'):
+        return None
+
+    media_root = os.path.realpath(media_root or settings.MEDIA_ROOT)
+    real_path = os.path.realpath(file_path)
+    if os.path.commonpath([real_path, media_root]) != media_root:
+        return None
+
+    if mode == 'nginx':
+        # La location interna de nginx apunta a MEDIA_ROOT
+        relative_path = os.path.relpath(real_path, media_root).replace(os.sep, '/')
+        prefix = getattr(settings, 'MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+        return [('X-Accel-Redirect', prefix.rstrip('/') + '/' + quote(relative_path))]
+
+    # mod_xsendfile necesita la ruta absoluta (y XSendFilePath con MEDIA_ROOT)
+    return [('X-Sendfile', real_path)]
+
+
+def offload_response(file_path, filename, content_type, as_attachment):
+    """
+    Respuesta vacía con la cabecera para que nginx/Apache envíen el archivo.
+    Retorna None si no hay proxy configurado o el archivo está fuera de MEDIA_ROOT.
+    """
+    headers = offload_headers(file_path)
+    if headers is None:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    for header, value in headers:
+        response[header] = value
+    return response
+
+
+def serve_file(request, file_path, filename=None, content_type=None, as_attachment=False):
+    """
+    Sirve un archivo ya validado por la vista.
+    Si hay un proxy configurado le delega el envío; si no, responde 304 a
+    If-None-Match / If-Modified-Since, 206 a peticiones Range y, en otro caso,
+    transmite el archivo completo por bloques.
+    """
+    filename = filename or os.path.basename(file_path)
+    if content_type is None:
+        content_type, _ = mimetypes.guess_type(file_path)
+    content_type = content_type or 'application/octet-stream'
+
+    # nginx/Apache se encargan de ETag, 304 y Range
+    response = offload_response(file_path, filename, content_type, as_attachment)
+    if response is not None:
+        return response
+
+    stat_result = os.stat(file_path)
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    last_modified = int(stat_result.st_mtime)
+
+    validators = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+    }
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        if isinstance(conditional, HttpResponseNotModified):
+            for header, value in validators.items():
+                conditional[header] = value
+        return conditional
+
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    ranges = None
+    if range_header and request.method in ('GET', 'HEAD') and if_range_matches(if_range, etag, last_modified):
+        ranges = parse_range_header(range_header, size)
+
+    if ranges is None:
+        response = FileResponse(
+            open(file_path, 'rb'),
+            content_type=content_type,
+            as_attachment=as_attachment,
+            filename=filename,
+        )
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            iter_file_range(file_path, start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        boundary, content_length, body = multipart_byteranges(file_path, ranges, size, content_type)
+        response = StreamingHttpResponse(
+            body,
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = str(content_length)
+
+    if ranges:
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+
+    for header, value in validators.items():
+        response[header] = value
+
+    return response
@@ -68,7 +68,10 @@ class ContactoForm(forms.Form):
 class ActividadForm(forms.ModelForm):
     class Meta:
         model = Actividad
-        fields = ['fecha', 'titulo', 'hora_comienzo', 'hora_finalizacion', 'descripcion', 'donde', 'imagen', 'link', 'tipo_actividad']
+        fields = [
+            'fecha', 'titulo', 'hora_comienzo', 'hora_finalizacion', 'descripcion', 'donde', 'imagen', 'link',
+            'tipo_actividad', 'recurrencia', 'intervalo', 'recurrencia_hasta',
+        ]
         widgets = {
             'fecha': forms.DateInput(attrs={
                 'class': 'form-control',
@@ -105,7 +108,18 @@ class ActividadForm(forms.ModelForm):
             }),
             'tipo_actividad': forms.Select(attrs={
                 'class': 'form-select'
-            })
+            }),
+            'recurrencia': forms.Select(attrs={
+                'class': 'form-select'
+            }),
+            'intervalo': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': 1
+            }),
+            'recurrencia_hasta': forms.DateInput(attrs={
+                'class': 'form-control',
+                'type': 'date'
+            }, format='%Y-%m-%d'),
         }
     
     def __init__(self, *args, **kwargs):
@@ -115,6 +129,21 @@ class ActividadForm(forms.ModelForm):
         self.fields['donde'].required = False
         self.fields['imagen'].required = False
         self.fields['link'].required = False
+        self.fields['recurrencia'].required = False
+        self.fields['intervalo'].required = False
+        self.fields['recurrencia_hasta'].required = False
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('intervalo'):
+            cleaned_data['intervalo'] = 1
+        fecha = cleaned_data.get('fecha')
+        hasta = cleaned_data.get('recurrencia_hasta')
+        if cleaned_data.get('recurrencia') and fecha and hasta and hasta < fecha:
+            self.add_error('recurrencia_hasta', _('La repetición no puede terminar antes de la fecha de la actividad'))
+        if not cleaned_data.get('recurrencia'):
+            cleaned_data['recurrencia_hasta'] = None
+        return cleaned_data
 
 
 class NoticiaForm(forms.ModelForm):
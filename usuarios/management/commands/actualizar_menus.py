@@ -3,10 +3,6 @@ from django.conf import settings
 import os
 import sys
 
-# Agregar el directorio de scripts al path
-scripts_path = os.path.join(settings.BASE_DIR, 'scripts')
-sys.path.append(scripts_path)
-
 class Command(BaseCommand):
     help = 'Actualiza los menús del comedor automáticamente'
     
@@ -14,7 +10,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Forzar descarga incluso si los archivos ya existen',
+            help='Forzar descarga y separación incluso si el PDF no ha cambiado',
         )
         parser.add_argument(
             '--simple',
@@ -23,16 +19,23 @@ class Command(BaseCommand):
         )
     
     def handle(self, *args, **options):
+        # Los descargadores se importan aquí y no al cargar el comando
+        scripts_path = os.path.join(settings.BASE_DIR, 'scripts')
+        if scripts_path not in sys.path:
+            sys.path.append(scripts_path)
+        
         try:
             if options['simple']:
                 self.stdout.write("🔍 Usando descargador simple (sin login)...")
                 from download_menus_simple_new import SimpleMenuDownloader
                 downloader = SimpleMenuDownloader()
+                downloader.force = options['force']
                 success = downloader.download_latest_menus()
             else:
                 self.stdout.write("🔍 Usando descargador automático (con login)...")
                 from download_menus_automated import AutomatedMenuDownloader
                 downloader = AutomatedMenuDownloader()
+                downloader.force = options['force']
                 
                 # Cargar credenciales guardadas
                 if downloader.load_credentials():
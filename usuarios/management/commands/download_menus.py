@@ -3,11 +3,18 @@ from django.conf import settings
 import os
 import sys
 
-# Agregar el directorio de scripts al path
-scripts_path = os.path.join(settings.BASE_DIR, 'scripts')
-sys.path.append(scripts_path)
 
-from download_menus_automated import AutomatedMenuDownloader
+def get_downloader_class():
+    """
+    Importa el descargador solo cuando se usa: cargar el comando (p. ej. al
+    ejecutar migrate o help) no debe importar requests, BeautifulSoup ni pypdf
+    """
+    scripts_path = os.path.join(settings.BASE_DIR, 'scripts')
+    if scripts_path not in sys.path:
+        sys.path.append(scripts_path)
+
+    from download_menus_automated import AutomatedMenuDownloader
+    return AutomatedMenuDownloader
 
 class Command(BaseCommand):
     help = 'Descarga automáticamente los menús del comedor desde El Gusto de Crecer'
@@ -63,7 +70,7 @@ class Command(BaseCommand):
             )
             return
         
-        downloader = AutomatedMenuDownloader(email, password)
+        downloader = get_downloader_class()(email, password)
         if downloader.save_credentials(email, password):
             self.stdout.write(
                 self.style.SUCCESS('✅ Credenciales guardadas exitosamente')
@@ -79,7 +86,7 @@ class Command(BaseCommand):
             self.style.SUCCESS('=== Descarga de Menús del Comedor ===')
         )
         
-        downloader = AutomatedMenuDownloader(email, password)
+        downloader = get_downloader_class()(email, password)
         
         try:
             success = downloader.download_latest_menus()
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+import time
+
+from usuarios.tasks import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Procesa las tareas en segundo plano pendientes (separar PDFs de menús, etc.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='No terminar: seguir comprobando la cola cada --intervalo segundos',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=5,
+            help='Segundos entre comprobaciones en modo continuo (por defecto 5)',
+        )
+        parser.add_argument(
+            '--max',
+            type=int,
+            default=None,
+            help='Número máximo de tareas a procesar en cada pasada',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for tarea in procesar_pendientes(options['max']):
+                if tarea.estado == 'completada':
+                    self.stdout.write(self.style.SUCCESS(f"✅ {tarea}: {tarea.mensaje}"))
+                else:
+                    self.stdout.write(self.style.ERROR(f"❌ {tarea}: {tarea.mensaje}"))
+
+            if not options['continuo']:
+                break
+
+            time.sleep(options['intervalo'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Regenera el índice de búsqueda de noticias, actividades y consejos'
+
+    def handle(self, *args, **options):
+        from usuarios.busqueda import reindex_all
+
+        total = reindex_all()
+        self.stdout.write(self.style.SUCCESS(f"✅ Índice de búsqueda regenerado ({total} objetos)"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.menu_catalog import sync_catalog
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza el catálogo de menús con los PDFs de media/comedor'
+
+    def handle(self, *args, **options):
+        registrados, eliminados = sync_catalog()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Catálogo sincronizado: {registrados} menús registrados, {eliminados} entradas eliminadas'
+            )
+        )
@@ -0,0 +1,245 @@
+"""
+Entrega de /media/ en la capa WSGI, antes de Django
+
+Las imágenes de noticias, actividades y del concurso de dibujo, los menús y
+sus páginas se piden muchas veces por visita. Si pasan por Django cada una
+atraviesa todos los middleware (sesión, idioma, CSRF...) y la resolución de
+URLs. MediaWSGIMiddleware envuelve la aplicación WSGI y responde directamente
+a las rutas de MEDIA_URL:
+
+- Solo archivos dentro de MEDIA_ROOT: se rechazan segmentos que empiezan por
+  punto ('..', archivos ocultos), bytes nulos, enlaces que salen del
+  directorio y los temporales (.part, .separando...).
+- ETag y Last-Modified, con 304 para If-None-Match / If-Modified-Since.
+- Cache-Control: las URLs con ?v=<versión> no cambian nunca (un año,
+  immutable); el resto se cachea MEDIA_CACHE_MAX_AGE segundos y luego se
+  revalida con el ETag.
+- Variantes precomprimidas: si existe archivo.br o archivo.gz (y no es más
+  antiguo que el original) se envía según Accept-Encoding.
+- Range de un solo rango (206) para el original sin comprimir.
+- El cuerpo se envía con wsgi.file_wrapper (sendfile) si el servidor lo ofrece.
+
+Con MEDIA_OFFLOAD = 'nginx' o 'apache' solo se responde con la cabecera de
+envío interno, igual que hace file_serving para las vistas.
+"""
+
+import mimetypes
+import os
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.utils.http import http_date, parse_http_date_safe
+
+from .file_serving import (
+    STREAM_CHUNK_SIZE, file_etag, if_range_matches, is_private_path, iter_file_range, offload_headers,
+    parse_range_header,
+)
+
+# Un año: el máximo que respetan los navegadores
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Content-Encoding y extensión de las variantes precomprimidas, por preferencia
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+# Solo se buscan variantes de los tipos que se comprimen bien
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+STATUS_TEXT = {
+    200: '200 OK',
+    206: '206 Partial Content',
+    304: '304 Not Modified',
+    404: '404 Not Found',
+    405: '405 Method Not Allowed',
+    416: '416 Range Not Satisfiable',
+}
+
+
+def accepted_encodings(header):
+    """Codificaciones aceptadas por el cliente (sin las de q=0)"""
+    aceptadas = set()
+    for parte in (header or '').split(','):
+        token, _, params = parte.partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q=') and params[2:] in ('0', '0.0', '0.00', '0.000'):
+            continue
+        aceptadas.add(token)
+    return aceptadas
+
+
+def etag_matches(header, etag):
+    """If-None-Match (comparación débil, admite listas y '*')"""
+    if header.strip() == '*':
+        return True
+    bare = etag.removeprefix('W/')
+    return any(candidato.strip().removeprefix('W/') == bare for candidato in header.split(','))
+
+
+class MediaWSGIMiddleware:
+    """Sirve MEDIA_URL desde MEDIA_ROOT y pasa el resto de peticiones a `application`"""
+
+    def __init__(self, application, media_root=None, media_url=None):
+        self.application = application
+        self.media_root = os.path.realpath(media_root or settings.MEDIA_ROOT)
+        self.prefix = media_url or settings.MEDIA_URL
+        self.max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)
+
+    def __call__(self, environ, start_response):
+        path_info = environ.get('PATH_INFO', '')
+        if not path_info.startswith(self.prefix):
+            return self.application(environ, start_response)
+        return self.serve(environ, start_response, path_info[len(self.prefix):])
+
+    def resolve(self, relative):
+        """Ruta real del archivo pedido, o None si no se puede servir"""
+        try:
+            # PATH_INFO llega como latin-1 (PEP 3333); las rutas son UTF-8
+            relative = relative.encode('latin-1').decode('utf-8')
+        except UnicodeError:
+            return None
+
+        if is_private_path(relative):
+            return None
+
+        file_path = os.path.realpath(os.path.join(self.media_root, *relative.split('/')))
+        if os.path.commonpath([file_path, self.media_root]) != self.media_root:
+            return None
+        if not os.path.isfile(file_path):
+            return None
+        return file_path
+
+    def cache_control(self, environ):
+        if 'v' in parse_qs(environ.get('QUERY_STRING', '')):
+            return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return f'public, max-age={self.max_age}'
+
+    def respond(self, start_response, status, headers, body=b''):
+        headers.append(('Content-Length', str(len(body))))
+        start_response(STATUS_TEXT[status], headers)
+        return [body]
+
+    def select_variant(self, environ, file_path, stat_result, content_type):
+        """
+        Retorna (ruta, stat, Content-Encoding o None, hay variantes) para enviar
+        la variante precomprimida que acepte el cliente o el original
+        """
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return file_path, stat_result, None, False
+
+        aceptadas = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING'))
+        hay_variantes = False
+        for encoding, extension in PRECOMPRESSED:
+            try:
+                variante = os.stat(file_path + extension)
+            except OSError:
+                continue
+            # Una variante más antigua que el original está desactualizada
+            if variante.st_mtime < stat_result.st_mtime:
+                continue
+            hay_variantes = True
+            if encoding in aceptadas:
+                return file_path + extension, variante, encoding, True
+        return file_path, stat_result, None, hay_variantes
+
+    def serve(self, environ, start_response, relative):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        if method not in ('GET', 'HEAD'):
+            return self.respond(start_response, 405, [('Allow', 'GET, HEAD'), ('Content-Type', 'text/plain')],
+                                b'Method not allowed')
+
+        file_path = self.resolve(relative)
+        if file_path is None:
+            return self.respond(start_response, 404, [('Content-Type', 'text/plain')], b'Not found')
+
+        content_type, _ = mimetypes.guess_type(file_path)
+        content_type = content_type or 'application/octet-stream'
+        headers = [
+            ('Content-Type', content_type),
+            ('Cache-Control', self.cache_control(environ)),
+            ('X-Content-Type-Options', 'nosniff'),
+        ]
+
+        # nginx/Apache envían el archivo (X-Accel-Redirect / X-Sendfile)
+        offload = offload_headers(file_path, self.media_root)
+        if offload is not None:
+            return self.respond(start_response, 200, headers + offload)
+
+        try:
+            stat_result = os.stat(file_path)
+        except OSError:
+            return self.respond(start_response, 404, [('Content-Type', 'text/plain')], b'Not found')
+
+        file_path, stat_result, encoding, hay_variantes = self.select_variant(
+            environ, file_path, stat_result, content_type
+        )
+        etag = file_etag(stat_result)
+        last_modified = int(stat_result.st_mtime)
+        headers += [('ETag', etag), ('Last-Modified', http_date(last_modified))]
+        if hay_variantes:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        else:
+            headers.append(('Accept-Ranges', 'bytes'))
+
+        # Peticiones condicionales: If-None-Match manda sobre If-Modified-Since
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = parse_http_date_safe(environ.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_none_match:
+            no_modificado = etag_matches(if_none_match, etag)
+        else:
+            no_modificado = if_modified_since is not None and last_modified <= if_modified_since
+        if no_modificado:
+            headers = [(k, v) for k, v in headers if k != 'Content-Type']
+            start_response(STATUS_TEXT[304], headers)
+            return []
+
+        size = stat_result.st_size
+        rango = None
+        range_header = environ.get('HTTP_RANGE')
+        if range_header and not encoding and if_range_matches(environ.get('HTTP_IF_RANGE'), etag, last_modified):
+            rangos = parse_range_header(range_header, size)
+            if rangos == []:
+                headers.append(('Content-Range', f'bytes */{size}'))
+                return self.respond(start_response, 416, headers)
+            # Varios rangos (multipart) solo los piden los visores de PDF, que
+            # pasan por /comedor/pdf/; aquí se envía el archivo completo
+            if rangos and len(rangos) == 1:
+                rango = rangos[0]
+
+        if rango:
+            start, end = rango
+            headers += [('Content-Range', f'bytes {start}-{end}/{size}'), ('Content-Length', str(end - start + 1))]
+            start_response(STATUS_TEXT[206], headers)
+            if method == 'HEAD':
+                return []
+            return iter_file_range(file_path, start, end)
+
+        headers.append(('Content-Length', str(size)))
+        start_response(STATUS_TEXT[200], headers)
+        if method == 'HEAD':
+            return []
+
+        f = open(file_path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            # El servidor puede usar sendfile() sin pasar los bytes por Python
+            return file_wrapper(f, STREAM_CHUNK_SIZE)
+        return self.iter_file(f)
+
+    @staticmethod
+    def iter_file(f):
+        try:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+                yield chunk
+        finally:
+            f.close()
+
+
+def wrap_application(application):
+    """Envuelve la aplicación WSGI si MEDIA_WSGI está activado"""
+    if getattr(settings, 'MEDIA_WSGI', True):
+        return MediaWSGIMiddleware(application)
+    return application
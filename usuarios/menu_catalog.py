@@ -0,0 +1,236 @@
+"""
+Catálogo de menús del comedor
+
+Los PDFs se guardan en media/comedor/ y cada uno queda registrado en el modelo
+MenuComedor con su año, mes, idioma, tamaño y checksum. Las vistas consultan
+el catálogo en lugar de recorrer el directorio en cada petición.
+"""
+
+import hashlib
+import os
+import re
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .menu_days import store_menu_days
+from .menu_images import remove_menu_images, render_menu_images
+from .pdf_tools import linearize_pdf
+
+MESES = [
+    'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+    'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
+]
+
+IDIOMAS = ['castellano', 'euskera']
+
+# menu_enero_castellano.pdf (formato antiguo) o menu_enero_2026_castellano.pdf
+MENU_FILENAME_RE = re.compile(
+    r'^menu_([a-z]+)(?:_(\d{4}))?_(castellano|euskera)\.pdf$',
+    re.IGNORECASE
+)
+
+
+def get_comedor_dir():
+    """Retorna el directorio donde se guardan los menús"""
+    return os.path.join(settings.MEDIA_ROOT, 'comedor')
+
+
+def mes_numero(nombre_mes):
+    """Convierte 'enero' en 1, 'febrero' en 2... Retorna None si no es un mes"""
+    nombre_mes = (nombre_mes or '').lower()
+    if nombre_mes in MESES:
+        return MESES.index(nombre_mes) + 1
+    return None
+
+
+def menu_filename(anio, mes, idioma):
+    """Nombre del archivo de un menú: menu_<mes>_<año>_<idioma>.pdf"""
+    return f'menu_{MESES[mes - 1]}_{anio}_{idioma}.pdf'
+
+
+def parse_menu_filename(filename):
+    """
+    Extrae (año, mes, idioma) del nombre de un archivo de menú.
+    El año es None para los archivos con el formato antiguo sin año.
+    """
+    match = MENU_FILENAME_RE.match(filename)
+    if not match:
+        return None
+
+    nombre_mes, anio, idioma = match.groups()
+    mes = mes_numero(nombre_mes)
+    if mes is None:
+        return None
+
+    return (int(anio) if anio else None), mes, idioma.lower()
+
+
+def file_checksum(file_path):
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def register_menu(anio, mes, idioma, filename, fecha_publicacion=None, linearizar=True):
+    """
+    Registra (o actualiza) un menú en el catálogo.
+    Se llama después de escribir el PDF en media/comedor/; antes de calcular
+    tamaño y checksum se lineariza para que los visores carguen por partes
+    (linearizar=False si ya se linearizó antes de publicarlo).
+    """
+    from .models import MenuComedor
+
+    file_path = os.path.join(get_comedor_dir(), filename)
+    if linearizar:
+        linearize_pdf(file_path)
+
+    menu, _ = MenuComedor.objects.update_or_create(
+        anio=anio,
+        mes=mes,
+        idioma=idioma,
+        defaults={
+            'archivo': filename,
+            'tamano': os.path.getsize(file_path),
+            'checksum': file_checksum(file_path),
+            'fecha_publicacion': fecha_publicacion or timezone.now(),
+        }
+    )
+    extract_days(menu, file_path)
+    render_images(menu, file_path)
+    return menu
+
+
+def extract_days(menu, file_path):
+    """
+    Guarda los platos de cada día del menú (MenuDia). Si el PDF no tiene el
+    formato esperado el menú sigue disponible como PDF, así que solo se avisa.
+    """
+    try:
+        return store_menu_days(menu, file_path)
+    except Exception as e:
+        print(f"⚠️ No se pudieron extraer los días de {os.path.basename(file_path)}: {e}")
+        return 0
+
+
+def render_images(menu, file_path):
+    """
+    Genera las imágenes de las páginas del menú (MENU_IMAGENES_ANCHOS). Si
+    falla o no hay pdftoppm, la página del comedor muestra el PDF.
+    """
+    try:
+        paginas = render_menu_images(file_path, menu.archivo)
+    except Exception as e:
+        print(f"⚠️ No se pudieron generar las imágenes de {menu.archivo}: {e}")
+        paginas = []
+
+    if paginas != menu.paginas:
+        menu.paginas = paginas
+        menu.save(update_fields=['paginas'])
+    return paginas
+
+
+def unregister_menu(filename):
+    """Elimina del catálogo las entradas que apuntan a un archivo (y sus imágenes)"""
+    from .models import MenuComedor
+
+    MenuComedor.objects.filter(archivo=filename).delete()
+    remove_menu_images(filename)
+
+
+def scan_menu_directory(comedor_dir=None):
+    """
+    Recorre el directorio de menús y retorna los datos de cada PDF reconocido.
+    Solo se usa para reconstruir el catálogo, nunca en una petición normal.
+    Los archivos sin año en el nombre toman el año de su fecha de modificación.
+    """
+    comedor_dir = comedor_dir or get_comedor_dir()
+    if not os.path.exists(comedor_dir):
+        return []
+
+    encontrados = []
+    for filename in sorted(os.listdir(comedor_dir)):
+        parsed = parse_menu_filename(filename)
+        if not parsed:
+            continue
+
+        anio, mes, idioma = parsed
+        file_path = os.path.join(comedor_dir, filename)
+        file_mtime = os.path.getmtime(file_path)
+        fecha_mod = timezone.make_aware(datetime.fromtimestamp(file_mtime))
+
+        encontrados.append({
+            'anio': anio or fecha_mod.year,
+            'mes': mes,
+            'idioma': idioma,
+            'archivo': filename,
+            'tamano': os.path.getsize(file_path),
+            'checksum': file_checksum(file_path),
+            'fecha_publicacion': fecha_mod,
+        })
+
+    return encontrados
+
+
+def sync_catalog(model=None):
+    """
+    Sincroniza el catálogo con el contenido de media/comedor/.
+    Útil cuando los PDFs se copian directamente al servidor (por ejemplo por SFTP).
+    Retorna (registrados, eliminados).
+    Con el modelo real (no el histórico de una migración) también extrae los
+    días y genera las imágenes de los menús nuevos o cambiados.
+    """
+    derivados = model is None
+    if model is None:
+        from .models import MenuComedor as model
+
+    # Los archivos con el año en el nombre van al final para que tengan
+    # prioridad sobre los del formato antiguo del mismo mes
+    encontrados = sorted(
+        scan_menu_directory(),
+        key=lambda datos: parse_menu_filename(datos['archivo'])[0] is not None
+    )
+    archivos = set()
+
+    for datos in encontrados:
+        clave = {k: datos[k] for k in ('anio', 'mes', 'idioma')}
+        defaults = {k: v for k, v in datos.items() if k not in clave}
+        existente = model.objects.filter(**clave).first()
+
+        # Si el contenido no ha cambiado se conserva la fecha de publicación
+        sin_cambios = existente and existente.checksum == datos['checksum']
+        if sin_cambios:
+            defaults.pop('fecha_publicacion')
+
+        menu, _ = model.objects.update_or_create(defaults=defaults, **clave)
+        if derivados:
+            file_path = os.path.join(get_comedor_dir(), datos['archivo'])
+            if not sin_cambios or not menu.dias.exists():
+                extract_days(menu, file_path)
+            if not sin_cambios or not menu.paginas:
+                render_images(menu, file_path)
+        archivos.add(datos['archivo'])
+
+    huerfanos = model.objects.exclude(archivo__in=archivos)
+    eliminados = huerfanos.count()
+    if derivados:
+        for filename in huerfanos.values_list('archivo', flat=True):
+            remove_menu_images(filename)
+    huerfanos.delete()
+
+    return len(archivos), eliminados
+
+
+def get_menu_months():
+    """Lista de (año, mes) con menús en el catálogo, del más reciente al más antiguo"""
+    from .models import MenuComedor
+
+    return list(
+        MenuComedor.objects.order_by('-anio', '-mes')
+        .values_list('anio', 'mes')
+        .distinct()
+    )
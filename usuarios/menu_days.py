@@ -0,0 +1,279 @@
+"""
+Menú de cada día a partir de los PDFs del comedor
+
+Los PDFs mensuales son una tabla de lunes a viernes: una fila con los números
+de los días y debajo, por columnas, los platos, el postre, el pan y la línea
+de kcal. Con la extracción "layout" de pypdf cada línea de texto conserva la
+posición horizontal de las columnas, así que se puede saber a qué día
+pertenece cada trozo de texto.
+
+Cuando se registra un menú en el catálogo se extraen sus días y se guardan en
+MenuDia; la página del comedor y /comedor/api/dias/ sirven "hoy" y "esta
+semana" desde ahí sin tocar el PDF.
+"""
+
+import calendar
+import re
+from datetime import date, timedelta
+
+from pypdf import PdfReader
+
+# Cabecera con los días de la semana (castellano y euskera)
+WEEKDAY_NAMES = [
+    ('LUNES', 'ASTELEHENA'),
+    ('MARTES', 'ASTEARTEA'),
+    ('MIÉRCOLES', 'MIERCOLES', 'ASTEAZKENA'),
+    ('JUEVES', 'OSTEGUNA'),
+    ('VIERNES', 'OSTIRALA'),
+]
+
+# Trozos de texto de una línea: palabras separadas por menos de 3 espacios
+CHUNK_RE = re.compile(r'\S+(?: {1,2}\S+)*')
+
+# Números de alérgenos pegados al final de una palabra: LENTEJAS15, BLANCO2,4, cocida)3
+ALLERGEN_RE = re.compile(r'(?<=[A-Za-zÁÉÍÓÚÑÜáéíóúñü.)])(\d{1,2}(?:,\d{1,2})*)(?=[\s,.]|$)')
+ALLERGEN_ONLY_RE = re.compile(r'^\d{1,2}(?:,\d{1,2})*$')
+
+ENERGY_RE = re.compile(r'\d+\s*Kcal', re.IGNORECASE)
+BREAD_RE = re.compile(r'^(Pan|Ogi)\b', re.IGNORECASE)
+FOOTER_RE = re.compile(r'^\s*ALERGENO', re.IGNORECASE)
+
+
+def chunks(line):
+    """Trozos de texto de una línea con su posición central"""
+    return [(m.group(0), (m.start() + m.end()) / 2) for m in CHUNK_RE.finditer(line)]
+
+
+def find_columns(lines):
+    """
+    Posición central de cada día de la semana según la cabecera.
+    Si no se encuentra la cabecera, None.
+    """
+    for line in lines:
+        centros = []
+        for texto, centro in chunks(line):
+            for i, nombres in enumerate(WEEKDAY_NAMES):
+                if texto.upper() in nombres:
+                    centros.append((i, centro))
+        if len(centros) == len(WEEKDAY_NAMES):
+            return [centro for _, centro in sorted(centros)]
+    return None
+
+
+def nearest_column(columnas, posicion):
+    return min(range(len(columnas)), key=lambda i: abs(columnas[i] - posicion))
+
+
+def day_date(anio, mes, dia, weekday):
+    """
+    Fecha de un número de día que aparece en la columna `weekday` (0 = lunes).
+    Prueba el mes del menú y los meses vecinos (la primera y la última semana
+    pueden traer días de otro mes). None si no cuadra con ningún mes.
+    """
+    candidatos = [(anio, mes)]
+    candidatos.append((anio - 1, 12) if mes == 1 else (anio, mes - 1))
+    candidatos.append((anio + 1, 1) if mes == 12 else (anio, mes + 1))
+
+    for a, m in candidatos:
+        if dia <= calendar.monthrange(a, m)[1] and date(a, m, dia).weekday() == weekday:
+            return date(a, m, dia)
+    return None
+
+
+def parse_day_line(line, columnas, anio, mes):
+    """
+    Si la línea es la fila de números de una semana retorna {columna: fecha}.
+    Cada número tiene que caer en la columna de su día de la semana; así no
+    se confunde con un número de alérgeno suelto.
+    """
+    trozos = chunks(line)
+    if not trozos or not all(texto.isdigit() for texto, _ in trozos):
+        return None
+
+    fechas = {}
+    for texto, centro in trozos:
+        columna = nearest_column(columnas, centro)
+        fecha = day_date(anio, mes, int(texto), columna)
+        if fecha is None:
+            return None
+        fechas[columna] = fecha
+    return fechas
+
+
+def split_allergens(texto):
+    """Separa los números de alérgenos del nombre de un plato"""
+    alergenos = set()
+    for match in ALLERGEN_RE.finditer(texto):
+        alergenos.update(int(n) for n in match.group(1).split(','))
+    nombre = ALLERGEN_RE.sub('', texto)
+    nombre = re.sub(r'\s+', ' ', nombre).strip()
+    return nombre, sorted(alergenos)
+
+
+def join_lines(partes):
+    """Une las líneas de un plato (las palabras cortadas con guion van juntas)"""
+    texto = ''
+    for parte in partes:
+        if texto.endswith('-'):
+            texto += parte
+        elif texto:
+            texto += ' ' + parte
+        else:
+            texto = parte
+    return texto
+
+
+def parse_week(bloque, fechas, columnas):
+    """
+    Platos de cada día de una semana. `bloque` son las líneas entre dos filas
+    de números. Los platos de una columna se separan por las líneas en blanco
+    de toda la tabla; el postre es la línea justo encima del pan.
+    """
+    # Celdas por columna: lista de (grupo, texto, alérgenos). El grupo sube
+    # en cada línea en blanco
+    celdas = {columna: [] for columna in fechas}
+    grupo = 0
+    for line in bloque:
+        trozos = chunks(line)
+        if not trozos:
+            grupo += 1
+            continue
+        por_columna = {}
+        for texto, centro in trozos:
+            textos, sueltos = por_columna.setdefault(nearest_column(columnas, centro), ([], []))
+            if ALLERGEN_ONLY_RE.match(texto):
+                # Superíndice que la extracción ha separado de su palabra
+                sueltos.extend(int(n) for n in texto.split(','))
+            else:
+                textos.append(texto)
+        for columna, (textos, sueltos) in por_columna.items():
+            if columna in celdas:
+                celdas[columna].append((grupo, ' '.join(textos), sueltos))
+
+    dias = []
+    for columna, fecha in sorted(fechas.items()):
+        platos = []
+        energia = ''
+        actual = []
+        alergenos_sueltos = []
+        grupo_actual = None
+
+        def cerrar():
+            if actual:
+                nombre, alergenos = split_allergens(join_lines(actual))
+                alergenos = sorted(set(alergenos) | set(alergenos_sueltos))
+                platos.append({'nombre': nombre, 'alergenos': alergenos})
+            actual.clear()
+            alergenos_sueltos.clear()
+
+        lista = celdas[columna]
+        for i, (grupo, texto, sueltos) in enumerate(lista):
+            if ENERGY_RE.search(texto):
+                energia = texto
+                continue
+
+            siguiente = lista[i + 1][1] if i + 1 < len(lista) else ''
+            es_pan = bool(BREAD_RE.match(texto))
+            es_postre = bool(BREAD_RE.match(siguiente))
+
+            if grupo != grupo_actual or es_pan or es_postre:
+                cerrar()
+            grupo_actual = grupo
+            alergenos_sueltos.extend(sueltos)
+            if texto:
+                actual.append(texto)
+            if es_pan or es_postre:
+                cerrar()
+        cerrar()
+
+        if platos:
+            dias.append({'fecha': fecha, 'platos': platos, 'energia': energia})
+    return dias
+
+
+def parse_menu_text(texto, anio, mes):
+    """
+    Convierte el texto (extracción "layout") de una página del menú en una
+    lista de días: {'fecha', 'platos': [{'nombre', 'alergenos'}], 'energia'}
+    """
+    lines = texto.splitlines()
+    columnas = find_columns(lines)
+    if columnas is None:
+        return []
+
+    dias = []
+    fechas = None
+    bloque = []
+    for line in lines:
+        if FOOTER_RE.match(line):
+            break
+        nuevas = parse_day_line(line, columnas, anio, mes)
+        if nuevas:
+            if fechas:
+                dias.extend(parse_week(bloque, fechas, columnas))
+            fechas, bloque = nuevas, []
+        elif fechas:
+            bloque.append(line)
+    if fechas:
+        dias.extend(parse_week(bloque, fechas, columnas))
+    return dias
+
+
+def extract_menu_days(pdf_path, anio, mes):
+    """Extrae los días de todas las páginas de un PDF de menú"""
+    reader = PdfReader(pdf_path)
+    dias = []
+    for page in reader.pages:
+        dias.extend(parse_menu_text(page.extract_text(extraction_mode='layout'), anio, mes))
+    return dias
+
+
+def store_menu_days(menu, pdf_path):
+    """
+    Extrae los días del PDF de un MenuComedor y los guarda en MenuDia,
+    sustituyendo los que tuviera. Retorna el número de días guardados.
+    """
+    from .models import MenuDia
+
+    dias = extract_menu_days(pdf_path, menu.anio, menu.mes)
+
+    menu.dias.all().delete()
+    for dia in dias:
+        # Un día que ya estaba en otro menú (p. ej. el último lunes del mes
+        # anterior) pasa a este, que es el más reciente
+        MenuDia.objects.update_or_create(
+            fecha=dia['fecha'],
+            idioma=menu.idioma,
+            defaults={'menu': menu, 'platos': dia['platos'], 'energia': dia['energia']},
+        )
+    return len(dias)
+
+
+def week_range(fecha):
+    """Lunes y viernes de la semana de `fecha` (la siguiente si es fin de semana)"""
+    if fecha.weekday() >= 5:
+        fecha += timedelta(days=7 - fecha.weekday())
+    lunes = fecha - timedelta(days=fecha.weekday())
+    return lunes, lunes + timedelta(days=4)
+
+
+def serialize_day(dia):
+    """Datos de un MenuDia para la plantilla o el JSON"""
+    return {
+        'fecha': dia.fecha.isoformat(),
+        'platos': dia.platos,
+        'energia': dia.energia,
+    }
+
+
+def get_menu_days(idioma, fecha):
+    """
+    Retorna (hoy, semana) para un idioma: el menú del día `fecha` (o None) y
+    los días de su semana de lunes a viernes
+    """
+    from .models import MenuDia
+
+    lunes, viernes = week_range(fecha)
+    semana = list(MenuDia.objects.filter(idioma=idioma, fecha__range=(lunes, viernes)).order_by('fecha'))
+    hoy = next((dia for dia in semana if dia.fecha == fecha), None)
+    return hoy, semana
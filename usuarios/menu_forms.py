@@ -1,6 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
 import os
+from datetime import datetime
 
 class MenuUploadForm(forms.Form):
     """Formulario para subir menús del comedor"""
@@ -26,6 +27,14 @@ class MenuUploadForm(forms.Form):
         help_text='Selecciona el mes correspondiente al menú'
     )
     
+    anio = forms.IntegerField(
+        label='Año del menú',
+        min_value=2020,
+        max_value=2100,
+        initial=lambda: datetime.now().year,
+        help_text='Año al que corresponde el menú (los meses de distintos años no se sobrescriben)'
+    )
+    
     menu_castellano = forms.FileField(
         label='Menú en Castellano (PDF)',
         help_text='Archivo PDF del menú en castellano',
@@ -39,8 +48,8 @@ class MenuUploadForm(forms.Form):
     )
     
     menu_completo = forms.FileField(
-        label='Menú Completo (PDF - 2 páginas)',
-        help_text='Archivo PDF con ambos idiomas (se separará automáticamente)',
+        label='Menú Completo (PDF)',
+        help_text='Archivo PDF con ambos idiomas: primero las páginas en castellano y después las de euskera (se separará automáticamente)',
         required=False
     )
     
@@ -0,0 +1,157 @@
+"""
+Imágenes de las páginas de los menús
+
+Al registrar un menú cada página del PDF se convierte una sola vez en
+imágenes de varios anchos (MENU_IMAGENES_ANCHOS) con pdftoppm (poppler-utils)
+y Pillow. La página del comedor las muestra con srcset, así que el móvil
+descarga unas decenas de KB en lugar del PDF entero; el PDF solo se carga
+si se pide.
+
+Se guardan en media/comedor/paginas/<nombre del PDF>/<página>-<ancho>.webp
+(PNG si Pillow no tiene soporte de WebP). Sin pdftoppm no se genera nada y la
+página sigue mostrando el PDF.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow es opcional para esto
+    Image = None
+
+# Segundos máximos para convertir un PDF
+PDFTOPPM_TIMEOUT = 120
+
+WEBP_QUALITY = 80
+
+
+def get_widths():
+    """Anchos configurados, de menor a mayor (lista vacía = desactivado)"""
+    return sorted(getattr(settings, 'MENU_IMAGENES_ANCHOS', []))
+
+
+def pdftoppm_available():
+    return shutil.which('pdftoppm') is not None
+
+
+def images_dir(filename):
+    """Directorio con las imágenes de un PDF de menú"""
+    nombre = os.path.splitext(filename)[0]
+    return os.path.join(settings.MEDIA_ROOT, 'comedor', 'paginas', nombre)
+
+
+def image_format():
+    """('WEBP', '.webp') si Pillow lo soporta, si no ('PNG', '.png')"""
+    if Image is not None and features.check('webp'):
+        return 'WEBP', '.webp'
+    return 'PNG', '.png'
+
+
+def render_pages(pdf_path, width, dest_dir):
+    """Convierte cada página del PDF en un PNG de `width` píxeles de ancho con pdftoppm"""
+    prefix = os.path.join(dest_dir, 'pagina')
+    subprocess.run(
+        ['pdftoppm', '-png', '-scale-to-x', str(width), '-scale-to-y', '-1', pdf_path, prefix],
+        check=True,
+        capture_output=True,
+        timeout=PDFTOPPM_TIMEOUT,
+    )
+    # pdftoppm numera pagina-1.png o pagina-01.png según el número de páginas
+    return sorted(
+        glob.glob(f'{prefix}-*.png'),
+        key=lambda path: int(path.rsplit('-', 1)[1].split('.')[0])
+    )
+
+
+def render_menu_images(pdf_path, filename):
+    """
+    Genera las imágenes de las páginas de un menú y retorna su descripción
+    para MenuComedor.paginas: [{'ancho', 'alto', 'imagenes': [{'archivo', 'ancho'}]}].
+    Las imágenes anteriores se sustituyen de una vez al terminar.
+    """
+    anchos = get_widths()
+    if not anchos or not pdftoppm_available():
+        return []
+
+    destino = images_dir(filename)
+    padre = os.path.dirname(destino)
+    os.makedirs(padre, exist_ok=True)
+    nombre = os.path.basename(destino)
+    relativo = f'comedor/paginas/{nombre}'
+    formato, extension = image_format()
+
+    temp_dir = tempfile.mkdtemp(prefix=f'.{nombre}.', dir=padre)
+    try:
+        # Se renderiza una vez al ancho mayor y se reduce con Pillow
+        pngs = render_pages(pdf_path, anchos[-1], temp_dir)
+        paginas = []
+
+        for numero, png in enumerate(pngs, start=1):
+            if Image is None:
+                archivo = f'{numero}-{anchos[-1]}.png'
+                os.replace(png, os.path.join(temp_dir, archivo))
+                paginas.append({
+                    'ancho': anchos[-1],
+                    'alto': None,
+                    'imagenes': [{'archivo': f'{relativo}/{archivo}', 'ancho': anchos[-1]}],
+                })
+                continue
+
+            with Image.open(png) as original:
+                original.load()
+            imagenes = []
+            for ancho in anchos:
+                alto = round(original.height * ancho / original.width)
+                imagen = original if ancho == original.width else original.resize((ancho, alto), Image.LANCZOS)
+                archivo = f'{numero}-{ancho}{extension}'
+                opciones = {'quality': WEBP_QUALITY} if formato == 'WEBP' else {'optimize': True}
+                imagen.save(os.path.join(temp_dir, archivo), formato, **opciones)
+                imagenes.append({'archivo': f'{relativo}/{archivo}', 'ancho': ancho})
+            os.remove(png)
+
+            paginas.append({'ancho': original.width, 'alto': original.height, 'imagenes': imagenes})
+
+        # Sustituir el directorio anterior por el nuevo
+        anterior = None
+        if os.path.exists(destino):
+            anterior = f'{temp_dir}.anterior'
+            os.replace(destino, anterior)
+        os.replace(temp_dir, destino)
+        if anterior:
+            shutil.rmtree(anterior, ignore_errors=True)
+        return paginas
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+
+def remove_menu_images(filename):
+    """Borra las imágenes de un PDF de menú"""
+    shutil.rmtree(images_dir(filename), ignore_errors=True)
+
+
+def page_sources(paginas, version=None):
+    """
+    Datos para la etiqueta <img> de cada página: src, srcset, ancho y alto.
+    Con `version` (p. ej. el checksum del PDF) las URLs llevan ?v=, así que se
+    pueden cachear sin caducidad: si el menú cambia, cambia la URL.
+    """
+    sufijo = f'?v={version}' if version else ''
+    fuentes = []
+    for pagina in paginas or []:
+        imagenes = pagina['imagenes']
+        # El src por defecto es el ancho intermedio (navegadores sin srcset)
+        src = imagenes[len(imagenes) // 2]
+        fuentes.append({
+            'src': f"{settings.MEDIA_URL}{src['archivo']}{sufijo}",
+            'srcset': ', '.join(f"{settings.MEDIA_URL}{img['archivo']}{sufijo} {img['ancho']}w" for img in imagenes),
+            'ancho': pagina['ancho'],
+            'alto': pagina['alto'],
+        })
+    return fuentes
@@ -0,0 +1,156 @@
+"""
+Separación de los PDFs de menús por idiomas
+
+El PDF completo del menú trae los idiomas uno detrás de otro: primero las
+páginas en castellano, después las de euskera. split_menu lo lee de una vez
+en memoria (desde una ruta, un archivo subido o unos bytes), reparte las
+páginas entre los idiomas y prepara cada PDF resultante en un temporal junto
+a su destino. Solo cuando todos están escritos y linearizados se publican
+renombrándolos uno detrás de otro: la web nunca ve un PDF a medias y, si falla
+la preparación, ningún idioma cambia. El conjunto no es atómico: si falla un
+renombrado, los idiomas anteriores ya están publicados y los demás siguen con
+la versión anterior.
+"""
+
+import io
+import os
+
+from pypdf import PdfReader, PdfWriter
+
+from .menu_catalog import IDIOMAS, MESES, get_comedor_dir, menu_filename, register_menu
+from .pdf_tools import linearize_pdf
+
+# Sufijo de los archivos que se están preparando (no los reconoce el catálogo)
+STAGING_SUFFIX = '.separando'
+
+
+class MenuSplitError(Exception):
+    """El PDF no se puede separar (pocas páginas, ya existe, PDF dañado...)"""
+
+
+def extra_filename(anio, mes):
+    """Nombre del PDF con las páginas que sobran tras repartir los idiomas"""
+    return f'menu_{MESES[mes - 1]}_{anio}_adicional.pdf'
+
+
+def plan_pages(total_pages, idiomas=IDIOMAS):
+    """
+    Reparte las páginas entre los idiomas en bloques consecutivos del mismo
+    tamaño. Las que sobran al final van a 'adicional'.
+
+    2 páginas -> castellano [0], euskera [1]
+    3 páginas -> castellano [0], euskera [1], adicional [2]
+    4 páginas -> castellano [0, 1], euskera [2, 3]
+    """
+    idiomas = list(idiomas)
+    por_idioma = total_pages // len(idiomas) if idiomas else 0
+    if por_idioma == 0:
+        raise MenuSplitError(
+            f'El PDF tiene {total_pages} página(s) y hacen falta al menos {len(idiomas)}'
+        )
+
+    plan = {
+        idioma: list(range(i * por_idioma, (i + 1) * por_idioma))
+        for i, idioma in enumerate(idiomas)
+    }
+    sobrantes = list(range(por_idioma * len(idiomas), total_pages))
+    if sobrantes:
+        plan['adicional'] = sobrantes
+    return plan
+
+
+def read_pdf(source):
+    """
+    Abre el PDF de origen leyéndolo entero a memoria.
+    Acepta una ruta, bytes o un objeto con read() (p. ej. un UploadedFile).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            data = f.read()
+    elif isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        data = source.read()
+
+    try:
+        return PdfReader(io.BytesIO(data))
+    except Exception as e:
+        raise MenuSplitError(f'El archivo no es un PDF válido: {e}')
+
+
+def publish(staged):
+    """
+    Publica los archivos preparados: {ruta final: ruta temporal}.
+    Cada os.replace es atómico y se hacen todos seguidos, después de que
+    todos los temporales estén completos, pero el conjunto no: si falla uno,
+    los anteriores ya están publicados.
+    """
+    for final_path, temp_path in staged.items():
+        os.replace(temp_path, final_path)
+
+
+def discard(staged):
+    """Borra los temporales que no se llegaron a publicar"""
+    for temp_path in staged.values():
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def split_menu(source, anio, mes, idiomas=IDIOMAS, sobrescribir=True, destino=None, registrar=True):
+    """
+    Separa el PDF completo de un menú en un PDF por idioma (más 'adicional'
+    si sobran páginas), los publica en `destino` (media/comedor/ por
+    defecto) cuando están todos preparados y los registra en el catálogo.
+
+    Retorna la lista de archivos creados. Lanza MenuSplitError si no se
+    puede separar; si falla al preparar no se ha tocado ningún archivo
+    publicado y si falla al publicar puede haberse publicado una parte. En
+    los dos casos se borran los temporales y se puede volver a intentar.
+    """
+    destino = destino or get_comedor_dir()
+    reader = read_pdf(source)
+    plan = plan_pages(len(reader.pages), idiomas)
+
+    filenames = {
+        parte: extra_filename(anio, mes) if parte == 'adicional' else menu_filename(anio, mes, parte)
+        for parte in plan
+    }
+
+    if not sobrescribir:
+        existentes = [
+            filename for filename in filenames.values()
+            if os.path.exists(os.path.join(destino, filename))
+        ]
+        if existentes:
+            raise MenuSplitError(f'Ya existe: {", ".join(existentes)}')
+
+    os.makedirs(destino, exist_ok=True)
+    staged = {}
+
+    try:
+        for parte, paginas in plan.items():
+            final_path = os.path.join(destino, filenames[parte])
+            temp_path = f'{final_path}{STAGING_SUFFIX}'
+            staged[final_path] = temp_path
+
+            writer = PdfWriter()
+            for pagina in paginas:
+                writer.add_page(reader.pages[pagina])
+            with open(temp_path, 'wb') as f:
+                writer.write(f)
+
+            linearize_pdf(temp_path)
+
+        publish(staged)
+    except Exception as e:
+        discard(staged)
+        raise MenuSplitError(f'Error separando el PDF: {e}')
+
+    if registrar:
+        for parte in plan:
+            if parte != 'adicional':
+                register_menu(anio, mes, parte, filenames[parte], linearizar=False)
+
+    return list(filenames.values())
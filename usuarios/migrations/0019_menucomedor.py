@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 08:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def poblar_catalogo(apps, schema_editor):
+    """Registra en el catálogo los menús que ya existen en media/comedor/"""
+    from usuarios.menu_catalog import sync_catalog
+
+    sync_catalog(apps.get_model('usuarios', 'MenuComedor'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0018_consejoimagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuComedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveIntegerField(verbose_name='Año')),
+                ('mes', models.PositiveSmallIntegerField(choices=[(1, 'Enero'), (2, 'Febrero'), (3, 'Marzo'), (4, 'Abril'), (5, 'Mayo'), (6, 'Junio'), (7, 'Julio'), (8, 'Agosto'), (9, 'Septiembre'), (10, 'Octubre'), (11, 'Noviembre'), (12, 'Diciembre')], verbose_name='Mes')),
+                ('idioma', models.CharField(choices=[('castellano', 'Castellano'), ('euskera', 'Euskera')], max_length=20, verbose_name='Idioma')),
+                ('archivo', models.CharField(help_text='Nombre del PDF dentro de media/comedor/', max_length=255, verbose_name='Archivo')),
+                ('tamano', models.PositiveIntegerField(default=0, verbose_name='Tamaño (bytes)')),
+                ('checksum', models.CharField(blank=True, default='', max_length=64, verbose_name='SHA-256')),
+                ('fecha_publicacion', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de publicación')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Última modificación')),
+            ],
+            options={
+                'verbose_name': 'Menú del comedor',
+                'verbose_name_plural': 'Menús del comedor',
+                'ordering': ['-anio', '-mes', 'idioma'],
+                'constraints': [models.UniqueConstraint(fields=('anio', 'mes', 'idioma'), name='menu_comedor_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_catalogo, migrations.RunPython.noop),
+    ]
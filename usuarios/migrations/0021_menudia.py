@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 08:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0020_tareasegundoplano'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('idioma', models.CharField(choices=[('castellano', 'Castellano'), ('euskera', 'Euskera')], max_length=20, verbose_name='Idioma')),
+                ('platos', models.JSONField(default=list, help_text='Lista de {"nombre", "alergenos"} en el orden del menú', verbose_name='Platos')),
+                ('energia', models.CharField(blank=True, default='', max_length=100, verbose_name='Información nutricional')),
+                ('menu', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dias', to='usuarios.menucomedor', verbose_name='Menú')),
+            ],
+            options={
+                'verbose_name': 'Menú del día',
+                'verbose_name_plural': 'Menús del día',
+                'ordering': ['fecha', 'idioma'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'idioma'), name='menu_dia_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0021_menudia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menucomedor',
+            name='paginas',
+            field=models.JSONField(blank=True, default=list, help_text='Generadas con pdftoppm al registrar el menú (ver usuarios/menu_images.py)', verbose_name='Imágenes de las páginas'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 09:03
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0022_menucomedor_paginas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actividad',
+            name='excepciones',
+            field=models.JSONField(blank=True, default=list, help_text='Fechas de la serie que no se celebran (AAAA-MM-DD)', verbose_name='Fechas excluidas'),
+        ),
+        migrations.AddField(
+            model_name='actividad',
+            name='fecha_original',
+            field=models.DateField(blank=True, help_text='Fecha de la serie que sustituye esta actividad', null=True, verbose_name='Fecha original'),
+        ),
+        migrations.AddField(
+            model_name='actividad',
+            name='intervalo',
+            field=models.PositiveSmallIntegerField(default=1, help_text='1 = cada semana / mes, 2 = cada dos...', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Cada cuántas'),
+        ),
+        migrations.AddField(
+            model_name='actividad',
+            name='recurrencia',
+            field=models.CharField(blank=True, choices=[('', 'No se repite'), ('semanal', 'Cada semana'), ('mensual', 'Cada mes')], default='', help_text='La actividad se repite desde su fecha', max_length=10, verbose_name='Repetición'),
+        ),
+        migrations.AddField(
+            model_name='actividad',
+            name='recurrencia_hasta',
+            field=models.DateField(blank=True, help_text='Última fecha de la serie (vacío = sin fin)', null=True, verbose_name='Repetir hasta'),
+        ),
+        migrations.AddField(
+            model_name='actividad',
+            name='serie',
+            field=models.ForeignKey(blank=True, help_text='Actividad repetida de la que esta es una fecha modificada', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ocurrencias_modificadas', to='usuarios.actividad', verbose_name='Serie'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0023_actividad_recurrencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(fields=['publicada', '-destacada', '-fecha_publicacion', '-id'], name='noticia_listado_idx'),
+        ),
+    ]
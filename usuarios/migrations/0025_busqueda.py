@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+def crear_indice(apps, schema_editor):
+    """Índice de texto completo (FTS5 o tsvector + GIN) y filas de lo que ya existe"""
+    from usuarios.busqueda import create_index, reindex_all
+
+    create_index(schema_editor)
+    reindex_all(
+        apps.get_model('usuarios', 'Noticia'),
+        apps.get_model('usuarios', 'Actividad'),
+        apps.get_model('usuarios', 'ConsejoEducativo'),
+        apps.get_model('usuarios', 'EntradaBusqueda'),
+    )
+
+
+def borrar_indice(apps, schema_editor):
+    from usuarios.busqueda import drop_index
+
+    drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0024_noticia_listado_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntradaBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('noticia', 'Noticia'), ('actividad', 'Actividad'), ('consejo', 'Consejo educativo')], max_length=20, verbose_name='Tipo')),
+                ('objeto_id', models.PositiveIntegerField(verbose_name='Id del objeto')),
+                ('idioma', models.CharField(blank=True, help_text='Vacío = se encuentra en todos los idiomas', max_length=5, verbose_name='Idioma')),
+                ('titulo', models.CharField(max_length=200, verbose_name='Título')),
+                ('texto', models.TextField(blank=True, verbose_name='Texto')),
+                ('fecha', models.DateTimeField(help_text='Las noticias no aparecen antes de esta fecha', verbose_name='Fecha')),
+                ('slug', models.CharField(blank=True, max_length=200, verbose_name='Slug')),
+            ],
+            options={
+                'verbose_name': 'Entrada de búsqueda',
+                'verbose_name_plural': 'Entradas de búsqueda',
+                'indexes': [models.Index(fields=['tipo', 'objeto_id'], name='busqueda_objeto_idx')],
+            },
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
@@ -231,6 +232,12 @@ class Actividad(models.Model):
         ('evento_social', _('Evento social')),
     ]
     
+    RECURRENCIA_CHOICES = [
+        ('', _('No se repite')),
+        ('semanal', _('Cada semana')),
+        ('mensual', _('Cada mes')),
+    ]
+    
     fecha = models.DateField(
         verbose_name=_('Fecha'),
         help_text=_('Fecha en la que se realizará la actividad')
@@ -306,6 +313,57 @@ class Actividad(models.Model):
         help_text=_('Indica si la actividad está visible y activa')
     )
     
+    # Repetición: la serie se guarda una sola vez y sus fechas se calculan al
+    # mostrarla (ver actividades_recurrencia.py)
+    recurrencia = models.CharField(
+        max_length=10,
+        choices=RECURRENCIA_CHOICES,
+        blank=True,
+        default='',
+        verbose_name=_('Repetición'),
+        help_text=_('La actividad se repite desde su fecha')
+    )
+    
+    intervalo = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        verbose_name=_('Cada cuántas'),
+        help_text=_('1 = cada semana / mes, 2 = cada dos...')
+    )
+    
+    recurrencia_hasta = models.DateField(
+        blank=True,
+        null=True,
+        verbose_name=_('Repetir hasta'),
+        help_text=_('Última fecha de la serie (vacío = sin fin)')
+    )
+    
+    excepciones = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name=_('Fechas excluidas'),
+        help_text=_('Fechas de la serie que no se celebran (AAAA-MM-DD)')
+    )
+    
+    # Una fecha de la serie modificada: es una actividad normal que sustituye
+    # a la de `fecha_original`
+    serie = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='ocurrencias_modificadas',
+        verbose_name=_('Serie'),
+        help_text=_('Actividad repetida de la que esta es una fecha modificada')
+    )
+    
+    fecha_original = models.DateField(
+        blank=True,
+        null=True,
+        verbose_name=_('Fecha original'),
+        help_text=_('Fecha de la serie que sustituye esta actividad')
+    )
+    
     class Meta:
         verbose_name = _('Actividad')
         verbose_name_plural = _('Actividades')
@@ -344,13 +402,11 @@ class Actividad(models.Model):
     
     def es_hoy(self):
         """Verifica si la actividad es hoy"""
-        from datetime import date
-        return self.fecha == date.today()
+        return self.fecha == timezone.localdate()
     
     def es_pasada(self):
         """Verifica si la actividad ya pasó"""
-        from datetime import date
-        return self.fecha < date.today()
+        return self.fecha < timezone.localdate()
 
 
 class ConcursoDibujo(models.Model):
@@ -467,6 +523,10 @@ class Noticia(models.Model):
         verbose_name = _('Noticia')
         verbose_name_plural = _('Noticias')
         ordering = ['-destacada', '-fecha_publicacion']
+        indexes = [
+            # Orden de la lista y de la paginación por cursor (noticias_listado.py)
+            models.Index(fields=['publicada', '-destacada', '-fecha_publicacion', '-id'], name='noticia_listado_idx'),
+        ]
     
     def __str__(self):
         return self.titulo
@@ -666,3 +726,276 @@ class ConsejoImagen(models.Model):
 
     def __str__(self):
         return f"{self.consejo.titulo} – {self.imagen.name}"
+
+
+class MenuComedor(models.Model):
+    """Índice de los menús del comedor guardados en media/comedor/"""
+    MES_CHOICES = [
+        (1, _('Enero')),
+        (2, _('Febrero')),
+        (3, _('Marzo')),
+        (4, _('Abril')),
+        (5, _('Mayo')),
+        (6, _('Junio')),
+        (7, _('Julio')),
+        (8, _('Agosto')),
+        (9, _('Septiembre')),
+        (10, _('Octubre')),
+        (11, _('Noviembre')),
+        (12, _('Diciembre')),
+    ]
+
+    IDIOMA_CHOICES = [
+        ('castellano', _('Castellano')),
+        ('euskera', _('Euskera')),
+    ]
+
+    anio = models.PositiveIntegerField(
+        verbose_name=_('Año')
+    )
+
+    mes = models.PositiveSmallIntegerField(
+        choices=MES_CHOICES,
+        verbose_name=_('Mes')
+    )
+
+    idioma = models.CharField(
+        max_length=20,
+        choices=IDIOMA_CHOICES,
+        verbose_name=_('Idioma')
+    )
+
+    archivo = models.CharField(
+        max_length=255,
+        verbose_name=_('Archivo'),
+        help_text=_('Nombre del PDF dentro de media/comedor/')
+    )
+
+    tamano = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Tamaño (bytes)')
+    )
+
+    checksum = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name=_('SHA-256')
+    )
+
+    fecha_publicacion = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Fecha de publicación')
+    )
+
+    fecha_actualizacion = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('Última modificación')
+    )
+
+    paginas = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name=_('Imágenes de las páginas'),
+        help_text=_('Generadas con pdftoppm al registrar el menú (ver usuarios/menu_images.py)')
+    )
+
+    class Meta:
+        verbose_name = _('Menú del comedor')
+        verbose_name_plural = _('Menús del comedor')
+        ordering = ['-anio', '-mes', 'idioma']
+        constraints = [
+            models.UniqueConstraint(fields=['anio', 'mes', 'idioma'], name='menu_comedor_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_mes_display()} {self.anio} ({self.get_idioma_display()})"
+
+
+
+class MenuDia(models.Model):
+    """Platos de un día extraídos del PDF del menú (ver usuarios/menu_days.py)"""
+    menu = models.ForeignKey(
+        MenuComedor,
+        on_delete=models.CASCADE,
+        related_name='dias',
+        verbose_name=_('Menú')
+    )
+
+    fecha = models.DateField(
+        verbose_name=_('Fecha')
+    )
+
+    idioma = models.CharField(
+        max_length=20,
+        choices=MenuComedor.IDIOMA_CHOICES,
+        verbose_name=_('Idioma')
+    )
+
+    platos = models.JSONField(
+        default=list,
+        verbose_name=_('Platos'),
+        help_text=_('Lista de {"nombre", "alergenos"} en el orden del menú')
+    )
+
+    energia = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name=_('Información nutricional')
+    )
+
+    class Meta:
+        verbose_name = _('Menú del día')
+        verbose_name_plural = _('Menús del día')
+        ordering = ['fecha', 'idioma']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'idioma'], name='menu_dia_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y} ({self.get_idioma_display()})"
+
+class TareaSegundoPlano(models.Model):
+    """Trabajo pesado (p. ej. separar un PDF de menús) que procesa el worker procesar_tareas"""
+    ESTADO_CHOICES = [
+        ('pendiente', _('Pendiente')),
+        ('en_proceso', _('En proceso')),
+        ('completada', _('Completada')),
+        ('error', _('Error')),
+    ]
+
+    tipo = models.CharField(
+        max_length=50,
+        verbose_name=_('Tipo'),
+        help_text=_('Nombre del manejador registrado en usuarios/tasks.py')
+    )
+
+    parametros = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('Parámetros')
+    )
+
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='pendiente',
+        db_index=True,
+        verbose_name=_('Estado')
+    )
+
+    progreso = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Progreso (%)')
+    )
+
+    mensaje = models.TextField(
+        blank=True,
+        default='',
+        verbose_name=_('Mensaje'),
+        help_text=_('Resultado o error de la última ejecución')
+    )
+
+    intentos = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Intentos')
+    )
+
+    creada_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name=_('Creada por')
+    )
+
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Fecha de creación')
+    )
+
+    fecha_inicio = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Inicio')
+    )
+
+    fecha_fin = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Fin')
+    )
+
+    class Meta:
+        verbose_name = _('Tarea en segundo plano')
+        verbose_name_plural = _('Tareas en segundo plano')
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_estado_display()})"
+
+    @property
+    def terminada(self):
+        return self.estado in ('completada', 'error')
+
+
+class EntradaBusqueda(models.Model):
+    """
+    Texto indexado para la búsqueda del sitio (ver busqueda.py): una fila por
+    noticia, actividad o consejo y por idioma. El índice de texto completo
+    (FTS5 en SQLite, tsvector + GIN en PostgreSQL) se crea en la migración.
+    """
+    TIPO_CHOICES = [
+        ('noticia', _('Noticia')),
+        ('actividad', _('Actividad')),
+        ('consejo', _('Consejo educativo')),
+    ]
+
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPO_CHOICES,
+        verbose_name=_('Tipo')
+    )
+
+    objeto_id = models.PositiveIntegerField(
+        verbose_name=_('Id del objeto')
+    )
+
+    idioma = models.CharField(
+        max_length=5,
+        blank=True,
+        verbose_name=_('Idioma'),
+        help_text=_('Vacío = se encuentra en todos los idiomas')
+    )
+
+    titulo = models.CharField(
+        max_length=200,
+        verbose_name=_('Título')
+    )
+
+    texto = models.TextField(
+        blank=True,
+        verbose_name=_('Texto')
+    )
+
+    fecha = models.DateTimeField(
+        verbose_name=_('Fecha'),
+        help_text=_('Las noticias no aparecen antes de esta fecha')
+    )
+
+    slug = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name=_('Slug')
+    )
+
+    class Meta:
+        verbose_name = _('Entrada de búsqueda')
+        verbose_name_plural = _('Entradas de búsqueda')
+        indexes = [
+            models.Index(fields=['tipo', 'objeto_id'], name='busqueda_objeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.objeto_id} ({self.idioma or '*'})"
@@ -0,0 +1,113 @@
+"""
+Listado de noticias
+
+La lista solo necesita, de cada noticia, el título y el resumen del idioma
+activo, la imagen y la fecha. Aquí se prepara la consulta que:
+
+- Pide a la base de datos solo la página que se muestra (LIMIT/OFFSET con
+  el Paginator, o por cursor en la API).
+- Carga solo las columnas del idioma activo (.only); el contenido completo
+  se carga solo si se pide.
+- Ordena por (destacada, fecha_publicacion, id), con el índice
+  noticia_listado_idx, para que el coste no crezca con el archivo.
+
+La API (noticias_api) usa paginación por cursor (keyset): el cursor es la
+última noticia enviada y la siguiente página empieza justo después, sin
+OFFSET, así que pedir la página 50 cuesta lo mismo que la primera.
+"""
+
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+# Noticias por página (lista y API)
+PAGE_SIZE = 6
+
+ORDEN = ('-destacada', '-fecha_publicacion', '-id')
+
+
+def language_suffix(language):
+    return '_eu' if language == 'eu' else ''
+
+
+def list_fields(language, con_contenido=False):
+    """Columnas de la lista en el idioma indicado"""
+    sufijo = language_suffix(language)
+    campos = ['id', 'slug', 'imagen', 'fecha_publicacion', 'destacada', f'titulo{sufijo}', f'resumen{sufijo}']
+    if con_contenido:
+        campos.append(f'contenido{sufijo}')
+    return campos
+
+
+def published():
+    """Noticias publicadas y con la fecha de publicación ya pasada"""
+    from .models import Noticia
+
+    return Noticia.objects.filter(publicada=True, fecha_publicacion__lte=timezone.now())
+
+
+def list_queryset(language, con_contenido=False):
+    return published().only(*list_fields(language, con_contenido)).order_by(*ORDEN)
+
+
+def localize(noticias, language):
+    """Añade titulo_localizado, resumen_localizado (y contenido_localizado si está cargado)"""
+    campo_contenido = f'contenido{language_suffix(language)}'
+    for noticia in noticias:
+        noticia.titulo_localizado = noticia.get_titulo_localized(language)
+        noticia.resumen_localizado = noticia.get_resumen_localized(language)
+        if campo_contenido not in noticia.get_deferred_fields():
+            noticia.contenido_localizado = noticia.get_contenido_localized(language)
+    return noticias
+
+
+def encode_cursor(noticia):
+    """Cursor opaco con la posición de la noticia en el orden de la lista"""
+    valor = f'{int(noticia.destacada)}|{noticia.fecha_publicacion.isoformat()}|{noticia.id}'
+    return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(destacada, fecha_publicacion, id) del cursor; ValueError si no es válido"""
+    # Los errores de base64 y de UTF-8 también son ValueError
+    valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+    destacada, fecha, noticia_id = valor.split('|')
+    return destacada == '1', datetime.fromisoformat(fecha), int(noticia_id)
+
+
+def after_cursor(queryset, cursor):
+    """Las noticias que van después del cursor en el orden de la lista"""
+    destacada, fecha, noticia_id = decode_cursor(cursor)
+    return queryset.filter(
+        Q(destacada__lt=destacada)
+        | Q(destacada=destacada, fecha_publicacion__lt=fecha)
+        | Q(destacada=destacada, fecha_publicacion=fecha, id__lt=noticia_id)
+    )
+
+
+def keyset_page(language, cursor=None, size=PAGE_SIZE):
+    """
+    Una página de la API: (noticias, cursor de la siguiente o None). Se pide
+    una noticia de más para saber si hay otra página sin hacer count().
+    """
+    noticias = list_queryset(language)
+    if cursor:
+        noticias = after_cursor(noticias, cursor)
+    noticias = list(noticias[:size + 1])
+    siguiente = encode_cursor(noticias[size - 1]) if len(noticias) > size else None
+    return localize(noticias[:size], language), siguiente
+
+
+def serialize_resumen(noticia):
+    """Datos de la tarjeta de una noticia (sin el contenido, que se pide al abrirla)"""
+    return {
+        'id': noticia.id,
+        'slug': noticia.slug,
+        'titulo': noticia.titulo_localizado,
+        'resumen': noticia.resumen_localizado,
+        'fecha_publicacion': timezone.localtime(noticia.fecha_publicacion).strftime('%d/%m/%Y'),
+        'imagen': noticia.imagen.url if noticia.imagen else None,
+        'destacada': noticia.destacada,
+    }
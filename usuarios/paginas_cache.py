@@ -0,0 +1,181 @@
+"""
+Caché de páginas públicas completas para visitantes anónimos
+
+La portada, el comedor, las extraescolares, el aula matinal, los estatutos,
+los consejos y la lista de noticias son iguales para todos los visitantes
+sin sesión en un mismo idioma. Con @public_page se guarda el HTML de la
+respuesta, por ruta, idioma y los parámetros GET que usa la vista, y se
+devuelve sin consultas ni plantillas.
+
+- Solo para visitantes anónimos: con sesión iniciada (staff o no) la página
+  lleva el nombre del usuario y los botones de edición.
+- Al guardar o borrar noticias, actividades, consejos o menús se sube la
+  versión de las páginas (señales en usuarios/signals.py). Los estatutos
+  dependen además de los archivos de media/documentos (documents_version).
+- Una página deja de estar fresca al cambiar la versión, a medianoche (la
+  portada y el comedor dependen del día) o cuando llega la fecha de
+  publicación de la próxima noticia programada, así que sale a su hora.
+- Stale-while-revalidate: si la página guardada ya no está fresca, una sola
+  petición la vuelve a generar (bloqueo en la caché) y las demás reciben la
+  guardada mientras tanto, durante como mucho MARGEN_OBSOLETA segundos.
+
+El token CSRF de cada visitante no se guarda: la página se genera con una
+marca (context_processors.public_page_csrf) que se sustituye al servirla.
+"""
+
+import hashlib
+import os
+from datetime import datetime, time, timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.translation import get_language
+
+VERSION_KEY = 'paginas:version'
+
+# Subir si cambia la estructura de lo que se guarda en la caché
+FORMATO = 1
+
+# Tiempo máximo que una página se da por fresca (por si algo cambia sin señales)
+TTL = 15 * 60
+
+# Tiempo que se sigue sirviendo una página obsoleta mientras se regenera
+MARGEN_OBSOLETA = 10 * 60
+
+# Si la petición que regenera falla, otra lo intenta pasado este tiempo
+BLOQUEO = 30
+
+# Sustituye al token CSRF en el HTML guardado
+CSRF_MARCA = 'paginapublicacsrfmarca'
+
+
+def page_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_pages():
+    """Las páginas guardadas dejan de estar frescas (se regeneran en la siguiente visita)"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # La clave no existía (caché vacía o reiniciada)
+        cache.set(VERSION_KEY, 2, None)
+
+
+def documents_version():
+    """Nombre, tamaño y fecha de los archivos de media/documentos (estatutos)"""
+    documentos_dir = os.path.join(settings.MEDIA_ROOT, 'documentos')
+    try:
+        with os.scandir(documentos_dir) as entradas:
+            return sorted(
+                (entrada.name, entrada.stat().st_size, entrada.stat().st_mtime)
+                for entrada in entradas if entrada.is_file()
+            )
+    except FileNotFoundError:
+        return []
+
+
+def next_publication(ahora):
+    """Fecha de publicación de la próxima noticia programada (o None)"""
+    from .models import Noticia
+
+    return Noticia.objects.filter(
+        publicada=True, fecha_publicacion__gt=ahora
+    ).order_by('fecha_publicacion').values_list('fecha_publicacion', flat=True).first()
+
+
+def fresh_until(ahora, proxima_publicacion=None):
+    """Hasta cuándo es fresca una página generada ahora"""
+    manana = timezone.localtime(ahora).date() + timedelta(days=1)
+    limites = [ahora + timedelta(seconds=TTL), timezone.make_aware(datetime.combine(manana, time.min))]
+    if proxima_publicacion:
+        limites.append(proxima_publicacion)
+    return min(limites)
+
+
+def is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    return not request.user.is_authenticated
+
+
+def page_key(request, params):
+    consulta = '&'.join(f'{nombre}={request.GET.get(nombre, "")}' for nombre in params)
+    ruta = hashlib.md5(f'{request.path}?{consulta}'.encode('utf-8')).hexdigest()
+    return f'paginas:{FORMATO}:{get_language()}:{ruta}'
+
+
+def with_csrf_token(request, contenido):
+    """
+    El HTML con el token CSRF de este visitante en lugar de la marca. Solo
+    se pide el token (cookie y Vary: Cookie) si la página tiene formularios.
+    """
+    marca = CSRF_MARCA.encode('ascii')
+    if marca not in contenido:
+        return contenido
+    return contenido.replace(marca, get_token(request).encode('ascii'))
+
+
+def serve(request, entrada):
+    return HttpResponse(with_csrf_token(request, entrada['contenido']), content_type=entrada['content_type'])
+
+
+def public_page(params=(), version=None):
+    """
+    Guarda la página para los visitantes anónimos. `params` son los
+    parámetros GET que cambian la página (los demás no forman parte de la
+    clave) y `version` una función con lo que, aparte de los modelos, hace
+    que la página cambie.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+
+            key = page_key(request, params)
+            actual = (page_version(), version() if version else None)
+            ahora = timezone.now()
+            entrada = cache.get(key)
+
+            bloqueo = None
+            if entrada is not None:
+                if entrada['version'] == actual and ahora.timestamp() < entrada['fresca_hasta']:
+                    return serve(request, entrada)
+                # Obsoleta: la regenera quien consiga el bloqueo; el resto recibe la guardada
+                bloqueo = f'{key}:regenerando'
+                if not cache.add(bloqueo, 1, BLOQUEO):
+                    return serve(request, entrada)
+
+            request.pagina_publica = True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request.pagina_publica = False
+                if bloqueo:
+                    cache.delete(bloqueo)
+
+            if response.status_code != 200 or response.streaming:
+                if not response.streaming:
+                    response.content = with_csrf_token(request, response.content)
+                return response
+
+            hasta = fresh_until(ahora, next_publication(ahora))
+            entrada = {
+                'version': actual,
+                'fresca_hasta': hasta.timestamp(),
+                'contenido': response.content,
+                'content_type': response['Content-Type'],
+            }
+            cache.set(key, entrada, int((hasta - ahora).total_seconds()) + MARGEN_OBSOLETA)
+            return serve(request, entrada)
+        return wrapper
+    return decorator
@@ -0,0 +1,158 @@
+"""
+Respuestas JSON preparadas al guardar
+
+Los modales piden el detalle de una noticia o de una actividad cada vez que
+se abren. En lugar de montar el diccionario en cada petición (strftime,
+get_hora_completa(), get_duracion(), imagen.url...), se prepara al guardar
+la fila (señales en usuarios/signals.py), una vez por idioma, y se guarda en
+la caché: el texto JSON de las noticias, que se devuelve tal cual, y el
+diccionario de las actividades, que las vistas meten en su respuesta.
+
+Las vistas solo leen la versión de la fila (su fecha de modificación, que
+forma parte de la clave) y devuelven lo guardado. Si no está (caché
+vaciada, fila guardada sin señales) se genera en ese momento y se guarda.
+Un update() que no cambia la fecha de modificación no se detecta, igual
+que en el calendario.
+
+Lo que cambia con el día (es_hoy / es_pasada de las actividades) no se
+guarda: se añade al leer con with_day_flags().
+"""
+
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone, translation
+
+from .actividades_calendar import serialize_actividad
+
+# Las claves cambian al modificar la fila; el tiempo solo limpia las viejas
+CACHE_TIMEOUT = 30 * 24 * 60 * 60
+
+# Subir si cambia la estructura de lo que se guarda en la caché
+FORMATO = 2
+
+
+def languages():
+    return [codigo for codigo, _nombre in settings.LANGUAGES]
+
+
+def get_or_build(key, build):
+    """Lo guardado en `key`, o lo que genera build() (y se guarda)"""
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, CACHE_TIMEOUT)
+    return payload
+
+
+# Noticias
+
+def noticia_key(noticia_id, version, idioma):
+    return f'payload:{FORMATO}:noticia:{noticia_id}:{idioma}:{version.timestamp()}'
+
+
+def noticia_staff_key(noticia_id, version):
+    return f'payload:{FORMATO}:noticia:staff:{noticia_id}:{version.timestamp()}'
+
+
+def build_noticia(noticia, idioma):
+    """Respuesta de /noticia/<id>/ (modal público) en el idioma indicado"""
+    # Seleccionar título y contenido según idioma
+    if idioma == 'eu' and noticia.titulo_eu:
+        titulo = noticia.titulo_eu
+        resumen = noticia.resumen_eu or noticia.resumen
+        contenido = noticia.contenido_eu or noticia.contenido
+    else:
+        titulo = noticia.titulo
+        resumen = noticia.resumen
+        contenido = noticia.contenido
+
+    return json.dumps({
+        'success': True,
+        'noticia': {
+            'id': noticia.id,
+            'titulo': titulo,
+            'resumen': resumen,
+            'contenido': contenido,
+            'fecha_publicacion': noticia.fecha_publicacion.strftime('%d %B %Y'),
+            'imagen': noticia.imagen.url if noticia.imagen else None,
+            'destacada': noticia.destacada
+        }
+    })
+
+
+def build_noticia_staff(noticia):
+    """Respuesta de obtener_noticia (formulario de edición, los dos idiomas)"""
+    return json.dumps({
+        'id': noticia.id,
+        'titulo': noticia.titulo,
+        'titulo_eu': noticia.titulo_eu or '',
+        'resumen': noticia.resumen,
+        'resumen_eu': noticia.resumen_eu or '',
+        'contenido': noticia.contenido,
+        'contenido_eu': noticia.contenido_eu or '',
+        'publicada': noticia.publicada,
+        'imagen_url': noticia.imagen.url if noticia.imagen else ''
+    })
+
+
+def store_noticia(noticia):
+    """Serializa la noticia en todos los idiomas (al guardarla)"""
+    version = noticia.fecha_modificacion
+    datos = {noticia_key(noticia.id, version, idioma): build_noticia(noticia, idioma) for idioma in languages()}
+    datos[noticia_staff_key(noticia.id, version)] = build_noticia_staff(noticia)
+    cache.set_many(datos, CACHE_TIMEOUT)
+
+
+def get_noticia(noticia_id, version, idioma):
+    from .models import Noticia
+
+    return get_or_build(
+        noticia_key(noticia_id, version, idioma),
+        lambda: build_noticia(Noticia.objects.get(id=noticia_id), idioma),
+    )
+
+
+def get_noticia_staff(noticia_id, version):
+    from .models import Noticia
+
+    return get_or_build(
+        noticia_staff_key(noticia_id, version),
+        lambda: build_noticia_staff(Noticia.objects.get(id=noticia_id)),
+    )
+
+
+# Actividades
+
+def actividad_key(actividad_id, version, idioma):
+    return f'payload:{FORMATO}:actividad:{actividad_id}:{idioma}:{version.timestamp()}'
+
+
+def build_actividad(actividad, idioma):
+    """serialize_actividad en el idioma indicado (el tipo de actividad se traduce)"""
+    with translation.override(idioma):
+        return serialize_actividad(actividad)
+
+
+def store_actividad(actividad):
+    """Serializa la actividad en todos los idiomas (al guardarla)"""
+    cache.set_many({
+        actividad_key(actividad.id, actividad.fecha_actualizacion, idioma): build_actividad(actividad, idioma)
+        for idioma in languages()
+    }, CACHE_TIMEOUT)
+
+
+def get_actividad(actividad_id, version, idioma):
+    from .models import Actividad
+
+    return get_or_build(
+        actividad_key(actividad_id, version, idioma),
+        lambda: build_actividad(Actividad.objects.get(id=actividad_id), idioma),
+    )
+
+
+def with_day_flags(datos, fecha):
+    """Los datos de una actividad con es_hoy / es_pasada (según el día de hoy)"""
+    hoy = timezone.localdate()
+    return {**datos, 'es_hoy': fecha == hoy, 'es_pasada': fecha < hoy}
@@ -0,0 +1,36 @@
+"""
+Utilidades para los PDFs de menús
+
+La linearización ("fast web view") reordena el PDF para que el visor del
+navegador pueda mostrar la primera página con los primeros kilobytes,
+pidiendo el resto con peticiones Range. Necesita pikepdf; si no está
+instalado los PDFs se dejan tal cual.
+"""
+
+import os
+
+try:
+    import pikepdf
+except ImportError:  # pikepdf es opcional
+    pikepdf = None
+
+
+def linearize_pdf(pdf_path):
+    """
+    Lineariza un PDF en el mismo sitio (escribe a un temporal y renombra).
+    Retorna True si el archivo se ha linearizado.
+    """
+    if pikepdf is None:
+        return False
+
+    temp_path = f'{pdf_path}.linearizando'
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            pdf.save(temp_path, linearize=True)
+        os.replace(temp_path, pdf_path)
+        return True
+    except Exception as e:
+        print(f"⚠️ No se pudo linearizar {os.path.basename(pdf_path)}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
@@ -0,0 +1,69 @@
+"""
+Señales de la app usuarios
+
+Invalidan las cachés que dependen de los datos de los modelos, preparan
+las respuestas JSON de los detalles (payloads.py) al guardar y mantienen al
+día el índice de búsqueda (busqueda.py) y la versión de las páginas públicas
+guardadas (paginas_cache.py).
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .actividades_calendar import invalidate_calendar
+from .busqueda import index_object, unindex_object
+from .models import Actividad, ConsejoEducativo, MenuComedor, MenuDia, Noticia
+from .paginas_cache import invalidate_pages
+from .payloads import store_actividad, store_noticia
+
+
+@receiver(post_save, sender=Actividad)
+@receiver(post_delete, sender=Actividad)
+def actividad_cambiada(sender, **kwargs):
+    """Cualquier cambio en una actividad descarta los calendarios cacheados"""
+    invalidate_calendar()
+
+
+@receiver(post_save, sender=Actividad)
+def actividad_guardada(sender, instance, raw=False, **kwargs):
+    """El detalle de la actividad se serializa ahora, no al pedirlo"""
+    if not raw:
+        store_actividad(instance)
+
+
+@receiver(post_save, sender=Noticia)
+def noticia_guardada(sender, instance, raw=False, **kwargs):
+    """El detalle de la noticia se serializa ahora, no al pedirlo"""
+    if not raw:
+        store_noticia(instance)
+
+
+@receiver(post_save, sender=Noticia)
+@receiver(post_save, sender=Actividad)
+@receiver(post_save, sender=ConsejoEducativo)
+def contenido_guardado(sender, instance, raw=False, **kwargs):
+    """Actualiza las filas de búsqueda del objeto (las quita si ya no es visible)"""
+    if not raw:
+        index_object(instance)
+
+
+@receiver(post_delete, sender=Noticia)
+@receiver(post_delete, sender=Actividad)
+@receiver(post_delete, sender=ConsejoEducativo)
+def contenido_borrado(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+@receiver(post_save, sender=Noticia)
+@receiver(post_delete, sender=Noticia)
+@receiver(post_save, sender=Actividad)
+@receiver(post_delete, sender=Actividad)
+@receiver(post_save, sender=ConsejoEducativo)
+@receiver(post_delete, sender=ConsejoEducativo)
+@receiver(post_save, sender=MenuComedor)
+@receiver(post_delete, sender=MenuComedor)
+@receiver(post_save, sender=MenuDia)
+@receiver(post_delete, sender=MenuDia)
+def pagina_publica_cambiada(sender, **kwargs):
+    """Las páginas públicas guardadas se regeneran en la siguiente visita"""
+    invalidate_pages()
@@ -0,0 +1,220 @@
+"""
+Cola de tareas en segundo plano
+
+Las vistas que reciben archivos pesados (PDFs de menús) guardan la subida en
+TAREAS_UPLOAD_DIR, encolan una TareaSegundoPlano y responden enseguida. El
+comando `python manage.py procesar_tareas` (lanzado por cron o como proceso
+permanente) reclama las tareas pendientes y las ejecuta.
+
+Para añadir un tipo de tarea basta con registrar una función:
+
+    @tarea('mi_tipo')
+    def mi_tarea(t, **parametros):
+        ...
+        return 'Mensaje para el usuario'
+
+Si la función lanza una excepción la tarea queda en estado 'error' con el
+mensaje de la excepción.
+"""
+
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .menu_catalog import get_comedor_dir, menu_filename, register_menu
+from .models import TareaSegundoPlano
+
+# Manejadores registrados: tipo -> función
+TAREAS = {}
+
+# Veces que se reintenta una tarea que se quedó "en proceso" (worker caído)
+MAX_INTENTOS = 3
+
+# Minutos tras los que una tarea "en proceso" se considera abandonada
+MINUTOS_ATASCADA = 30
+
+
+def tarea(tipo):
+    """Decorador para registrar el manejador de un tipo de tarea"""
+    def decorator(func):
+        TAREAS[tipo] = func
+        return func
+    return decorator
+
+
+def guardar_subida(archivo, extension='.pdf'):
+    """Guarda un archivo subido en TAREAS_UPLOAD_DIR y retorna su ruta"""
+    upload_dir = str(settings.TAREAS_UPLOAD_DIR)
+    os.makedirs(upload_dir, exist_ok=True)
+
+    ruta = os.path.join(upload_dir, f'{uuid.uuid4().hex}{extension}')
+    with open(ruta, 'wb') as f:
+        for chunk in archivo.chunks():
+            f.write(chunk)
+    return ruta
+
+
+def encolar(tipo, parametros=None, usuario=None):
+    """Crea una tarea pendiente y la retorna"""
+    if tipo not in TAREAS:
+        raise ValueError(f'Tipo de tarea desconocido: {tipo}')
+
+    return TareaSegundoPlano.objects.create(
+        tipo=tipo,
+        parametros=parametros or {},
+        creada_por=usuario if usuario and usuario.is_authenticated else None,
+    )
+
+
+def actualizar_progreso(t, progreso, mensaje=None):
+    """Guarda el progreso (0-100) para que lo vea la página de estado"""
+    t.progreso = max(0, min(100, int(progreso)))
+    campos = ['progreso']
+    if mensaje is not None:
+        t.mensaje = mensaje
+        campos.append('mensaje')
+    t.save(update_fields=campos)
+
+
+def recuperar_atascadas():
+    """
+    Vuelve a poner como pendientes las tareas que llevan demasiado tiempo
+    "en proceso" (el worker murió a mitad). Tras MAX_INTENTOS se dan por fallidas.
+    """
+    limite = timezone.now() - timedelta(minutes=MINUTOS_ATASCADA)
+    atascadas = TareaSegundoPlano.objects.filter(estado='en_proceso', fecha_inicio__lt=limite)
+
+    fallidas = atascadas.filter(intentos__gte=MAX_INTENTOS).update(
+        estado='error',
+        mensaje='La tarea no terminó tras varios intentos',
+        fecha_fin=timezone.now(),
+    )
+    reintentos = atascadas.filter(intentos__lt=MAX_INTENTOS).update(estado='pendiente')
+    return reintentos, fallidas
+
+
+def reclamar_siguiente():
+    """
+    Marca como "en proceso" la tarea pendiente más antigua y la retorna.
+    El UPDATE condicionado al estado evita que dos workers cojan la misma.
+    """
+    pendientes = (
+        TareaSegundoPlano.objects.filter(estado='pendiente')
+        .order_by('fecha_creacion')
+        .values_list('pk', flat=True)[:10]
+    )
+
+    for pk in pendientes:
+        reclamada = TareaSegundoPlano.objects.filter(pk=pk, estado='pendiente').update(
+            estado='en_proceso',
+            fecha_inicio=timezone.now(),
+            intentos=F('intentos') + 1,
+        )
+        if reclamada:
+            return TareaSegundoPlano.objects.get(pk=pk)
+
+    return None
+
+
+def ejecutar(t):
+    """Ejecuta una tarea ya reclamada y guarda el resultado"""
+    manejador = TAREAS.get(t.tipo)
+
+    try:
+        if manejador is None:
+            raise ValueError(f'Tipo de tarea desconocido: {t.tipo}')
+
+        t.mensaje = manejador(t, **t.parametros) or ''
+        t.estado = 'completada'
+        t.progreso = 100
+    except Exception as e:
+        t.mensaje = str(e) or e.__class__.__name__
+        t.estado = 'error'
+
+    t.fecha_fin = timezone.now()
+    t.save(update_fields=['estado', 'progreso', 'mensaje', 'fecha_fin'])
+    return t
+
+
+def procesar_pendientes(max_tareas=None):
+    """Procesa tareas pendientes hasta vaciar la cola. Retorna las ejecutadas"""
+    recuperar_atascadas()
+    limpiar_subidas()
+
+    ejecutadas = []
+    while max_tareas is None or len(ejecutadas) < max_tareas:
+        t = reclamar_siguiente()
+        if t is None:
+            break
+        ejecutadas.append(ejecutar(t))
+
+    return ejecutadas
+
+
+def _borrar_subida(ruta):
+    if ruta and os.path.exists(ruta):
+        os.remove(ruta)
+
+
+def limpiar_subidas(horas=24):
+    """
+    Borra las subidas de TAREAS_UPLOAD_DIR que ya no necesita ninguna tarea
+    pendiente o en proceso (las de tareas con error se guardan `horas` horas).
+    Retorna cuántas se borraron.
+    """
+    upload_dir = str(settings.TAREAS_UPLOAD_DIR)
+    if not os.path.isdir(upload_dir):
+        return 0
+
+    en_uso = {
+        parametros.get('ruta')
+        for parametros in TareaSegundoPlano.objects.filter(
+            estado__in=['pendiente', 'en_proceso']
+        ).values_list('parametros', flat=True)
+    }
+    limite = (timezone.now() - timedelta(hours=horas)).timestamp()
+
+    borradas = 0
+    for entrada in os.scandir(upload_dir):
+        if entrada.is_file() and entrada.path not in en_uso and entrada.stat().st_mtime < limite:
+            os.remove(entrada.path)
+            borradas += 1
+    return borradas
+
+
+# Los manejadores pueden ejecutarse otra vez si el worker muere a mitad
+# (recuperar_atascadas): la subida solo se borra al terminar bien.
+
+@tarea('separar_menu')
+def separar_menu(t, ruta, mes, anio, sobrescribir=False):
+    """Separa un PDF de menú completo en un PDF por idioma (mes es el número)"""
+    from .menu_split import split_menu
+
+    actualizar_progreso(t, 10, 'Separando páginas...')
+    # En un reintento los archivos que ya existan son los de la vez anterior
+    # (la vista comprobó antes de encolar que no había otro menú)
+    archivos = split_menu(ruta, anio, mes, sobrescribir=sobrescribir or t.intentos > 1)
+    _borrar_subida(ruta)
+
+    return f'Menús subidos correctamente: {", ".join(archivos)}'
+
+
+@tarea('publicar_menu')
+def publicar_menu(t, ruta, anio, mes, idioma):
+    """Mueve un PDF de menú ya subido a media/comedor/ y lo registra en el catálogo"""
+    filename = menu_filename(anio, mes, idioma)
+    comedor_dir = get_comedor_dir()
+    destino = os.path.join(comedor_dir, filename)
+    os.makedirs(comedor_dir, exist_ok=True)
+
+    # Si no está la subida, un intento anterior ya la movió y falta registrarla
+    if os.path.exists(ruta) or not os.path.exists(destino):
+        os.replace(ruta, destino)
+
+    actualizar_progreso(t, 50, 'Optimizando PDF...')
+    register_menu(anio, mes, idioma, filename)
+    return f'Menú subido correctamente: {filename}'
@@ -1,3 +1,2246 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time as time_module
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone, translation
+from django.utils.http import http_date
+from pypdf import PdfReader
+
+from . import actividades_calendar, actividades_ical, menu_catalog, menu_days, menu_images, payloads, tasks, views
+from .actividades_recurrencia import occurrence_dates
+from .busqueda import search
+from .file_serving import MAX_RANGES, if_range_matches, parse_range_header
+from .media_wsgi import MediaWSGIMiddleware
+from .menu_split import STAGING_SUFFIX, MenuSplitError, plan_pages, split_menu
+from .models import Actividad, ConsejoEducativo, MenuComedor, MenuDia, Noticia, TareaSegundoPlano
+from .paginas_cache import CSRF_MARCA, TTL, fresh_until, invalidate_pages, page_key, public_page
+
+# Caché en memoria para los tests con base de datos (las señales guardan en
+# la caché y no deben tocar la de desarrollo)
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Tiempo máximo (segundos) para importar los descargadores o cargar sus
+# comandos en un intérprete nuevo. Hoy tardan décimas de segundo; con
+# django.setup() y pypdf al importar pasaban del doble.
+IMPORT_BUDGET_SECONDS = 1.0
+
+
+def run_isolated(code, cwd):
+    """Ejecuta `code` en un intérprete nuevo y retorna el JSON que imprime"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'apyma_site.settings.development')
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=cwd, env=env, capture_output=True, text=True, timeout=60,
+    )
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT en un directorio temporal, sin proxy de envío (MEDIA_OFFLOAD)"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media_root, MEDIA_OFFLOAD=None)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def media_file(self, relative, contenido):
+        ruta = os.path.join(self.media_root, *relative.split('/'))
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as f:
+            f.write(contenido)
+        return ruta
+
+
+def make_pdf(textos):
+    """PDF mínimo con una página por texto (para leerlo después con pypdf)"""
+    objetos = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for texto in textos:
+        stream = f'BT /F1 12 Tf 20 100 Td ({texto}) Tj ET'
+        objetos.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objetos.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents {len(objetos)} 0 R '
+            '/Resources << /Font << /F1 3 0 R >> >> >>'
+        )
+        kids.append(f'{len(objetos)} 0 R')
+    objetos[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for numero, objeto in enumerate(objetos, 1):
+        offsets.append(len(pdf))
+        pdf += f'{numero} 0 obj\n{objeto}\nendobj\n'.encode('latin-1')
+    xref = len(pdf)
+    pdf += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    pdf += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('ascii')
+    pdf += f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('ascii')
+    return pdf
+
+
+def response_body(response):
+    """Cuerpo de una respuesta normal o por bloques (y la cierra)"""
+    try:
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+    finally:
+        response.close()
+
+
+class MenuScriptImportTests(SimpleTestCase):
+    """Los scripts de menús se importan sin Django y los comandos los cargan solo en handle()"""
+
+    def test_scripts_import_without_django(self):
+        datos = run_isolated(
+            'import json, sys, time\n'
+            't = time.perf_counter()\n'
+            'import download_menus_automated, download_menus_simple_new\n'
+            'elapsed = time.perf_counter() - t\n'
+            'print(json.dumps({"elapsed": elapsed, "modules": sorted(\n'
+            '    m for m in ("django", "bs4", "pypdf") if m in sys.modules)}))',
+            cwd=os.path.join(settings.BASE_DIR, 'scripts'),
+        )
+        self.assertEqual(datos['modules'], [])
+        self.assertLess(datos['elapsed'], IMPORT_BUDGET_SECONDS)
+
+    def test_commands_load_scripts_lazily(self):
+        datos = run_isolated(
+            'import json, sys, time, django\n'
+            'django.setup()\n'
+            'from django.core.management import load_command_class\n'
+            't = time.perf_counter()\n'
+            'for name in ("download_menus", "actualizar_menus"):\n'
+            '    load_command_class("usuarios", name)\n'
+            'elapsed = time.perf_counter() - t\n'
+            'print(json.dumps({"elapsed": elapsed, "modules": sorted(\n'
+            '    m for m in ("download_menus_automated", "download_menus_simple_new", "requests", "bs4")\n'
+            '    if m in sys.modules)}))',
+            cwd=str(settings.BASE_DIR),
+        )
+        self.assertEqual(datos['modules'], [])
+        self.assertLess(datos['elapsed'], IMPORT_BUDGET_SECONDS)
+
+
+class OccurrenceDatesTests(SimpleTestCase):
+    """Fechas de las series: solo las del rango, sin recorrer la serie desde el principio"""
+
+    def serie(self, **kwargs):
+        return Actividad(hora_comienzo=time(18), **kwargs)
+
+    def test_weekly_jumps_to_range(self):
+        serie = self.serie(fecha=date(2020, 1, 6), recurrencia='semanal', intervalo=2)
+        fechas = list(occurrence_dates(serie, date(2026, 10, 1), date(2026, 10, 31)))
+        self.assertEqual(fechas, [date(2026, 10, 5), date(2026, 10, 19)])
+
+    def test_monthly_skips_short_months_and_stops(self):
+        serie = self.serie(fecha=date(2024, 1, 31), recurrencia='mensual', intervalo=1,
+                           recurrencia_hasta=date(2024, 6, 30))
+        fechas = list(occurrence_dates(serie, date(2024, 1, 1), date(2024, 12, 31)))
+        self.assertEqual(fechas, [date(2024, 1, 31), date(2024, 3, 31), date(2024, 5, 31)])
+
+
+class FreshUntilTests(SimpleTestCase):
+    """Las páginas públicas guardadas caducan al publicarse la próxima noticia o a medianoche"""
+
+    def test_scheduled_news_expires_page(self):
+        ahora = timezone.make_aware(datetime(2026, 10, 18, 10, 0))
+        publicacion = ahora + timedelta(minutes=5)
+        self.assertEqual(fresh_until(ahora, publicacion), publicacion)
+        self.assertEqual(fresh_until(ahora), ahora + timedelta(seconds=TTL))
+
+    def test_midnight_expires_page(self):
+        ahora = timezone.make_aware(datetime(2026, 10, 18, 23, 55))
+        self.assertEqual(fresh_until(ahora), timezone.make_aware(datetime(2026, 10, 19, 0, 0)))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PublicPageTests(TestCase):
+    """@public_page: HTML guardado para los anónimos, invalidación, stale-while-revalidate y token CSRF"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.generadas = 0
+
+        @public_page(params=('page',))
+        def vista(request):
+            self.generadas += 1
+            plantilla = engines['django'].from_string(self.plantilla)
+            return HttpResponse(plantilla.render({'n': self.generadas}, request))
+
+        self.vista = vista
+        self.plantilla = '<p>Generada {{ n }}</p>'
+
+    def get(self, path='/es/', user=None, **params):
+        request = self.factory.get(path, params)
+        request.user = user or AnonymousUser()
+        return request, self.vista(request)
+
+    def test_anonymous_miss_then_hit(self):
+        _, primera = self.get()
+        request, segunda = self.get(otro='ignorado')
+        self.assertEqual(primera.content, b'<p>Generada 1</p>')
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(self.generadas, 1)
+        # Sin marca CSRF en la página no se pide token (ni cookie ni Vary: Cookie)
+        self.assertNotIn('CSRF_COOKIE', request.META)
+
+        # Los parámetros de la vista forman parte de la clave
+        self.assertEqual(self.get(page='2')[1].content, b'<p>Generada 2</p>')
+
+    def test_authenticated_users_bypass_cache(self):
+        self.get()
+        usuario = User(username='familia')
+        self.assertEqual(self.get(user=usuario)[1].content, b'<p>Generada 2</p>')
+        self.assertEqual(self.get(user=usuario)[1].content, b'<p>Generada 3</p>')
+        self.assertEqual(self.get()[1].content, b'<p>Generada 1</p>')
+
+    def test_invalidate_pages_regenerates(self):
+        self.get()
+        invalidate_pages()
+        self.assertEqual(self.get()[1].content, b'<p>Generada 2</p>')
+        self.assertEqual(self.get()[1].content, b'<p>Generada 2</p>')
+
+        # Pasada la frescura (medianoche o TTL) también se regenera
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=TTL + 1)):
+            self.assertEqual(self.get()[1].content, b'<p>Generada 3</p>')
+
+    def test_stale_page_served_while_regenerating(self):
+        request, _ = self.get()
+        invalidate_pages()
+        # Otra petición está regenerando la página
+        bloqueo = f'{page_key(request, ("page",))}:regenerando'
+        cache.add(bloqueo, 1, 30)
+
+        self.assertEqual(self.get()[1].content, b'<p>Generada 1</p>')
+        self.assertEqual(self.generadas, 1)
+
+        cache.delete(bloqueo)
+        self.assertEqual(self.get()[1].content, b'<p>Generada 2</p>')
+        self.assertIsNone(cache.get(bloqueo))
+
+    def test_csrf_marker_replaced_per_visitor(self):
+        self.plantilla = '<input name="csrfmiddlewaretoken" value="{{ csrf_token }}">'
+        primera_request, primera = self.get()
+        segunda_request, segunda = self.get()
+        self.assertEqual(self.generadas, 1)
+
+        self.assertIn(CSRF_MARCA.encode('ascii'), cache.get(page_key(primera_request, ('page',)))['contenido'])
+        for request, response in ((primera_request, primera), (segunda_request, segunda)):
+            self.assertNotIn(CSRF_MARCA.encode('ascii'), response.content)
+            self.assertTrue(request.META['CSRF_COOKIE_NEEDS_UPDATE'])
+            token = response.content.decode('ascii').split('value="')[1].split('"')[0]
+            self.assertEqual(len(token), 64)
+        self.assertNotEqual(primera.content, segunda.content)
+
+
+class ServeFileTests(TempMediaMixin, SimpleTestCase):
+    """serve_pdf y serve_documento transmiten el archivo y revalidan con ETag / Last-Modified"""
+
+    contenido = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.media_file('comedor/menu_enero_2026_castellano.pdf', self.contenido)
+        self.media_file('documentos/EstatutosActuales.pdf', self.contenido)
+
+    def get_pdf(self, **headers):
+        request = self.factory.get('/comedor/pdf/menu_enero_2026_castellano.pdf/', **headers)
+        return views.serve_pdf(request, 'menu_enero_2026_castellano.pdf')
+
+    def test_full_file_with_validators(self):
+        response = self.get_pdf()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response_body(response), self.contenido)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.get_pdf()['ETag']
+        response = self.get_pdf(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response_body(response), b'')
+
+        self.assertEqual(self.get_pdf(HTTP_IF_NONE_MATCH='"otro"').status_code, 200)
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.get_pdf()['Last-Modified']
+        self.assertEqual(self.get_pdf(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.get_pdf(HTTP_IF_MODIFIED_SINCE=http_date(0)).status_code, 200)
+
+    def test_documento_download_and_validation(self):
+        request = self.factory.get('/documentos/EstatutosActuales.pdf/', {'download': '1'})
+        response = views.serve_documento(request, 'EstatutosActuales.pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(response_body(response), self.contenido)
+
+        for filename in ('EstatutosActuales.txt', 'NoExiste.pdf', '../comedor/menu_enero_2026_castellano.pdf'):
+            with self.assertRaises(Http404):
+                views.serve_documento(self.factory.get('/'), filename)
+
+
+class RangeHeaderTests(SimpleTestCase):
+    """Interpretación de Range e If-Range"""
+
+    def test_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-99', 1000), [(0, 99)])
+        self.assertEqual(parse_range_header('bytes=900-', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=990-2000', 1000), [(990, 999)])
+        # Sufijo: los últimos N bytes (o el archivo entero si N es mayor)
+        self.assertEqual(parse_range_header('bytes=-100', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=-5000', 1000), [(0, 999)])
+
+    def test_overlapping_ranges_are_merged(self):
+        self.assertEqual(
+            parse_range_header('bytes=500-599, 0-99,50-149,150-199', 1000),
+            [(0, 199), (500, 599)],
+        )
+
+    def test_unsatisfiable_and_invalid(self):
+        # Ningún rango dentro del archivo: lista vacía (416)
+        self.assertEqual(parse_range_header('bytes=1000-1100', 1000), [])
+        self.assertEqual(parse_range_header('bytes=-0', 1000), [])
+        # Cabecera no válida: None (se envía el archivo completo)
+        for header in ('bytes=', 'items=0-10', 'bytes=20-10', 'bytes=a-b', 'bytes=-', 'bytes=0-1;2-3'):
+            self.assertIsNone(parse_range_header(header, 1000), header)
+        muchos = ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(MAX_RANGES + 1))
+        self.assertIsNone(parse_range_header(f'bytes={muchos}', 1000))
+
+    def test_if_range(self):
+        self.assertTrue(if_range_matches(None, '"abc"', 1000))
+        self.assertTrue(if_range_matches('"abc"', '"abc"', 1000))
+        self.assertFalse(if_range_matches('"abd"', '"abc"', 1000))
+        # Los ETag débiles nunca valen para If-Range
+        self.assertFalse(if_range_matches('W/"abc"', '"abc"', 1000))
+        self.assertTrue(if_range_matches(http_date(1000), '"abc"', 1000))
+        self.assertFalse(if_range_matches(http_date(999), '"abc"', 1000))
+
+
+class ServeFileRangeTests(TempMediaMixin, SimpleTestCase):
+    """serve_pdf responde 206 / 416 a peticiones Range"""
+
+    contenido = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.media_file('comedor/menu.pdf', self.contenido)
+
+    def get_pdf(self, **headers):
+        return views.serve_pdf(self.factory.get('/comedor/pdf/menu.pdf/', **headers), 'menu.pdf')
+
+    def test_single_range(self):
+        response = self.get_pdf(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.contenido)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response_body(response), self.contenido[10:20])
+
+        response = self.get_pdf(HTTP_RANGE='bytes=-4')
+        self.assertEqual(response_body(response), self.contenido[-4:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get_pdf(HTTP_RANGE=f'bytes={len(self.contenido)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.contenido)}')
+
+    def test_multiple_ranges(self):
+        response = self.get_pdf(HTTP_RANGE='bytes=0-3,100-103')
+        self.assertEqual(response.status_code, 206)
+        content_type, _, boundary = response['Content-Type'].partition('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+
+        body = response_body(response)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        partes = body.split(f'--{boundary}'.encode('ascii'))
+        self.assertEqual(partes[0], b'')
+        self.assertEqual(partes[-1], b'--\r\n')
+
+        esperadas = [(0, 3), (100, 103)]
+        for parte, (start, end) in zip(partes[1:-1], esperadas):
+            cabeceras, _, datos = parte.partition(b'\r\n\r\n')
+            self.assertIn(f'Content-Range: bytes {start}-{end}/{len(self.contenido)}'.encode('ascii'), cabeceras)
+            self.assertIn(b'Content-Type: application/pdf', cabeceras)
+            self.assertEqual(datos, self.contenido[start:end + 1] + b'\r\n')
+
+    def test_if_range_mismatch_sends_full_file(self):
+        etag = self.get_pdf()['ETag']
+        response = self.get_pdf(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+        response = self.get_pdf(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"version-anterior"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_body(response), self.contenido)
+
+
+class MediaWSGITests(TempMediaMixin, SimpleTestCase):
+    """MediaWSGIMiddleware responde a /media/ sin pasar por Django"""
+
+    css = b'body { color: green; }' * 20
+
+    def setUp(self):
+        super().setUp()
+        self.ruta_css = self.media_file('noticias/estilo.css', self.css)
+        self.media_file('noticias/foto.jpg', bytes(range(200)))
+        self.media_file('.media_manifest.json', b'{}')
+        self.media_file('comedor/menu.pdf.part', b'%PDF')
+        self.middleware = MediaWSGIMiddleware(self.application, media_root=self.media_root, media_url='/media/')
+
+    @staticmethod
+    def application(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'django']
+
+    def call(self, path, method='GET', **environ):
+        """(estado, cabeceras, cuerpo) de la petición"""
+        respuesta = {}
+
+        def start_response(status, headers):
+            respuesta['status'] = status
+            respuesta['headers'] = dict(headers)
+
+        environ = {'PATH_INFO': path, 'REQUEST_METHOD': method, 'QUERY_STRING': '', **environ}
+        iterable = self.middleware(environ, start_response)
+        try:
+            body = b''.join(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+        return respuesta['status'], respuesta['headers'], body
+
+    def test_serves_file_and_passes_other_paths(self):
+        status, headers, body = self.call('/media/noticias/foto.jpg')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Type'], 'image/jpeg')
+        self.assertEqual(headers['Content-Length'], '200')
+        self.assertEqual(body, bytes(range(200)))
+        self.assertEqual(self.call('/es/noticias/')[2], b'django')
+
+    def test_rejects_traversal_hidden_and_temporary_files(self):
+        for path in ('/media/../etc/passwd', '/media/noticias/../../secreto', '/media/.media_manifest.json',
+                     '/media/comedor/menu.pdf.part', '/media/noticias//foto.jpg', '/media/noticias/\x00.jpg',
+                     '/media/noticias/no-existe.jpg', '/media/noticias'):
+            self.assertEqual(self.call(path)[0], '404 Not Found', path)
+
+    def test_method_not_allowed(self):
+        status, headers, _ = self.call('/media/noticias/foto.jpg', method='POST')
+        self.assertEqual(status, '405 Method Not Allowed')
+        self.assertEqual(headers['Allow'], 'GET, HEAD')
+
+    def test_conditional_requests(self):
+        _, headers, _ = self.call('/media/noticias/foto.jpg')
+        status, cabeceras, body = self.call('/media/noticias/foto.jpg', HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(cabeceras['ETag'], headers['ETag'])
+        self.assertEqual(body, b'')
+
+        status = self.call('/media/noticias/foto.jpg', HTTP_IF_MODIFIED_SINCE=headers['Last-Modified'])[0]
+        self.assertEqual(status, '304 Not Modified')
+
+    def test_precompressed_variants(self):
+        self.media_file('noticias/estilo.css.gz', b'gzip')
+        self.media_file('noticias/estilo.css.br', b'brotli')
+
+        status, headers, body = self.call('/media/noticias/estilo.css', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual((headers['Content-Encoding'], body), ('br', b'brotli'))
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(headers['Content-Type'], 'text/css')
+
+        headers, body = self.call('/media/noticias/estilo.css', HTTP_ACCEPT_ENCODING='gzip, br;q=0')[1:]
+        self.assertEqual((headers['Content-Encoding'], body), ('gzip', b'gzip'))
+
+        headers, body = self.call('/media/noticias/estilo.css')[1:]
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(body, self.css)
+
+    def test_stale_variant_is_ignored(self):
+        variante = self.media_file('noticias/estilo.css.gz', b'gzip')
+        mtime = os.stat(self.ruta_css).st_mtime
+        os.utime(variante, (mtime - 60, mtime - 60))
+
+        headers, body = self.call('/media/noticias/estilo.css', HTTP_ACCEPT_ENCODING='gzip')[1:]
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertNotIn('Vary', headers)
+        self.assertEqual(body, self.css)
+
+    def test_single_range(self):
+        status, headers, body = self.call('/media/noticias/foto.jpg', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(headers['Content-Range'], 'bytes 10-19/200')
+        self.assertEqual(headers['Content-Length'], '10')
+        self.assertEqual(body, bytes(range(10, 20)))
+
+        self.assertEqual(self.call('/media/noticias/foto.jpg', HTTP_RANGE='bytes=500-')[0], '416 Range Not Satisfiable')
+        # Varios rangos: el archivo completo
+        status, _, body = self.call('/media/noticias/foto.jpg', HTTP_RANGE='bytes=0-1,50-51')
+        self.assertEqual((status, body), ('200 OK', bytes(range(200))))
+
+    def test_versioned_urls_are_immutable(self):
+        headers = self.call('/media/noticias/foto.jpg', QUERY_STRING='v=3')[1]
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        headers = self.call('/media/noticias/foto.jpg', QUERY_STRING='w=800')[1]
+        self.assertEqual(headers['Cache-Control'], f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}')
+
+    def test_offload_to_proxy(self):
+        with self.settings(MEDIA_OFFLOAD='nginx', MEDIA_OFFLOAD_PREFIX='/protected-media/'):
+            status, headers, body = self.call('/media/noticias/foto.jpg', QUERY_STRING='v=3')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['X-Accel-Redirect'], '/protected-media/noticias/foto.jpg')
+        self.assertEqual(headers['Content-Length'], '0')
+        self.assertEqual(headers['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(body, b'')
+
+        with self.settings(MEDIA_OFFLOAD='apache'):
+            status, headers, body = self.call('/media/noticias/foto.jpg')
+        self.assertEqual(headers['X-Sendfile'], os.path.join(os.path.realpath(self.media_root), 'noticias', 'foto.jpg'))
+        self.assertEqual((headers['Content-Length'], body), ('0', b''))
+
+        # Las rutas que no se pueden servir siguen dando 404 sin pasar al proxy
+        with self.settings(MEDIA_OFFLOAD='nginx'):
+            status, headers, _ = self.call('/media/comedor/menu.pdf.part')
+        self.assertEqual(status, '404 Not Found')
+        self.assertNotIn('X-Accel-Redirect', headers)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchTests(TestCase):
+    """Búsqueda de texto completo: índice mantenido por señales y consultas seguras"""
+
+    def setUp(self):
+        self.noticia = Noticia.objects.create(
+            titulo='Talleres de verano', titulo_eu='Udako tailerrak',
+            resumen='Inscripción abierta', resumen_eu='Izen ematea zabalik',
+            contenido='Los talleres empiezan en julio.', contenido_eu='Tailerrak uztailean hasiko dira.',
+            slug='talleres-verano',
+        )
+        self.consejo = ConsejoEducativo.objects.create(
+            titulo='Hábitos de estudio', descripcion='Consejos para casa',
+            contenido_html='<p>Organizar el <b>horario</b> de lectura</p>', slug='habitos-estudio',
+        )
+        self.actividad = Actividad.objects.create(
+            fecha=date(2026, 11, 5), titulo='Reunión de familias', hora_comienzo=time(18),
+            descripcion='Sala de usos múltiples', tipo_actividad='reunion',
+        )
+
+    def tipos(self, consulta, idioma='es'):
+        return [(resultado['tipo'], resultado['id']) for resultado in search(consulta, idioma)]
+
+    def test_accentless_prefix_search(self):
+        self.assertEqual(self.tipos('taller'), [('noticia', self.noticia.id)])
+        self.assertEqual(self.tipos('habitos'), [('consejo', self.consejo.id)])
+        self.assertEqual(self.tipos('HORARIO lect'), [('consejo', self.consejo.id)])
+        self.assertEqual(self.tipos('reunion familia'), [('actividad', self.actividad.id)])
+        # En euskera: los textos en euskera y las actividades (sin idioma)
+        self.assertEqual(self.tipos('tailer', 'eu'), [('noticia', self.noticia.id)])
+        self.assertEqual(self.tipos('reunion', 'eu'), [('actividad', self.actividad.id)])
+        self.assertEqual(self.tipos('julio', 'eu'), [])
+
+        resultado = search('verano', 'es')[0]
+        self.assertEqual(resultado['titulo'], 'Talleres de verano')
+        self.assertIn('Los talleres empiezan', resultado['fragmento'])
+
+    def test_index_follows_changes(self):
+        self.noticia.publicada = False
+        self.noticia.save()
+        self.assertEqual(self.tipos('taller'), [])
+
+        self.consejo.titulo = 'Rutinas de sueño'
+        self.consejo.save()
+        self.assertEqual(self.tipos('habitos'), [])
+        self.assertEqual(self.tipos('rutinas'), [('consejo', self.consejo.id)])
+
+        self.actividad.delete()
+        self.assertEqual(self.tipos('reunion'), [])
+
+    def test_scheduled_noticia_hidden_until_published(self):
+        publicacion = timezone.now() + timedelta(hours=1)
+        programada = Noticia.objects.create(
+            titulo='Fiesta de fin de curso', titulo_eu='Ikasturte amaierako jaia',
+            resumen='Programa', resumen_eu='Egitaraua', contenido='Juegos', contenido_eu='Jolasak',
+            slug='fiesta-fin-curso', fecha_publicacion=publicacion,
+        )
+        self.assertEqual(self.tipos('fiesta'), [])
+
+        with mock.patch('django.utils.timezone.now', return_value=publicacion + timedelta(seconds=1)):
+            self.assertEqual(self.tipos('fiesta'), [('noticia', programada.id)])
+
+    def test_hostile_input(self):
+        for consulta in ('"', 'NEAR(', '*', '"taller', 'taller"*', 'taller OR', 'titulo:taller', "'; DROP", '-', ''):
+            self.assertIsInstance(search(consulta, 'es'), list, consulta)
+        for consulta in ('"', 'NEAR(', '*', '(', '^', '   '):
+            self.assertEqual(search(consulta, 'es'), [], consulta)
+        self.assertEqual(self.tipos('"taller'), [('noticia', self.noticia.id)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NoticiasListadoTests(TestCase):
+    """Lista de noticias y API por cursor: orden estable, sin duplicados ni noticias programadas"""
+
+    def setUp(self):
+        cache.clear()
+        Noticia.objects.all().delete()
+        ahora = timezone.now()
+        self.noticias = []
+        for numero in range(1, 15):
+            # Varias con la misma fecha: el id desempata
+            self.noticias.append(self.noticia(
+                f'Noticia {numero}', ahora - timedelta(days=numero // 3), destacada=numero in (5, 12),
+            ))
+        self.programada = self.noticia('Noticia programada', ahora + timedelta(days=1))
+        self.borrador = self.noticia('Noticia en borrador', ahora - timedelta(days=1), publicada=False)
+
+    def noticia(self, titulo, fecha, **datos):
+        return Noticia.objects.create(
+            titulo=titulo, titulo_eu=f'{titulo} eu', resumen='Resumen', resumen_eu='Laburpena',
+            contenido='Contenido', contenido_eu='Edukia', slug=f'noticia-{Noticia.objects.count()}',
+            fecha_publicacion=fecha, **datos,
+        )
+
+    def api(self, idioma='es', **params):
+        with translation.override(idioma):
+            return self.client.get(reverse('noticias_api'), params)
+
+    def test_cursor_pages(self):
+        esperadas = sorted(
+            self.noticias, key=lambda n: (n.destacada, n.fecha_publicacion, n.id), reverse=True,
+        )
+        recibidas = []
+        cursor = None
+        paginas = 0
+        while True:
+            datos = self.api('eu', **({'cursor': cursor} if cursor else {})).json()
+            self.assertLessEqual(len(datos['noticias']), 6)
+            recibidas += datos['noticias']
+            paginas += 1
+            cursor = datos['siguiente']
+            if not cursor:
+                break
+
+        self.assertEqual(paginas, 3)
+        self.assertEqual([n['id'] for n in recibidas], [n.id for n in esperadas])
+        self.assertEqual([n['destacada'] for n in recibidas[:3]], [True, True, False])
+        self.assertEqual(recibidas[0]['titulo'], f'{esperadas[0].titulo} eu')
+        self.assertEqual(recibidas[0]['resumen'], 'Laburpena')
+        self.assertNotIn('contenido', recibidas[0])
+
+    def test_invalid_cursor(self):
+        for cursor in ('no-es-un-cursor', '!!!', 'MXwyMDMxfDE'):
+            respuesta = self.api(cursor=cursor)
+            self.assertEqual(respuesta.status_code, 400, cursor)
+            self.assertEqual(respuesta.json(), {'error': 'Cursor no válido'})
+
+    def test_list_excludes_scheduled_and_drafts(self):
+        with translation.override('es'):
+            respuesta = self.client.get(reverse('noticias_lista'), {'page': 3})
+        self.assertEqual(respuesta.status_code, 200)
+        contenido = respuesta.content.decode('utf-8')
+        self.assertNotIn('Noticia programada', contenido)
+        self.assertNotIn('Noticia en borrador', contenido)
+        self.assertEqual(respuesta.context['total_noticias'], 14)
+        self.assertEqual(len(respuesta.context['page_obj']), 2)
+
+        titulos = [n['titulo'] for n in self.api().json()['noticias']]
+        self.assertNotIn('Noticia programada', titulos)
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NoticiaPublicaTests(TestCase):
+    """Detalle público de una noticia: solo publicadas, con ETag por idioma y versión"""
+
+    def setUp(self):
+        cache.clear()
+        self.noticia = Noticia.objects.create(
+            titulo='Fiesta de fin de curso', titulo_eu='Ikasturte amaierako jaia',
+            resumen='En el patio', resumen_eu='Patioan', contenido='Habrá chocolate.', contenido_eu='Txokolatea egongo da.',
+            slug='fiesta-fin-curso', fecha_publicacion=timezone.now() - timedelta(days=1),
+        )
+
+    def get(self, noticia_id, idioma='es', **kwargs):
+        with translation.override(idioma):
+            return self.client.get(reverse('obtener_noticia_publica', args=[noticia_id]), **kwargs)
+
+    def test_etag_revalidation(self):
+        respuesta = self.get(self.noticia.id)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['noticia']['titulo'], 'Fiesta de fin de curso')
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        etag = respuesta['ETag']
+
+        revalidada = self.get(self.noticia.id, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertEqual(revalidada.content, b'')
+
+        # Cada idioma tiene su ETag
+        respuesta = self.get(self.noticia.id, 'eu', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['noticia']['contenido'], 'Txokolatea egongo da.')
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+        # Al editarla cambia la versión y se sirve el contenido nuevo
+        self.noticia.titulo = 'Fiesta de fin de curso (aplazada)'
+        self.noticia.save()
+        respuesta = self.get(self.noticia.id, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['noticia']['titulo'], 'Fiesta de fin de curso (aplazada)')
+
+    def test_only_published_news(self):
+        programada = Noticia.objects.create(
+            titulo='Próxima excursión', resumen='Resumen', contenido='Contenido', slug='proxima-excursion',
+            fecha_publicacion=timezone.now() + timedelta(days=1),
+        )
+        borrador = Noticia.objects.create(
+            titulo='Borrador', resumen='Resumen', contenido='Contenido', slug='borrador', publicada=False,
+        )
+        for noticia_id in (programada.id, borrador.id, borrador.id + 1000):
+            respuesta = self.get(noticia_id)
+            self.assertEqual(respuesta.status_code, 404)
+            self.assertFalse(respuesta.json()['success'])
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PayloadsTests(TestCase):
+    """Detalles de noticias y actividades preparados al guardar, por idioma"""
+
+    def setUp(self):
+        cache.clear()
+        self.actividad = Actividad.objects.create(
+            fecha=date(2031, 3, 10), titulo='Asamblea', descripcion='Gimnasio',
+            hora_comienzo=time(17), hora_finalizacion=time(18, 30), tipo_actividad='reunion',
+        )
+        self.client.force_login(User.objects.create_user('familia'))
+
+    def detalle(self, idioma='es'):
+        with translation.override(idioma):
+            return self.client.get(reverse('detalle_actividad', args=[self.actividad.id])).json()
+
+    def test_stored_on_save_for_every_language(self):
+        for idioma, _nombre in settings.LANGUAGES:
+            datos = cache.get(payloads.actividad_key(self.actividad.id, self.actividad.fecha_actualizacion, idioma))
+            self.assertEqual(datos['titulo'], 'Asamblea')
+            self.assertNotIn('es_hoy', datos)
+
+        noticia = Noticia.objects.create(
+            titulo='Fiesta', titulo_eu='Jaia', resumen='Patio', resumen_eu='Patioa',
+            contenido='Chocolate', contenido_eu='Txokolatea', slug='fiesta',
+        )
+        guardada = cache.get(payloads.noticia_key(noticia.id, noticia.fecha_modificacion, 'eu'))
+        self.assertEqual(json.loads(guardada)['noticia']['titulo'], 'Jaia')
+
+    def test_view_serves_stored_payload(self):
+        clave = payloads.actividad_key(self.actividad.id, self.actividad.fecha_actualizacion, 'es')
+        cache.set(clave, {**cache.get(clave), 'titulo': 'Guardada'})
+
+        respuesta = self.detalle()
+        self.assertTrue(respuesta['success'])
+        self.assertFalse(respuesta['is_staff'])
+        self.assertEqual(respuesta['actividad']['titulo'], 'Guardada')
+        self.assertEqual(respuesta['actividad']['hora_completa'], self.actividad.get_hora_completa())
+
+        # Sin la entrada (caché vaciada) se genera y se guarda
+        cache.clear()
+        self.assertEqual(self.detalle()['actividad']['titulo'], 'Asamblea')
+        self.assertIsNotNone(cache.get(clave))
+
+        # Al guardar cambia la versión
+        self.actividad.titulo = 'Asamblea general'
+        self.actividad.save()
+        self.assertEqual(self.detalle()['actividad']['titulo'], 'Asamblea general')
+
+        self.actividad.activa = False
+        self.actividad.save()
+        self.assertFalse(self.detalle()['success'])
+
+    def test_day_flags_follow_today(self):
+        for hoy, es_hoy, es_pasada in (
+            (date(2031, 3, 9), False, False),
+            (date(2031, 3, 10), True, False),
+            (date(2031, 3, 11), False, True),
+        ):
+            with mock.patch.object(payloads.timezone, 'localdate', return_value=hoy):
+                actividad = self.detalle()['actividad']
+            self.assertEqual((actividad['es_hoy'], actividad['es_pasada']), (es_hoy, es_pasada), hoy)
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ActividadSerieTests(TestCase):
+    """Editar o borrar una fecha de una serie, o la serie entera con sus fechas modificadas"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('junta', is_staff=True))
+        hoy = timezone.localdate()
+        self.serie = Actividad.objects.create(
+            fecha=hoy, titulo='Ensayo del coro', descripcion='Sala de música', hora_comienzo=time(18),
+            tipo_actividad='taller',
+            recurrencia='semanal', intervalo=1, recurrencia_hasta=hoy + timedelta(weeks=8),
+        )
+        self.fecha = hoy + timedelta(weeks=2)
+
+    def post(self, nombre, actividad_id, **datos):
+        with translation.override('es'):
+            return self.client.post(reverse(nombre, args=[actividad_id]), datos)
+
+    def editar_fecha(self, fecha, titulo):
+        return self.post(
+            'actualizar_actividad', self.serie.id, solo_esta='1', ocurrencia=fecha.isoformat(),
+            fecha=fecha.isoformat(), titulo=titulo, descripcion='Sala de música', hora_comienzo='18:00',
+            tipo_actividad='taller', intervalo='1',
+        )
+
+    def feed(self):
+        with translation.override('es'):
+            return self.client.get(reverse('actividades_ical')).content.decode('utf-8')
+
+    def encontrados(self, consulta):
+        with translation.override('es'):
+            respuesta = self.client.get(reverse('buscar'), {'q': consulta})
+        return [resultado['id'] for resultado in respuesta.json()['resultados']]
+
+    def test_delete_series_removes_modified_dates(self):
+        self.assertTrue(self.editar_fecha(self.fecha, 'Ensayo especial').json()['success'])
+        modificada = self.serie.ocurrencias_modificadas.get()
+        self.assertEqual(self.encontrados('especial'), [modificada.id])
+        self.assertIn('Ensayo especial', self.feed())
+
+        self.assertTrue(self.post('eliminar_actividad', self.serie.id).json()['success'])
+        modificada.refresh_from_db()
+        self.assertFalse(modificada.activa)
+        self.assertEqual(self.encontrados('especial'), [])
+        self.assertEqual(self.encontrados('coro'), [])
+        self.assertNotIn('Ensayo', self.feed())
+
+    def test_modified_date_cannot_be_modified_again(self):
+        self.assertTrue(self.editar_fecha(self.fecha, 'Ensayo especial').json()['success'])
+
+        respuesta = self.editar_fecha(self.fecha, 'Ensayo general')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(respuesta.json()['success'])
+        respuesta = self.post('eliminar_actividad', self.serie.id, solo_esta='1', ocurrencia=self.fecha.isoformat())
+        self.assertEqual(respuesta.status_code, 400)
+
+        self.assertEqual(list(self.serie.ocurrencias_modificadas.values_list('titulo', flat=True)), ['Ensayo especial'])
+        self.serie.refresh_from_db()
+        self.assertEqual(self.serie.excepciones, [])
+
+    def test_deleted_date_cannot_be_modified(self):
+        respuesta = self.post('eliminar_actividad', self.serie.id, solo_esta='1', ocurrencia=self.fecha.isoformat())
+        self.assertTrue(respuesta.json()['success'])
+
+        respuesta = self.editar_fecha(self.fecha, 'Ensayo especial')
+        self.assertEqual(respuesta.status_code, 400)
+        respuesta = self.post('eliminar_actividad', self.serie.id, solo_esta='1', ocurrencia=self.fecha.isoformat())
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(self.serie.ocurrencias_modificadas.exists())
+
+        # Una fecha que no es de la serie
+        respuesta = self.editar_fecha(self.fecha + timedelta(days=1), 'Ensayo especial')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ActividadesCalendarTests(TestCase):
+    """Rejilla mensual de actividades cacheada por mes e idioma"""
+
+    def setUp(self):
+        cache.clear()
+        self.actividad = Actividad.objects.create(
+            fecha=date(2031, 3, 10), titulo='Asamblea', descripcion='Gimnasio',
+            hora_comienzo=time(17), tipo_actividad='reunion',
+        )
+
+    def month(self, idioma):
+        with translation.override(idioma):
+            return actividades_calendar.get_month(2031, 3)
+
+    def titulos(self, datos):
+        return [
+            (celda['dia'], actividad['titulo'])
+            for semana in datos['semanas'] for celda in semana for actividad in celda['actividades']
+        ]
+
+    def test_month_is_cached_per_language(self):
+        with mock.patch.object(actividades_calendar, 'build_month', wraps=actividades_calendar.build_month) as build:
+            datos = self.month('es')
+            self.assertEqual(self.titulos(datos), [(10, 'Asamblea')])
+            self.assertEqual(list(json.loads(datos['actividades_json'])), ['2031,3,10'])
+            # Marzo de 2031 empieza en sábado: la primera semana tiene 5 celdas fuera del mes
+            self.assertEqual([celda['dia'] for celda in datos['semanas'][0]], [0, 0, 0, 0, 0, 1, 2])
+
+            self.assertEqual(self.month('es'), datos)
+            self.assertEqual(build.call_count, 1)
+            # Cada idioma tiene su entrada (los textos traducidos van dentro)
+            self.assertEqual(self.titulos(self.month('eu')), [(10, 'Asamblea')])
+            self.assertEqual(build.call_count, 2)
+
+    def test_saving_an_activity_invalidates_every_month(self):
+        self.month('es')
+        with mock.patch.object(actividades_calendar, 'build_month', wraps=actividades_calendar.build_month) as build:
+            self.actividad.titulo = 'Asamblea general'
+            self.actividad.save()
+            self.assertEqual(self.titulos(self.month('es')), [(10, 'Asamblea general')])
+
+            Actividad.objects.create(
+                fecha=date(2031, 3, 31), titulo='Excursión', descripcion='Monte', hora_comienzo=time(9),
+                tipo_actividad='taller',
+            )
+            self.assertEqual(self.titulos(self.month('es')), [(10, 'Asamblea general'), (31, 'Excursión')])
+
+            self.actividad.delete()
+            self.assertEqual(self.titulos(self.month('es')), [(31, 'Excursión')])
+            self.assertEqual(build.call_count, 3)
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ActividadesApiTests(TestCase):
+    """API de actividades por rango: validación del rango y revalidación con ETag"""
+
+    def setUp(self):
+        self.actividad = Actividad.objects.create(
+            fecha=date(2031, 3, 10), titulo='Asamblea', descripcion='Gimnasio',
+            hora_comienzo=time(17), tipo_actividad='reunion',
+        )
+
+    def get(self, **kwargs):
+        with translation.override('es'):
+            return self.client.get(reverse('actividades_api'), kwargs.pop('params', {}), **kwargs)
+
+    def test_range_and_revalidation(self):
+        params = {'desde': '2031-03-01', 'hasta': '2031-03-31'}
+        respuesta = self.get(params=params)
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual((datos['desde'], datos['hasta']), ('2031-03-01', '2031-03-31'))
+        self.assertEqual([(a['titulo'], a['fecha_iso'], a['es_pasada']) for a in datos['actividades']], [
+            ('Asamblea', '2031-03-10', False),
+        ])
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        self.assertIn('public', respuesta['Cache-Control'])
+        etag = respuesta['ETag']
+
+        revalidada = self.get(params=params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertEqual(revalidada['ETag'], etag)
+
+        # Otro rango u otro día tienen otro ETag
+        self.assertNotEqual(self.get(params={'desde': '2031-03-01', 'hasta': '2031-03-30'})['ETag'], etag)
+        with mock.patch.object(actividades_calendar.timezone, 'localdate', return_value=date(2031, 3, 10)):
+            self.assertEqual(self.get(params=params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Al desactivar la actividad cambia el ETag y desaparece de la respuesta
+        self.actividad.activa = False
+        self.actividad.save()
+        respuesta = self.get(params=params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['actividades'], [])
+
+    def test_invalid_ranges(self):
+        for params in (
+            {'desde': '2031-13-01'},
+            {'desde': '10/03/2031'},
+            {'desde': '2031-03-10', 'hasta': '2031-03-09'},
+            {'desde': '2031-01-01', 'hasta': '2032-01-02'},
+        ):
+            respuesta = self.get(params=params)
+            self.assertEqual(respuesta.status_code, 400, params)
+            self.assertIn('error', respuesta.json())
+
+        # Un año exacto sí vale
+        respuesta = self.get(params={'desde': '2031-01-01', 'hasta': '2032-01-01'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()['actividades']), 1)
+
+        # Sin parámetros, el mes actual
+        hoy = timezone.localdate()
+        self.assertEqual(self.get().json()['desde'], hoy.replace(day=1).isoformat())
+        with translation.override('es'):
+            self.assertEqual(self.client.post(reverse('actividades_api')).status_code, 405)
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ActividadesIcalTests(TestCase):
+    """Feed iCalendar: escapes y líneas plegadas, series expandidas y 304"""
+
+    def setUp(self):
+        cache.clear()
+        self.fecha = timezone.localdate() + timedelta(days=10)
+        self.actividad = Actividad.objects.create(
+            fecha=self.fecha, titulo='Asamblea; curso 2031, otoño', descripcion='Orden del día:\n1. Cuentas',
+            hora_comienzo=time(17), hora_finalizacion=time(18, 30), tipo_actividad='reunion',
+        )
+
+    def feed(self, **kwargs):
+        with translation.override('es'):
+            return self.client.get(reverse('actividades_ical'), kwargs.pop('params', {}), **kwargs)
+
+    def lines(self, respuesta):
+        """Líneas del feed ya desplegadas"""
+        texto = respuesta.content.decode('utf-8')
+        self.assertTrue(texto.endswith('\r\n'))
+        return texto.replace('\r\n ', '').split('\r\n')
+
+    def test_escape_and_fold(self):
+        self.assertEqual(actividades_ical.escape_text('a\\b;c,d\r\ne\nf'), 'a\\\\b\\;c\\,d\\ne\\nf')
+
+        self.assertEqual(actividades_ical.fold_line('SUMMARY:corto'), 'SUMMARY:corto')
+        linea = 'DESCRIPTION:' + 'ñandú ' * 40
+        plegada = actividades_ical.fold_line(linea)
+        partes = plegada.split('\r\n ')
+        self.assertGreater(len(partes), 1)
+        # 75 octetos por línea contando el espacio inicial, sin partir caracteres
+        self.assertLessEqual(len(partes[0].encode('utf-8')), 75)
+        self.assertTrue(all(len(parte.encode('utf-8')) <= 74 for parte in partes[1:]))
+        self.assertEqual(''.join(partes), linea)
+
+    def test_feed(self):
+        serie = Actividad.objects.create(
+            fecha=self.fecha, titulo='Taller de cocina', descripcion='Cocina', hora_comienzo=time(10),
+            tipo_actividad='taller', recurrencia='semanal', intervalo=1, recurrencia_hasta=self.fecha + timedelta(weeks=2),
+        )
+        respuesta = self.feed()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/calendar; charset=utf-8')
+        lineas = self.lines(respuesta)
+        self.assertEqual((lineas[0], lineas[-2]), ('BEGIN:VCALENDAR', 'END:VCALENDAR'))
+
+        self.assertIn('SUMMARY:Asamblea\\; curso 2031\\, otoño', lineas)
+        self.assertIn('DESCRIPTION:Orden del día:\\n1. Cuentas', lineas)
+        inicio = datetime.combine(self.fecha, time(17), tzinfo=timezone.get_default_timezone())
+        self.assertIn(f'DTSTART:{actividades_ical.format_utc(inicio)}', lineas)
+        self.assertIn(f'DTEND:{actividades_ical.format_utc(inicio + timedelta(minutes=90))}', lineas)
+
+        # Una VEVENT por fecha de la serie, con UID estable por fecha
+        self.assertEqual([linea for linea in lineas if linea.startswith(f'UID:actividad-{serie.id}')], [
+            f'UID:actividad-{serie.id}-{self.fecha + timedelta(weeks=semana):%Y%m%d}@apyma-remontival'
+            for semana in range(3)
+        ])
+        self.assertIn(f'UID:actividad-{self.actividad.id}@apyma-remontival', lineas)
+
+        # Solo un tipo
+        lineas = self.lines(self.feed(params={'tipo': 'reunion'}))
+        self.assertEqual(sum(linea == 'BEGIN:VEVENT' for linea in lineas), 1)
+        self.assertEqual(self.feed(params={'tipo': 'fiesta-sorpresa'}).status_code, 400)
+
+    def test_conditional_requests(self):
+        respuesta = self.feed()
+        etag = respuesta['ETag']
+        self.assertEqual(self.feed(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.feed(HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+
+        self.actividad.titulo = 'Asamblea general'
+        self.actividad.save()
+        respuesta = self.feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertIn('SUMMARY:Asamblea general', self.lines(respuesta))
+
+        # Al borrar, el ETag cambia aunque Last-Modified no
+        etag = respuesta['ETag']
+        self.actividad.delete()
+        respuesta = self.feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('BEGIN:VEVENT', self.lines(respuesta))
+
+@override_settings(CACHES=LOCMEM_CACHES, MENU_IMAGENES_ANCHOS=[])
+class TaskQueueTests(TempMediaMixin, TestCase):
+    """Cola de tareas: reclamar sin duplicados, recuperar las atascadas y reintentar sin perder la subida"""
+
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = os.path.join(self.media_root, 'tareas')
+        ajustes = override_settings(TAREAS_UPLOAD_DIR=self.upload_dir)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def crear(self, tipo='publicar_menu', minutos=0, **campos):
+        t = TareaSegundoPlano.objects.create(tipo=tipo, **campos)
+        # fecha_creacion es auto_now_add: se ajusta después para fijar el orden
+        TareaSegundoPlano.objects.filter(pk=t.pk).update(fecha_creacion=timezone.now() - timedelta(minutes=minutos))
+        return t
+
+    def subida(self, textos):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        ruta = os.path.join(self.upload_dir, f'{len(os.listdir(self.upload_dir))}.pdf')
+        with open(ruta, 'wb') as f:
+            f.write(make_pdf(textos))
+        return ruta
+
+    def test_claims_oldest_pending_once(self):
+        nueva = self.crear(minutos=1)
+        antigua = self.crear(minutos=5)
+        self.crear(estado='completada', minutos=10)
+
+        primera = tasks.reclamar_siguiente()
+        self.assertEqual(primera.pk, antigua.pk)
+        self.assertEqual((primera.estado, primera.intentos), ('en_proceso', 1))
+        self.assertIsNotNone(primera.fecha_inicio)
+        self.assertEqual(tasks.reclamar_siguiente().pk, nueva.pk)
+        self.assertIsNone(tasks.reclamar_siguiente())
+
+    def test_claim_skips_task_taken_by_another_worker(self):
+        primera = self.crear(minutos=5)
+        segunda = self.crear(minutos=1)
+        filtrar = TareaSegundoPlano.objects.filter
+
+        def filtrar_con_carrera(*args, **kwargs):
+            if kwargs != {'estado': 'pendiente'}:
+                return filtrar(*args, **kwargs)
+            # Otro worker reclama la primera entre la lista de candidatas y el UPDATE
+            candidatas = list(filtrar(*args, **kwargs).order_by('fecha_creacion').values_list('pk', flat=True))
+            filtrar(pk=primera.pk).update(estado='en_proceso')
+            consulta = mock.MagicMock()
+            consulta.order_by.return_value.values_list.return_value.__getitem__.return_value = candidatas
+            return consulta
+
+        with mock.patch.object(TareaSegundoPlano.objects, 'filter', side_effect=filtrar_con_carrera):
+            reclamada = tasks.reclamar_siguiente()
+
+        self.assertEqual(reclamada.pk, segunda.pk)
+        primera.refresh_from_db()
+        self.assertEqual(primera.intentos, 0)
+
+    def test_recover_stuck_tasks(self):
+        hace_una_hora = timezone.now() - timedelta(minutes=tasks.MINUTOS_ATASCADA + 30)
+        reintento = self.crear(estado='en_proceso', intentos=1, fecha_inicio=hace_una_hora)
+        agotada = self.crear(estado='en_proceso', intentos=tasks.MAX_INTENTOS, fecha_inicio=hace_una_hora)
+        en_curso = self.crear(estado='en_proceso', intentos=1, fecha_inicio=timezone.now())
+
+        self.assertEqual(tasks.recuperar_atascadas(), (1, 1))
+        estados = dict(TareaSegundoPlano.objects.values_list('pk', 'estado'))
+        self.assertEqual(estados[reintento.pk], 'pendiente')
+        self.assertEqual(estados[agotada.pk], 'error')
+        self.assertEqual(estados[en_curso.pk], 'en_proceso')
+
+    def test_failed_split_keeps_upload_for_retry(self):
+        ruta = self.subida(['solo una'])
+        t = self.crear('separar_menu', estado='en_proceso', intentos=1,
+                       parametros={'ruta': ruta, 'anio': 2031, 'mes': 3})
+        tasks.ejecutar(t)
+        self.assertEqual(t.estado, 'error')
+        self.assertTrue(os.path.exists(ruta))
+
+        ruta = self.subida(['es', 'eu'])
+        t = self.crear('separar_menu', estado='en_proceso', intentos=1,
+                       parametros={'ruta': ruta, 'anio': 2031, 'mes': 3})
+        tasks.ejecutar(t)
+        self.assertEqual(t.estado, 'completada', t.mensaje)
+        self.assertFalse(os.path.exists(ruta))
+        self.assertEqual(MenuComedor.objects.filter(anio=2031, mes=3).count(), 2)
+
+    def test_publish_can_run_again(self):
+        ruta = self.subida(['menu'])
+        t = self.crear(estado='en_proceso', intentos=1,
+                       parametros={'ruta': ruta, 'anio': 2031, 'mes': 4, 'idioma': 'castellano'})
+        tasks.ejecutar(t)
+        self.assertEqual(t.estado, 'completada', t.mensaje)
+        self.assertFalse(os.path.exists(ruta))
+
+        # El worker murió después de mover el archivo: el reintento solo lo registra
+        MenuComedor.objects.all().delete()
+        tasks.ejecutar(t)
+        self.assertEqual(t.estado, 'completada', t.mensaje)
+        self.assertTrue(MenuComedor.objects.filter(anio=2031, mes=4, idioma='castellano').exists())
+
+
+class MenuSplitTests(TempMediaMixin, SimpleTestCase):
+    """Reparto de páginas por idioma y publicación de los PDFs cuando están todos preparados"""
+
+    def setUp(self):
+        super().setUp()
+        self.destino = os.path.join(self.media_root, 'comedor')
+
+    def textos(self, filename):
+        reader = PdfReader(os.path.join(self.destino, filename))
+        return [pagina.extract_text() for pagina in reader.pages]
+
+    def test_plan_pages(self):
+        self.assertEqual(plan_pages(2), {'castellano': [0], 'euskera': [1]})
+        self.assertEqual(plan_pages(3), {'castellano': [0], 'euskera': [1], 'adicional': [2]})
+        self.assertEqual(plan_pages(4), {'castellano': [0, 1], 'euskera': [2, 3]})
+        self.assertEqual(plan_pages(5), {'castellano': [0, 1], 'euskera': [2, 3], 'adicional': [4]})
+        self.assertEqual(plan_pages(3, ['castellano']), {'castellano': [0, 1, 2]})
+        for total in (0, 1):
+            with self.assertRaises(MenuSplitError):
+                plan_pages(total)
+
+    def test_split_publishes_every_language(self):
+        archivos = split_menu(make_pdf(['es1', 'es2', 'eu1', 'eu2', 'extra']), 2026, 1,
+                              destino=self.destino, registrar=False)
+        self.assertEqual(archivos, [
+            'menu_enero_2026_castellano.pdf', 'menu_enero_2026_euskera.pdf', 'menu_enero_2026_adicional.pdf',
+        ])
+        self.assertEqual(self.textos('menu_enero_2026_castellano.pdf'), ['es1', 'es2'])
+        self.assertEqual(self.textos('menu_enero_2026_euskera.pdf'), ['eu1', 'eu2'])
+        self.assertEqual(self.textos('menu_enero_2026_adicional.pdf'), ['extra'])
+        self.assertEqual(sorted(os.listdir(self.destino)), sorted(archivos))
+
+    def test_existing_menu_is_kept_without_overwrite(self):
+        split_menu(make_pdf(['es', 'eu']), 2026, 2, destino=self.destino, registrar=False)
+        with self.assertRaises(MenuSplitError):
+            split_menu(make_pdf(['nuevo es', 'nuevo eu']), 2026, 2, destino=self.destino,
+                       sobrescribir=False, registrar=False)
+        self.assertEqual(self.textos('menu_febrero_2026_castellano.pdf'), ['es'])
+
+        split_menu(make_pdf(['nuevo es', 'nuevo eu']), 2026, 2, destino=self.destino, registrar=False)
+        self.assertEqual(self.textos('menu_febrero_2026_euskera.pdf'), ['nuevo eu'])
+
+    def test_failure_publishes_nothing(self):
+        split_menu(make_pdf(['es', 'eu']), 2026, 3, destino=self.destino, registrar=False)
+
+        # Falla al preparar el segundo idioma: no se publica ninguno y no quedan temporales
+        with mock.patch('usuarios.menu_split.linearize_pdf', side_effect=[True, OSError('disco lleno')]):
+            with self.assertRaises(MenuSplitError):
+                split_menu(make_pdf(['nuevo es', 'nuevo eu']), 2026, 3, destino=self.destino, registrar=False)
+
+        self.assertEqual(self.textos('menu_marzo_2026_castellano.pdf'), ['es'])
+        self.assertEqual(self.textos('menu_marzo_2026_euskera.pdf'), ['eu'])
+        self.assertFalse([nombre for nombre in os.listdir(self.destino) if nombre.endswith(STAGING_SUFFIX)])
+
+    def test_failure_while_publishing(self):
+        split_menu(make_pdf(['es', 'eu']), 2026, 5, destino=self.destino, registrar=False)
+
+        # Falla el segundo renombrado: el primer idioma ya está publicado, el
+        # segundo sigue con la versión anterior y se borra su temporal
+        replace = os.replace
+        llamadas = []
+
+        def replace_falla(origen, final):
+            # (linearize_pdf también renombra, pero no los temporales de la separación)
+            if str(origen).endswith(STAGING_SUFFIX):
+                llamadas.append(final)
+                if len(llamadas) == 2:
+                    raise OSError('disco lleno')
+            replace(origen, final)
+
+        with mock.patch('usuarios.menu_split.os.replace', side_effect=replace_falla):
+            with self.assertRaises(MenuSplitError):
+                split_menu(make_pdf(['nuevo es', 'nuevo eu']), 2026, 5, destino=self.destino, registrar=False)
+
+        self.assertEqual(len(llamadas), 2)
+        self.assertEqual(self.textos('menu_mayo_2026_castellano.pdf'), ['nuevo es'])
+        self.assertEqual(self.textos('menu_mayo_2026_euskera.pdf'), ['eu'])
+        self.assertEqual(sorted(os.listdir(self.destino)), [
+            'menu_mayo_2026_castellano.pdf', 'menu_mayo_2026_euskera.pdf',
+        ])
+
+        # El siguiente intento publica los dos
+        split_menu(make_pdf(['nuevo es', 'nuevo eu']), 2026, 5, destino=self.destino, registrar=False)
+        self.assertEqual(self.textos('menu_mayo_2026_euskera.pdf'), ['nuevo eu'])
+
+    def test_invalid_pdf(self):
+        with self.assertRaises(MenuSplitError), self.assertLogs('pypdf', level='WARNING'):
+            split_menu(b'no es un PDF', 2026, 4, destino=self.destino, registrar=False)
+        self.assertFalse(os.path.exists(self.destino))
+
+
+def menu_row(*celdas):
+    """Una línea de la tabla del menú tal como la da la extracción "layout" (columnas de 26)"""
+    return ''.join(celda.center(26) for celda in celdas).rstrip()
+
+
+class MenuDaysParseTests(SimpleTestCase):
+    """Platos de cada día a partir del texto de los PDFs del comedor"""
+
+    def nombres(self, dia):
+        return [plato['nombre'] for plato in dia['platos']]
+
+    def test_find_columns(self):
+        lineas = ['MENÚ BASAL FEBRERO', menu_row('LUNES', 'MARTES', 'MIÉRCOLES', 'JUEVES', 'VIERNES')]
+        self.assertEqual(menu_days.find_columns(lineas), [12.5, 39.0, 64.5, 91.0, 116.5])
+        # Sin la cabecera completa no hay columnas
+        self.assertIsNone(menu_days.find_columns([menu_row('LUNES', 'MARTES', 'JUEVES', 'VIERNES')]))
+
+    def test_one_language_layout(self):
+        texto = '\n'.join([
+            'MENU BASALA OTSAILA',
+            menu_row('ASTELEHENA', 'ASTEARTEA', 'ASTEAZKENA', 'OSTEGUNA', 'OSTIRALA'),
+            menu_row('2', '3', '4', '5', '6'),
+            menu_row('DILISTAK15', 'PASTA1', 'ARROZA', 'BARAZKI', 'BABARRUNAK15'),
+            menu_row('GISATUAK', 'TOMATEAREKIN', '', 'KREMA', ''),
+            '',
+            menu_row('ARRAIN TXURIA2,4', 'OILASKOA', 'TORTILLA3', 'ARRAIN URDINA2,4', 'LOMOA'),
+            '',
+            menu_row('SAGARRA', 'JOGURTA7', 'UDAREA', 'LARANJA', 'MANDARINA'),
+            menu_row('Ogi integrala1', 'Ogi integrala1', 'Ogi integrala1', 'Ogi integrala1', 'Ogi integrala1'),
+            menu_row('750Kcal', '743Kcal', '810Kcal', '792Kcal', '812Kcal'),
+            'ALERGENOAK: 1.Glutena duten zerealak',
+        ])
+        dias = menu_days.parse_menu_text(texto, 2026, 2)
+
+        self.assertEqual([dia['fecha'] for dia in dias], [date(2026, 2, d) for d in range(2, 7)])
+        self.assertEqual(dias[0]['platos'], [
+            {'nombre': 'DILISTAK GISATUAK', 'alergenos': [15]},
+            {'nombre': 'ARRAIN TXURIA', 'alergenos': [2, 4]},
+            {'nombre': 'SAGARRA', 'alergenos': []},
+            {'nombre': 'Ogi integrala', 'alergenos': [1]},
+        ])
+        self.assertEqual(self.nombres(dias[1]), ['PASTA TOMATEAREKIN', 'OILASKOA', 'JOGURTA', 'Ogi integrala'])
+        self.assertEqual(dias[4]['energia'], '812Kcal')
+
+    def test_two_language_header_and_previous_month(self):
+        # Cabecera en castellano y euskera; la primera semana del menú de
+        # febrero empieza en enero
+        texto = '\n'.join([
+            menu_row('LUNES', 'MARTES', 'MIÉRCOLES', 'JUEVES', 'VIERNES'),
+            menu_row('ASTELEHENA', 'ASTEARTEA', 'ASTEAZKENA', 'OSTEGUNA', 'OSTIRALA'),
+            menu_row('26', '27', '28', '29', '30'),
+            menu_row('CREMA', 'PUERROS', 'PASTA1', 'SOPA', 'ALUBIAS15'),
+            '',
+            menu_row('NARANJA', 'PERA', 'MANZANA', 'YOGUR7', 'MANDARINA'),
+            menu_row('Pan Integral1', 'Pan Integral1', 'Pan Integral1', 'Pan Integral1', 'Pan Integral1'),
+            menu_row('2', '3', '4', '5', '6'),
+            menu_row('LENTEJAS15', 'ARROZ', 'ACELGAS', 'COLIFLOR', 'BERZA'),
+            menu_row('Pan Integral1', 'Pan Integral1', 'Pan Integral1', 'Pan Integral1', 'Pan Integral1'),
+        ])
+        dias = menu_days.parse_menu_text(texto, 2026, 2)
+
+        self.assertEqual(
+            [dia['fecha'] for dia in dias],
+            [date(2026, 1, d) for d in range(26, 31)] + [date(2026, 2, d) for d in range(2, 7)],
+        )
+        self.assertEqual(self.nombres(dias[0]), ['CREMA', 'NARANJA', 'Pan Integral'])
+        self.assertEqual(dias[5]['platos'][0], {'nombre': 'LENTEJAS', 'alergenos': [15]})
+
+    def test_holidays(self):
+        texto = '\n'.join([
+            menu_row('LUNES', 'MARTES', 'MIÉRCOLES', 'JUEVES', 'VIERNES'),
+            menu_row('5', '6', '7', '8', '9'),
+            menu_row('', '', '', 'ARROZ', 'LENTEJAS'),
+            # Superíndice de alérgenos separado de su palabra
+            menu_row('', '', '', '', '15'),
+            '',
+            menu_row('DÍA FESTIVO', 'DÍA FESTIVO', 'DÍA FESTIVO', 'PESCADO2,4', 'HAMBURGUESA'),
+            '',
+            menu_row('', '', '', 'MANZANA', 'MANDARINA'),
+            menu_row('', '', '', 'Pan Integral1', 'Pan Integral1'),
+        ])
+        dias = menu_days.parse_menu_text(texto, 2026, 1)
+
+        self.assertEqual([dia['fecha'] for dia in dias], [date(2026, 1, d) for d in range(5, 10)])
+        for dia in dias[:3]:
+            self.assertEqual(dia['platos'], [{'nombre': 'DÍA FESTIVO', 'alergenos': []}])
+        self.assertEqual(self.nombres(dias[3]), ['ARROZ', 'PESCADO', 'MANZANA', 'Pan Integral'])
+        self.assertEqual(dias[4]['platos'][0], {'nombre': 'LENTEJAS', 'alergenos': [15]})
+
+    def test_unparseable_text(self):
+        self.assertEqual(menu_days.parse_menu_text('', 2026, 1), [])
+        self.assertEqual(menu_days.parse_menu_text('Menú no disponible\n\n12 13 14', 2026, 1), [])
+        # Números que no son los días de la semana de su columna
+        texto = '\n'.join([
+            menu_row('LUNES', 'MARTES', 'MIÉRCOLES', 'JUEVES', 'VIERNES'),
+            menu_row('1', '2', '3', '4', '5'),
+            menu_row('LENTEJAS', 'ARROZ', 'PASTA', 'SOPA', 'CREMA'),
+        ])
+        self.assertEqual(menu_days.parse_menu_text(texto, 2026, 3), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StoreMenuDaysTests(TempMediaMixin, TestCase):
+    """Los días extraídos se guardan en MenuDia y sustituyen a los anteriores"""
+
+    def menu(self, mes):
+        return MenuComedor.objects.create(
+            anio=2031, mes=mes, idioma='castellano', archivo=f'menu_{mes}.pdf',
+            tamano=1, checksum='0' * 64, fecha_publicacion=timezone.now(),
+        )
+
+    def dia(self, fecha, plato):
+        return {'fecha': fecha, 'platos': [{'nombre': plato, 'alergenos': []}], 'energia': '750Kcal'}
+
+    def test_store_replaces_days(self):
+        enero, febrero = self.menu(1), self.menu(2)
+        with mock.patch.object(menu_days, 'extract_menu_days', return_value=[
+            self.dia(date(2031, 1, 29), 'SOPA'), self.dia(date(2031, 1, 30), 'CREMA'),
+        ]):
+            self.assertEqual(menu_days.store_menu_days(enero, 'enero.pdf'), 2)
+
+        # El menú de febrero trae el último viernes de enero
+        with mock.patch.object(menu_days, 'extract_menu_days', return_value=[
+            self.dia(date(2031, 1, 30), 'ALUBIAS'), self.dia(date(2031, 2, 2), 'LENTEJAS'),
+        ]):
+            self.assertEqual(menu_days.store_menu_days(febrero, 'febrero.pdf'), 2)
+
+        self.assertEqual(
+            list(MenuDia.objects.order_by('fecha').values_list('fecha', 'menu__mes', 'platos__0__nombre')),
+            [(date(2031, 1, 29), 1, 'SOPA'), (date(2031, 1, 30), 2, 'ALUBIAS'), (date(2031, 2, 2), 2, 'LENTEJAS')],
+        )
+
+        with mock.patch.object(menu_days, 'extract_menu_days', return_value=[]):
+            self.assertEqual(menu_days.store_menu_days(febrero, 'febrero.pdf'), 0)
+        self.assertEqual(list(MenuDia.objects.values_list('fecha', flat=True)), [date(2031, 1, 29)])
+
+    def test_extract_days_never_raises(self):
+        menu = self.menu(3)
+        sin_tabla = self.media_file('comedor/sin_tabla.pdf', make_pdf(['Menu no disponible']))
+        roto = self.media_file('comedor/roto.pdf', b'<html>no es un PDF</html>')
+
+        with mock.patch('builtins.print'):
+            self.assertEqual(menu_catalog.extract_days(menu, sin_tabla), 0)
+            with self.assertLogs('pypdf', level='WARNING'):
+                self.assertEqual(menu_catalog.extract_days(menu, roto), 0)
+            self.assertEqual(menu_catalog.extract_days(menu, os.path.join(self.media_root, 'no_existe.pdf')), 0)
+        self.assertFalse(menu.dias.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MENU_IMAGENES_ANCHOS=[640, 320], MEDIA_URL='/media/')
+class MenuImagesTests(TempMediaMixin, TestCase):
+    """Imágenes de las páginas de los menús a varios anchos"""
+
+    def setUp(self):
+        super().setUp()
+        self.pdf = self.media_file('comedor/menu_enero_2031_castellano.pdf', make_pdf(['uno', 'dos']))
+        self.paginas_dir = os.path.join(self.media_root, 'comedor', 'paginas')
+        self.destino = os.path.join(self.paginas_dir, 'menu_enero_2031_castellano')
+        print_patch = mock.patch('builtins.print')
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def fake_render_pages(self, pdf_path, width, dest_dir):
+        """Lo que haría pdftoppm: un PNG por página al ancho pedido"""
+        from PIL import Image
+
+        pngs = []
+        for numero in (1, 2):
+            png = os.path.join(dest_dir, f'pagina-{numero}.png')
+            Image.new('RGB', (width, width * 2)).save(png)
+            pngs.append(png)
+        return pngs
+
+    def render(self):
+        with mock.patch.object(menu_images, 'pdftoppm_available', return_value=True), \
+                mock.patch.object(menu_images, 'render_pages', side_effect=self.fake_render_pages) as render_pages:
+            paginas = menu_images.render_menu_images(self.pdf, 'menu_enero_2031_castellano.pdf')
+        return paginas, render_pages
+
+    def test_nothing_without_pdftoppm_or_widths(self):
+        with mock.patch.object(menu_images, 'pdftoppm_available', return_value=False):
+            self.assertEqual(menu_images.render_menu_images(self.pdf, 'menu_enero_2031_castellano.pdf'), [])
+        with self.settings(MENU_IMAGENES_ANCHOS=[]):
+            self.assertEqual(self.render()[0], [])
+        self.assertFalse(os.path.exists(self.paginas_dir))
+
+    def test_renders_each_width_and_replaces_old_images(self):
+        self.media_file('comedor/paginas/menu_enero_2031_castellano/3-640.webp', b'pagina antigua')
+        _, extension = menu_images.image_format()
+
+        paginas, render_pages = self.render()
+
+        # Se renderiza una vez, al ancho mayor
+        self.assertEqual(render_pages.call_args.args[1], 640)
+        relativo = 'comedor/paginas/menu_enero_2031_castellano'
+        self.assertEqual(paginas, [
+            {'ancho': 640, 'alto': 1280, 'imagenes': [
+                {'archivo': f'{relativo}/{numero}-320{extension}', 'ancho': 320},
+                {'archivo': f'{relativo}/{numero}-640{extension}', 'ancho': 640},
+            ]}
+            for numero in (1, 2)
+        ])
+        self.assertEqual(sorted(os.listdir(self.destino)), sorted(
+            f'{numero}-{ancho}{extension}' for numero in (1, 2) for ancho in (320, 640)
+        ))
+        self.assertEqual(os.listdir(self.paginas_dir), ['menu_enero_2031_castellano'])
+
+        fuentes = menu_images.page_sources(paginas, version='abc')
+        self.assertEqual(fuentes[0], {
+            'src': f'/media/{relativo}/1-640{extension}?v=abc',
+            'srcset': f'/media/{relativo}/1-320{extension}?v=abc 320w, /media/{relativo}/1-640{extension}?v=abc 640w',
+            'ancho': 640,
+            'alto': 1280,
+        })
+        self.assertEqual(menu_images.page_sources(None), [])
+
+        menu_images.remove_menu_images('menu_enero_2031_castellano.pdf')
+        self.assertFalse(os.path.exists(self.destino))
+
+    def test_failed_render_keeps_previous_images(self):
+        self.media_file('comedor/paginas/menu_enero_2031_castellano/1-640.webp', b'pagina anterior')
+        menu = MenuComedor.objects.create(
+            anio=2031, mes=1, idioma='castellano', archivo='menu_enero_2031_castellano.pdf',
+            paginas=[{'ancho': 640, 'alto': 1280, 'imagenes': []}],
+        )
+        fallo = subprocess.CalledProcessError(1, 'pdftoppm')
+
+        with mock.patch.object(menu_images, 'pdftoppm_available', return_value=True), \
+                mock.patch.object(menu_images, 'render_pages', side_effect=fallo):
+            with self.assertRaises(subprocess.CalledProcessError):
+                menu_images.render_menu_images(self.pdf, menu.archivo)
+            # El catálogo no falla: la página del comedor muestra el PDF
+            self.assertEqual(menu_catalog.render_images(menu, self.pdf), [])
+
+        self.assertEqual(MenuComedor.objects.get(pk=menu.pk).paginas, [])
+        self.assertEqual(os.listdir(self.paginas_dir), ['menu_enero_2031_castellano'])
+        self.assertEqual(os.listdir(self.destino), ['1-640.webp'])
+
+def script_module(nombre):
+    """Importa un módulo de scripts/ (como hacen los comandos de gestión)"""
+    scripts_path = os.path.join(settings.BASE_DIR, 'scripts')
+    if scripts_path not in sys.path:
+        sys.path.append(scripts_path)
+    return importlib.import_module(nombre)
+
+
+class LocalServerHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.app(self)
+
+    do_HEAD = do_GET
+
+    def send(self, status, body=b'', headers=(), length=None):
+        self.send_response(status)
+        for nombre, valor in headers:
+            self.send_header(nombre, valor)
+        self.send_header('Content-Length', str(len(body) if length is None else length))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServerMixin:
+    """Servidor HTTP en 127.0.0.1 y un puerto libre; `app(handler)` responde cada petición"""
+
+    def start_server(self, app):
+        servidor = ThreadingHTTPServer(('127.0.0.1', 0), LocalServerHandler)
+        servidor.daemon_threads = True
+        servidor.app = app
+        threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        return f'http://127.0.0.1:{servidor.server_port}'
+
+
+class MenuFetchTests(LocalServerMixin, SimpleTestCase):
+    """Sesión de los descargadores y descarga de PDFs reanudable"""
+
+    def setUp(self):
+        self.menu_fetch = script_module('menu_fetch')
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.destino = os.path.join(self.dir, 'menu.pdf')
+        self.pdf = make_pdf([f'MENU BASAL ENERO {semana}' for semana in range(1, 6)])
+        print_patch = mock.patch('builtins.print')
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def test_session_retries_with_backoff(self):
+        peticiones = []
+
+        def app(handler):
+            peticiones.append(handler.path)
+            if len(peticiones) < 3:
+                handler.send(503, b'ocupado')
+            else:
+                handler.send(200, b'ok')
+
+        base = self.start_server(app)
+        session = self.menu_fetch.build_session(retries=3, backoff_factor=0.01)
+        self.assertIsInstance(session, self.menu_fetch.HostLimitedSession)
+        self.assertEqual(session.get(f'{base}/menu').status_code, 200)
+        self.assertEqual(len(peticiones), 3)
+
+        # Sin reintentos queda la respuesta del servidor, sin excepción
+        peticiones.clear()
+        session = self.menu_fetch.build_session(retries=0)
+        self.assertEqual(session.get(f'{base}/menu').status_code, 503)
+
+    def test_session_limits_requests_per_host(self):
+        lock = threading.Lock()
+        en_vuelo = [0]
+        maximo = [0]
+
+        def app(handler):
+            with lock:
+                en_vuelo[0] += 1
+                maximo[0] = max(maximo[0], en_vuelo[0])
+            time_module.sleep(0.1)
+            with lock:
+                en_vuelo[0] -= 1
+            handler.send(200, b'ok')
+
+        base = self.start_server(app)
+        session = self.menu_fetch.build_session(max_per_host=2)
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            codigos = list(executor.map(lambda i: session.get(f'{base}/{i}').status_code, range(6)))
+        self.assertEqual(codigos, [200] * 6)
+        self.assertEqual(maximo[0], 2)
+
+    def range_app(self, peticiones, cortar_primera=False, admite_range=True):
+        """Sirve self.pdf con ETag; la primera respuesta puede cortarse a la mitad"""
+        def app(handler):
+            peticiones.append(dict(handler.headers))
+            mitad = len(self.pdf) // 2
+            rango = handler.headers.get('Range')
+            if rango and admite_range and handler.headers.get('If-Range') == '"v1"':
+                inicio = int(rango[len('bytes='):-1])
+                handler.send(206, self.pdf[inicio:], [
+                    ('ETag', '"v1"'), ('Content-Range', f'bytes {inicio}-{len(self.pdf) - 1}/{len(self.pdf)}'),
+                ])
+            elif cortar_primera and len(peticiones) == 1:
+                handler.send(200, self.pdf[:mitad], [('ETag', '"v1"')], length=len(self.pdf))
+            else:
+                handler.send(200, self.pdf, [('ETag', '"v1"')])
+        return app
+
+    def test_download_resumes_after_cut(self):
+        peticiones = []
+        base = self.start_server(self.range_app(peticiones, cortar_primera=True))
+
+        # Al cortarse la conexión se pierde el bloque a medio leer
+        with mock.patch.object(self.menu_fetch, 'DOWNLOAD_CHUNK_SIZE', 256):
+            resultado = self.menu_fetch.download_pdf(
+                self.menu_fetch.build_session(retries=0), f'{base}/menu.pdf', self.destino,
+            )
+
+        self.assertEqual(len(peticiones), 2)
+        self.assertEqual(peticiones[1]['Range'], f'bytes={len(self.pdf) // 2 // 256 * 256}-')
+        self.assertEqual(peticiones[1]['If-Range'], '"v1"')
+        with open(self.destino, 'rb') as f:
+            self.assertEqual(f.read(), self.pdf)
+        self.assertEqual(resultado.size, len(self.pdf))
+        self.assertEqual(resultado.sha256, hashlib.sha256(self.pdf).hexdigest())
+        self.assertEqual(sorted(os.listdir(self.dir)), ['menu.pdf'])
+
+    def test_download_resumes_previous_part(self):
+        base = self.start_server(self.range_app(peticiones := []))
+        url = f'{base}/menu.pdf'
+        with open(f'{self.destino}.part', 'wb') as f:
+            f.write(self.pdf[:100])
+        with open(f'{self.destino}.part.json', 'w') as f:
+            json.dump({'url': url, 'etag': '"v1"', 'last_modified': None}, f)
+
+        self.menu_fetch.download_pdf(self.menu_fetch.build_session(retries=0), url, self.destino)
+
+        self.assertEqual(len(peticiones), 1)
+        self.assertEqual(peticiones[0]['Range'], 'bytes=100-')
+        with open(self.destino, 'rb') as f:
+            self.assertEqual(f.read(), self.pdf)
+
+    def test_download_restarts_when_range_ignored(self):
+        # El servidor responde 200 con el archivo entero: el .part se sobrescribe
+        base = self.start_server(self.range_app(peticiones := [], admite_range=False))
+        url = f'{base}/menu.pdf'
+        with open(f'{self.destino}.part', 'wb') as f:
+            f.write(b'%PDF-otra version')
+        with open(f'{self.destino}.part.json', 'w') as f:
+            json.dump({'url': url, 'etag': '"v1"', 'last_modified': None}, f)
+
+        self.menu_fetch.download_pdf(self.menu_fetch.build_session(retries=0), url, self.destino)
+
+        self.assertIn('Range', peticiones[0])
+        with open(self.destino, 'rb') as f:
+            self.assertEqual(f.read(), self.pdf)
+        self.assertFalse(os.path.exists(f'{self.destino}.part'))
+    def test_download_ignores_part_of_other_url(self):
+        base = self.start_server(self.range_app(peticiones := []))
+        url = f'{base}/menu.pdf'
+        for estado in (
+            {'url': f'{base}/otro.pdf', 'etag': '"v1"', 'last_modified': None},
+            {'url': url, 'etag': None, 'last_modified': None},
+        ):
+            with open(f'{self.destino}.part', 'wb') as f:
+                f.write(self.pdf[:100])
+            with open(f'{self.destino}.part.json', 'w') as f:
+                json.dump(estado, f)
+
+            # Sin validadores de esta URL no se sabe si la parte es de la misma versión
+            self.menu_fetch.download_pdf(
+                self.menu_fetch.build_session(retries=0), url, self.destino, headers={'If-None-Match': '"v0"'},
+            )
+            self.assertNotIn('Range', peticiones[-1])
+            self.assertEqual(peticiones[-1]['If-None-Match'], '"v0"')
+            with open(self.destino, 'rb') as f:
+                self.assertEqual(f.read(), self.pdf)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['menu.pdf'])
+
+    def test_download_restarts_after_416(self):
+        def app(handler):
+            peticiones.append(dict(handler.headers))
+            if handler.headers.get('Range'):
+                handler.send(416, headers=[('Content-Range', f'bytes */{len(self.pdf)}')])
+            else:
+                handler.send(200, self.pdf, [('ETag', '"v1"')])
+
+        peticiones = []
+        url = f'{self.start_server(app)}/menu.pdf'
+        with open(f'{self.destino}.part', 'wb') as f:
+            f.write(self.pdf + b'basura')
+        with open(f'{self.destino}.part.json', 'w') as f:
+            json.dump({'url': url, 'etag': '"v1"', 'last_modified': None}, f)
+
+        resultado = self.menu_fetch.download_pdf(self.menu_fetch.build_session(retries=0), url, self.destino)
+
+        self.assertEqual([p.get('Range') for p in peticiones], [f'bytes={len(self.pdf) + 6}-', None])
+        self.assertEqual(resultado.sha256, hashlib.sha256(self.pdf).hexdigest())
+        self.assertEqual(sorted(os.listdir(self.dir)), ['menu.pdf'])
+
+        # Si todos los intentos fallan se avisa con DownloadError
+        with open(f'{self.destino}.part', 'wb') as f:
+            f.write(b'%PDF-')
+        with open(f'{self.destino}.part.json', 'w') as f:
+            json.dump({'url': url, 'etag': '"v1"', 'last_modified': None}, f)
+        with self.assertRaisesMessage(self.menu_fetch.DownloadError, 'Rango no satisfacible'):
+            self.menu_fetch.download_pdf(self.menu_fetch.build_session(retries=0), url, self.destino, attempts=1)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['menu.pdf'])
+
+    def test_download_rejects_html(self):
+        base = self.start_server(lambda handler: handler.send(200, b'<html>Acceso restringido</html>'))
+
+        with self.assertRaises(self.menu_fetch.DownloadError):
+            self.menu_fetch.download_pdf(self.menu_fetch.build_session(retries=0), f'{base}/menu.pdf', self.destino, attempts=2)
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_verify_pdf(self):
+        ruta = os.path.join(self.dir, 'descarga.pdf')
+        for contenido, esperado in (
+            (b'<!DOCTYPE html><html>Error</html>', 'no empieza por %PDF-'),
+            (self.pdf[:-10], '%%EOF'),
+        ):
+            with open(ruta, 'wb') as f:
+                f.write(contenido)
+            with self.assertRaisesMessage(self.menu_fetch.DownloadError, esperado):
+                self.menu_fetch.verify_pdf(ruta)
+
+        with open(ruta, 'wb') as f:
+            f.write(self.pdf)
+        with self.assertRaisesMessage(self.menu_fetch.DownloadError, 'Tamaño incorrecto'):
+            self.menu_fetch.verify_pdf(ruta, expected_size=len(self.pdf) + 1)
+        with self.assertRaisesMessage(self.menu_fetch.DownloadError, 'SHA-256'):
+            self.menu_fetch.verify_pdf(ruta, expected_sha256='0' * 64)
+        self.assertEqual(self.menu_fetch.verify_pdf(ruta), (hashlib.sha256(self.pdf).hexdigest(), len(self.pdf)))
+
+
+class MenuProbingTests(LocalServerMixin, SimpleTestCase):
+    """Sondeo de URLs candidatas: prioridad, historial y 404 recordados"""
+
+    existentes = {'/Archivos/ENERO-01.pdf', '/Archivos/BASAL-ENERO-15.pdf', '/Archivos/BASAL-FEBRERO-02.pdf'}
+
+    def setUp(self):
+        self.menu_probing = script_module('menu_probing')
+        self.peticiones = []
+
+        def app(handler):
+            self.peticiones.append(handler.path)
+            handler.send(200 if handler.path in self.existentes else 404)
+
+        self.base = self.start_server(app)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.historial = os.path.join(self.dir, 'historial.json')
+
+    def candidatas(self):
+        ProbeCandidate = self.menu_probing.ProbeCandidate
+        return [
+            ProbeCandidate(f'{self.base}/Archivos/{patron}{mes}-{dia:02d}.pdf', group=mes,
+                           pattern=patron, day=dia, year=2020, month=numero)
+            for mes, numero in (('ENERO', 1), ('FEBRERO', 2))
+            for dia in (1, 2, 15)
+            for patron in ('', 'BASAL-')
+        ]
+
+    def urls(self, resultado):
+        return [candidata.url[len(self.base):] for candidata in resultado]
+
+    def test_first_hit_per_group_in_priority_order(self):
+        prober = self.menu_probing.MenuUrlProber(max_workers=4)
+        self.assertEqual(self.urls(prober.probe(self.candidatas())), [
+            '/Archivos/ENERO-01.pdf', '/Archivos/BASAL-FEBRERO-02.pdf',
+        ])
+        self.assertEqual(self.urls(prober.probe(self.candidatas(), first_hit_only=False)), [
+            '/Archivos/ENERO-01.pdf', '/Archivos/BASAL-ENERO-15.pdf', '/Archivos/BASAL-FEBRERO-02.pdf',
+        ])
+
+    def test_history_orders_candidates_and_skips_misses(self):
+        history = self.menu_probing.ProbeHistory(self.historial)
+        history.hits = {'antiguo': {'pattern': 'BASAL-', 'day': 15, 'year': 2019, 'month': 12}}
+        prober = self.menu_probing.MenuUrlProber(max_workers=1, history=history)
+
+        # El patrón y el día que ya acertaron van primero en cada grupo
+        ordenadas = self.urls(history.sort(self.candidatas()))
+        self.assertEqual(ordenadas[:3], [
+            '/Archivos/BASAL-ENERO-15.pdf', '/Archivos/BASAL-ENERO-01.pdf', '/Archivos/BASAL-ENERO-02.pdf',
+        ])
+        self.assertEqual(ordenadas[6], '/Archivos/BASAL-FEBRERO-15.pdf')
+
+        self.assertEqual(self.urls(prober.probe(self.candidatas())), [
+            '/Archivos/BASAL-ENERO-15.pdf', '/Archivos/BASAL-FEBRERO-02.pdf',
+        ])
+        # Con un solo hilo, lo que va detrás del acierto no se pide
+        self.assertNotIn('/Archivos/ENERO-01.pdf', self.peticiones)
+
+        # Los 404 de fechas pasadas se guardan y la siguiente vez no se piden
+        guardado = self.menu_probing.ProbeHistory(self.historial)
+        self.assertIn(f'{self.base}/Archivos/BASAL-FEBRERO-15.pdf', guardado.misses)
+        self.assertIn(f'{self.base}/Archivos/BASAL-ENERO-15.pdf', guardado.hits)
+        self.peticiones.clear()
+        self.menu_probing.MenuUrlProber(max_workers=1, history=guardado).probe(self.candidatas())
+        self.assertNotIn('/Archivos/BASAL-FEBRERO-15.pdf', self.peticiones)
+        self.assertIn('/Archivos/BASAL-ENERO-15.pdf', self.peticiones)
+
+    def test_history_preferred_days(self):
+        history = self.menu_probing.ProbeHistory(self.historial)
+        self.assertEqual(history.preferred_days([1, 2, 3]), [1, 2, 3])
+
+        history.hits = {
+            'a': {'day': 15}, 'b': {'day': 15}, 'c': {'day': 2}, 'd': {'day': 31}, 'e': {'pattern': 'BASAL-'},
+        }
+        # Primero los días aprendidos (por aciertos), sin repetir y sin pasar de max_day
+        self.assertEqual(history.preferred_days([1, 2, 3], max_day=30), [15, 2, 1, 3])
+        self.assertEqual(history.preferred_days([1, 2, 3], limit=3), [15, 2, 31])
+
+    def test_history_misses_only_past_dates_and_expire(self):
+        ProbeCandidate = self.menu_probing.ProbeCandidate
+        history = self.menu_probing.ProbeHistory(self.historial)
+        hoy = date.today()
+        pasada = ProbeCandidate('pasada', year=2020, month=1, day=2)
+        history.record_miss(pasada)
+        history.record_miss(ProbeCandidate('hoy', year=hoy.year, month=hoy.month, day=hoy.day))
+        history.record_miss(ProbeCandidate('sin_fecha'))
+        history.record_miss(ProbeCandidate('invalida', year=2020, month=2, day=30))
+        self.assertEqual(list(history.misses), ['pasada'])
+        self.assertTrue(history.is_known_missing('pasada'))
+
+        # Un acierto posterior borra el 404
+        history.record_hit(pasada)
+        self.assertFalse(history.is_known_missing('pasada'))
+
+        caducada = datetime.now() - timedelta(days=history.NEGATIVE_TTL_DAYS + 1)
+        history.misses = {'caducada': caducada.isoformat(), 'reciente': datetime.now().isoformat()}
+        self.assertFalse(history.is_known_missing('caducada'))
+        history.save()
+        self.assertEqual(list(self.menu_probing.ProbeHistory(self.historial).misses), ['reciente'])
+
+class MenuSourceCacheTests(LocalServerMixin, SimpleTestCase):
+    """Peticiones condicionales de los PDFs de origen y salto de los no cambiados"""
+
+    def setUp(self):
+        self.menu_fetch = script_module('menu_fetch')
+        self.menu_sources = script_module('menu_sources')
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.media_dir = os.path.join(self.dir, 'comedor')
+        os.makedirs(self.media_dir)
+        self.cache_path = os.path.join(self.dir, 'fuentes.json')
+        self.pdf = make_pdf(['MENU BASAL ENERO'])
+        self.peticiones = []
+
+        def app(handler):
+            self.peticiones.append(dict(handler.headers))
+            if handler.headers.get('If-None-Match') == '"v1"':
+                handler.send(304, headers=[('ETag', '"v1"')])
+            else:
+                handler.send(200, self.pdf, [('ETag', '"v1"'), ('Last-Modified', 'Thu, 02 Jan 2031 08:00:00 GMT')])
+
+        self.url = f'{self.start_server(app)}/menu.pdf'
+        print_patch = mock.patch('builtins.print')
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def download(self, cache):
+        return self.menu_fetch.download_pdf(
+            self.menu_fetch.build_session(retries=0), self.url, os.path.join(self.dir, 'origen.pdf'),
+            headers=cache.conditional_headers(self.url),
+        )
+
+    def test_conditional_request_after_outputs_written(self):
+        cache = self.menu_sources.MenuSourceCache(self.cache_path, self.media_dir)
+        self.assertEqual(cache.conditional_headers(self.url), {})
+
+        resultado = self.download(cache)
+        self.assertFalse(resultado.not_modified)
+        self.assertNotIn('If-None-Match', self.peticiones[0])
+        salida = os.path.join(self.media_dir, 'menu_enero_2031_castellano.pdf')
+        shutil.copy(resultado.path, salida)
+        cache.record(self.url, resultado, sha256=resultado.sha256, outputs=['menu_enero_2031_castellano.pdf'])
+
+        # La siguiente ejecución lee la caché del disco y pregunta si ha cambiado
+        cache = self.menu_sources.MenuSourceCache(self.cache_path, self.media_dir)
+        self.assertEqual(cache.conditional_headers(self.url), {
+            'If-None-Match': '"v1"', 'If-Modified-Since': 'Thu, 02 Jan 2031 08:00:00 GMT',
+        })
+        self.assertTrue(cache.is_unchanged(self.url, hashlib.sha256(self.pdf).hexdigest()))
+        self.assertFalse(cache.is_unchanged(self.url, '0' * 64))
+        self.assertTrue(self.download(cache).not_modified)
+        self.assertEqual(self.peticiones[1]['If-None-Match'], '"v1"')
+
+        # Tras un 304 se conservan el hash y los archivos generados
+        cache.record(self.url, SimpleNamespace(headers={}))
+        self.assertTrue(cache.is_unchanged(self.url, resultado.sha256))
+
+        # Si falta un archivo generado se descarga el PDF completo
+        os.remove(salida)
+        self.assertEqual(cache.conditional_headers(self.url), {})
+        self.assertFalse(cache.is_unchanged(self.url, resultado.sha256))
+        self.assertFalse(self.download(cache).not_modified)
+        self.assertNotIn('If-None-Match', self.peticiones[2])
+
+class MenuFetchEngineTests(LocalServerMixin, SimpleTestCase):
+    """Estrategias de búsqueda de menús sobre la sesión compartida"""
+
+    listado = (
+        b'<html><body>'
+        b'<a href="20310105_120000_BASAL%20ENERO.pdf">BASAL ENERO</a>'
+        b'<a href="circular.pdf">Circular</a>'
+        b'<a href="MENU_FEBRERO.txt">Menu</a>'
+        b'<a href="/Users/Menus/Archivos/MENU%20REMONTIVAL.pdf">Menu</a>'
+        b'</body></html>'
+    )
+
+    def setUp(self):
+        self.menu_fetch = script_module('menu_fetch')
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.peticiones = []
+
+        def app(handler):
+            self.peticiones.append(handler.path)
+            if handler.path == '/Users/Menus/Archivos/':
+                handler.send(200, self.listado, [('Content-Type', 'text/html')])
+            elif handler.path == '/Users/Menus/Archivos/20200102_150000_BASAL%20ENERO.pdf':
+                handler.send(200)
+            else:
+                handler.send(404)
+
+        self.base = self.start_server(app)
+        print_patch = mock.patch('builtins.print')
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def engine(self, strategies):
+        return self.menu_fetch.MenuFetchEngine(
+            strategies, base_url=self.base, session=self.menu_fetch.build_session(retries=0),
+            history_path=os.path.join(self.dir, 'historial.json'), max_per_host=4,
+        )
+
+    def strategy(self, nombre, find):
+        strategy = self.menu_fetch.MenuFetchStrategy()
+        strategy.name = nombre
+        strategy.find = find
+        return strategy
+
+    def test_first_valid_strategy_wins_and_stops_the_rest(self):
+        avisada = threading.Event()
+
+        def lenta(engine):
+            # Sigue sondeando hasta que otra estrategia encuentra algo
+            if engine.stop_event.wait(5):
+                avisada.set()
+            return [{'url': 'lenta'}]
+
+        def rota(engine):
+            raise ValueError('página inesperada')
+
+        rapida = self.strategy('rapida', lambda engine: [{'url': 'a'}, {'url': 'b'}, {'url': 'a'}])
+        engine = self.engine([self.strategy('lenta', lenta), self.strategy('rota', rota), rapida])
+        self.assertEqual(engine.find_menus(), [{'url': 'a'}, {'url': 'b'}])
+        self.assertTrue(avisada.wait(1))
+
+        # Sin first_valid se juntan todas en el orden de las estrategias, sin duplicados
+        engine = self.engine([
+            self.strategy('otra', lambda engine: [{'url': 'b'}, {'url': 'c'}]), self.strategy('rota', rota), rapida,
+        ])
+        self.assertEqual([link['url'] for link in engine.find_menus(first_valid=False)], ['b', 'c', 'a'])
+        self.assertEqual(self.engine([self.strategy('rota', rota)]).find_menus(), [])
+
+    def test_directory_listing(self):
+        links = self.engine([self.menu_fetch.DirectoryListingStrategy()]).find_menus()
+        self.assertEqual(links, [
+            {
+                'url': f'{self.base}/Users/Menus/Archivos/20310105_120000_BASAL%20ENERO.pdf',
+                'text': 'Menu Enero 2031', 'source_page': 'directory_listing',
+            },
+            {
+                'url': f'{self.base}/Users/Menus/Archivos/MENU%20REMONTIVAL.pdf',
+                'text': 'Menu', 'source_page': 'directory_listing',
+            },
+        ])
+
+    def test_date_patterns(self):
+        engine = self.engine([])
+        strategy = self.menu_fetch.DatePatternStrategy(max_days=3)
+        links = strategy.search(engine, [(2020, 1)], datetime(2031, 1, 10), ['BASAL%20{month}'], ['120000', '150000'])
+
+        self.assertEqual(links, [{
+            'url': f'{self.base}/Users/Menus/Archivos/20200102_150000_BASAL%20ENERO.pdf',
+            'text': 'Menu Enero 2020', 'source_page': 'pattern_search',
+            'pattern': 'BASAL%20{month}', 'date': '2020-01-02', 'time': '150000',
+        }])
+        # Días típicos del mes (1, 2 y 3) con cada hora
+        self.assertLessEqual(set(self.peticiones), {
+            f'/Users/Menus/Archivos/202001{dia:02d}_{hora}_BASAL%20ENERO.pdf'
+            for dia in (1, 2, 3) for hora in ('120000', '150000')
+        })
+        self.assertIn('/Users/Menus/Archivos/20200101_120000_BASAL%20ENERO.pdf', self.peticiones)
+
+        # El día que acertó se prueba primero la próxima vez
+        self.assertEqual(engine.probe_history.preferred_days([1, 2, 3]), [2, 1, 3])
+
+class FakeSFTPClient:
+    """
+    Lo que usa MediaSyncer de paramiko.SFTPClient, sobre un directorio local
+    (`servidor['root']`). Anota en `servidor` los canales abiertos y las subidas.
+    """
+
+    def __init__(self, servidor):
+        self.servidor = servidor
+        self.hilos = set()
+        self.cerrado = False
+        servidor['canales'].append(self)
+
+    def local(self, path):
+        self.hilos.add(threading.get_ident())
+        return os.path.join(self.servidor['root'], path.lstrip('/'))
+
+    def stat(self, path):
+        return os.stat(self.local(path))
+
+    def mkdir(self, path):
+        os.mkdir(self.local(path))
+
+    def listdir_attr(self, path):
+        directorio = self.local(path)
+        return [
+            SimpleNamespace(filename=nombre, st_size=os.path.getsize(os.path.join(directorio, nombre)))
+            for nombre in os.listdir(directorio)
+        ]
+
+    def open(self, path, mode='r'):
+        if 'r' not in mode:
+            with self.servidor['lock']:
+                self.servidor['subidas'].append((path, self))
+            if self.servidor.get('barrera') and path.endswith('.part'):
+                self.servidor['barrera'].wait()
+        f = open(self.local(path), mode if 'b' in mode else mode + 'b')
+        f.set_pipelined = lambda pipelined: None
+        return f
+
+    def posix_rename(self, source, dest):
+        os.replace(self.local(source), self.local(dest))
+
+    def rename(self, source, dest):
+        os.rename(self.local(source), self.local(dest))
+
+    def remove(self, path):
+        os.remove(self.local(path))
+
+    def close(self):
+        self.cerrado = True
+
+
+class MediaSyncTests(SimpleTestCase):
+    """Sincronización de media/ por SFTP: solo lo que cambia, reanudable y por varios canales"""
+
+    def setUp(self):
+        with warnings.catch_warnings():
+            # paramiko avisa de cifrados obsoletos de cryptography al importarse
+            warnings.simplefilter('ignore')
+            self.media_sync = script_module('media_sync')
+        self.local_dir = tempfile.mkdtemp()
+        remoto = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.local_dir, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, remoto, ignore_errors=True)
+        self.servidor = {'root': remoto, 'canales': [], 'subidas': [], 'lock': threading.Lock()}
+        self.remote_root = os.path.join(remoto, 'home', 'apyma', 'media')
+
+        from_transport = mock.patch.object(
+            self.media_sync.paramiko.SFTPClient, 'from_transport',
+            side_effect=lambda transport: FakeSFTPClient(self.servidor),
+        )
+        from_transport.start()
+        self.addCleanup(from_transport.stop)
+        print_patch = mock.patch('builtins.print')
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+        self.write('comedor/menu_enero_2031_castellano.pdf', b'%PDF- menu' * 500)
+        self.write('documentos/estatutos.pdf', b'%PDF- estatutos')
+        self.write('noticias/foto.jpg', b'jpeg')
+        # Temporales y ocultos que no se suben
+        self.write('comedor/menu_febrero.pdf.part', b'%PDF- a medias')
+        self.write('.media_sync_cache.json', b'{}')
+        self.write('.cache/x', b'x')
+
+    def write(self, relative, contenido):
+        ruta = os.path.join(self.local_dir, *relative.split('/'))
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as f:
+            f.write(contenido)
+        return ruta
+
+    def manifest(self):
+        return self.media_sync.LocalManifest(self.local_dir, os.path.join(self.local_dir, '.media_sync_cache.json'))
+
+    def sync(self, manifest, workers=2, **kwargs):
+        syncer = self.media_sync.MediaSyncer(object(), self.local_dir, '/home/apyma/media', workers=workers)
+        try:
+            return syncer.sync(manifest, **kwargs)
+        finally:
+            syncer.close()
+
+    def remote(self, relative):
+        with open(os.path.join(self.remote_root, *relative.split('/')), 'rb') as f:
+            return f.read()
+
+    def test_local_manifest(self):
+        local = self.manifest()
+        manifest = local.build()
+        self.assertEqual(sorted(manifest), [
+            'comedor/menu_enero_2031_castellano.pdf', 'documentos/estatutos.pdf', 'noticias/foto.jpg',
+        ])
+        self.assertEqual(manifest['noticias/foto.jpg'], {'sha256': hashlib.sha256(b'jpeg').hexdigest(), 'size': 4})
+        self.assertEqual(list(local.build('documentos')), ['documentos/estatutos.pdf'])
+        local.save()
+
+        # Con la caché guardada solo se vuelve a calcular el hash de lo que cambia
+        ruta = self.write('noticias/foto.jpg', b'png!')
+        os.utime(ruta, (0, 0))
+        with mock.patch.object(self.media_sync, 'file_sha256', wraps=self.media_sync.file_sha256) as calculado:
+            manifest = self.manifest().build()
+        self.assertEqual([llamada.args[0] for llamada in calculado.call_args_list], [ruta])
+        self.assertEqual(manifest['noticias/foto.jpg']['sha256'], hashlib.sha256(b'png!').hexdigest())
+
+    def test_sync_uploads_only_changes(self):
+        manifest = self.manifest().build()
+        subidos, sin_cambios, errores = self.sync(manifest)
+        self.assertEqual(sorted(subidos), sorted(manifest))
+        self.assertEqual((sin_cambios, errores), (0, []))
+        self.assertEqual(self.remote('documentos/estatutos.pdf'), b'%PDF- estatutos')
+        self.assertEqual(json.loads(self.remote('.media_manifest.json')), manifest)
+        self.assertFalse(any(nombre.endswith('.part') for _, _, nombres in os.walk(self.remote_root) for nombre in nombres))
+
+        # Sin cambios no se sube nada (ni el manifiesto remoto)
+        self.servidor['subidas'].clear()
+        self.assertEqual(self.sync(self.manifest().build()), ([], 3, []))
+        self.assertEqual(self.servidor['subidas'], [])
+
+        # Contenido nuevo del mismo tamaño: se sube solo ese archivo
+        self.write('noticias/foto.jpg', b'png!')
+        manifest = self.manifest().build()
+        self.assertEqual(self.sync(manifest), (['noticias/foto.jpg'], 2, []))
+        self.assertEqual(self.remote('noticias/foto.jpg'), b'png!')
+        self.assertEqual(json.loads(self.remote('.media_manifest.json'))['noticias/foto.jpg'], manifest['noticias/foto.jpg'])
+
+        # Borrado o cambiado en el servidor aunque el manifiesto diga que está
+        os.remove(os.path.join(self.remote_root, 'documentos', 'estatutos.pdf'))
+        self.assertEqual(self.sync(manifest), (['documentos/estatutos.pdf'], 2, []))
+        self.assertEqual(len(self.sync(manifest, force=True)[0]), 3)
+
+    def test_upload_resumes_part(self):
+        manifest = self.manifest().build()
+        relative = 'comedor/menu_enero_2031_castellano.pdf'
+        entry = manifest[relative]
+        remoto = os.path.join(self.remote_root, 'comedor', 'menu_enero_2031_castellano.pdf')
+        os.makedirs(os.path.dirname(remoto))
+        with open(self.media_sync.part_path(remoto, entry['sha256']), 'wb') as f:
+            f.write((b'%PDF- menu' * 500)[:1234])
+
+        syncer = self.media_sync.MediaSyncer(object(), self.local_dir, '/home/apyma/media')
+        self.assertEqual(syncer.upload(relative, entry), (entry['size'] - 1234, 1234))
+        self.assertEqual(self.remote(relative), b'%PDF- menu' * 500)
+
+    def test_uploads_in_parallel_channels(self):
+        self.servidor['barrera'] = threading.Barrier(3, timeout=5)
+        manifest = self.manifest().build()
+
+        subidos, _, errores = self.sync(manifest, workers=3)
+
+        self.assertEqual((len(subidos), errores), (3, []))
+        # Las tres subidas a la vez (la barrera lo exige), cada una por el
+        # canal SFTP de su hilo, y todos los canales cerrados al final
+        canales = {canal for path, canal in self.servidor['subidas'] if path.endswith('.part')}
+        self.assertEqual(len(canales), 3)
+        self.assertTrue(all(len(canal.hilos) == 1 for canal in self.servidor['canales']))
+        self.assertTrue(all(canal.cerrado for canal in self.servidor['canales']))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MENU_IMAGENES_ANCHOS=[])
+class MenuCatalogTests(TempMediaMixin, TestCase):
+    """Catálogo de menús: se reconstruye desde media/comedor/ y el último mes va por año y mes"""
+
+    def setUp(self):
+        super().setUp()
+        MenuComedor.objects.all().delete()
+        print_patch = mock.patch('builtins.print')
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def menu(self, filename, texto, mtime):
+        ruta = self.media_file(f'comedor/{filename}', make_pdf([texto]))
+        os.utime(ruta, (mtime, mtime))
+        return ruta
+
+    def test_parse_menu_filename(self):
+        self.assertEqual(menu_catalog.parse_menu_filename('menu_enero_2031_castellano.pdf'), (2031, 1, 'castellano'))
+        self.assertEqual(menu_catalog.parse_menu_filename('MENU_Febrero_euskera.pdf'), (None, 2, 'euskera'))
+        for filename in ('menu_enero_2031_adicional.pdf', 'menu_brumario_2031_castellano.pdf',
+                         'menu_enero_2031_castellano.pdf.separando', 'notas.txt'):
+            self.assertIsNone(menu_catalog.parse_menu_filename(filename), filename)
+
+    def test_sync_catalog_and_latest_month(self):
+        enero = datetime(2031, 1, 2).timestamp()
+        # Diciembre se ha tocado después, pero el último mes es enero de 2031
+        self.menu('menu_enero_2031_euskera.pdf', 'eu', enero)
+        self.menu('menu_enero_2031_castellano.pdf', 'es', enero)
+        self.menu('menu_diciembre_2030_castellano.pdf', 'es', datetime(2031, 3, 1).timestamp())
+        self.menu('menu_enero_2031_adicional.pdf', 'extra', enero)
+        self.media_file('comedor/notas.txt', b'notas')
+
+        self.assertEqual(menu_catalog.sync_catalog(), (3, 0))
+        mes_actual, menus, _ = views.get_latest_menus()
+        self.assertEqual(mes_actual, 'Enero 2031')
+        self.assertEqual([menu['archivo'] for menu in menus], [
+            'menu_enero_2031_castellano.pdf', 'menu_enero_2031_euskera.pdf',
+        ])
+        self.assertEqual(views.get_latest_menus(2030, 12)[0], 'Diciembre 2030')
+        self.assertEqual(menu_catalog.get_menu_months(), [(2031, 1), (2030, 12)])
+
+        # Sin cambios se conserva la fecha de publicación; con cambios, checksum y fecha nuevos
+        castellano = MenuComedor.objects.get(archivo='menu_enero_2031_castellano.pdf')
+        self.menu('menu_enero_2031_euskera.pdf', 'eu nuevo', datetime(2031, 1, 20).timestamp())
+        os.remove(os.path.join(self.media_root, 'comedor', 'menu_diciembre_2030_castellano.pdf'))
+
+        self.assertEqual(menu_catalog.sync_catalog(), (2, 1))
+        self.assertEqual(MenuComedor.objects.get(pk=castellano.pk).fecha_publicacion, castellano.fecha_publicacion)
+        euskera = MenuComedor.objects.get(archivo='menu_enero_2031_euskera.pdf')
+        self.assertEqual(euskera.checksum, menu_catalog.file_checksum(
+            os.path.join(self.media_root, 'comedor', 'menu_enero_2031_euskera.pdf')
+        ))
+        self.assertEqual(timezone.localtime(euskera.fecha_publicacion).date(), date(2031, 1, 20))
+        self.assertEqual(menu_catalog.get_menu_months(), [(2031, 1)])
+
+    def test_year_in_name_wins_over_old_format(self):
+        self.menu('menu_enero_castellano.pdf', 'antiguo', datetime(2031, 1, 5).timestamp())
+        self.menu('menu_enero_2031_castellano.pdf', 'nuevo', datetime(2031, 1, 2).timestamp())
+
+        menu_catalog.sync_catalog()
+        self.assertEqual(
+            list(MenuComedor.objects.values_list('anio', 'mes', 'idioma', 'archivo')),
+            [(2031, 1, 'castellano', 'menu_enero_2031_castellano.pdf')],
+        )
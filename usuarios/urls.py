@@ -15,7 +15,9 @@ urlpatterns = [
     # path('contacto/', views.contacto, name='contacto'),  # Eliminado - ahora se usa modal
     path('comedor/', views.comedor, name='comedor'),
     path('comedor/gestionar/', views.gestionar_menus, name='gestionar_menus'),
+    path('comedor/api/dias/', views.menu_dias_api, name='menu_dias_api'),
     path('comedor/pdf/<str:filename>/', views.serve_pdf, name='serve_pdf'),
+    path('comedor/gestionar/tareas/<int:tarea_id>/', views.estado_tarea, name='estado_tarea'),
     path('comedor/gestionar/', views.gestionar_menus, name='gestionar_menus'),
     path('extraescolares/', views.extraescolares, name='extraescolares'),
     path('aula-madrugadores/', views.aula_madrugadores, name='aula_madrugadores'),
@@ -23,10 +25,14 @@ urlpatterns = [
     path('concurso-invierno/', views.concurso_navideno, name='concurso_invierno'),
     path('concurso-invierno/votacion/', views.concurso_votacion, name='concurso_votacion'),
     path('actividades/crear/', views.crear_actividad, name='crear_actividad'),
+    path('actividades/api/', views.actividades_api, name='actividades_api'),
+    path('actividades/calendario.ics', views.actividades_ical, name='actividades_ical'),
     path('actividades/<int:actividad_id>/', views.detalle_actividad, name='detalle_actividad'),
     path('actividades/<int:actividad_id>/editar/', views.actualizar_actividad, name='actualizar_actividad'),
     path('actividades/<int:actividad_id>/eliminar/', views.eliminar_actividad, name='eliminar_actividad'),
+    path('buscar/', views.buscar, name='buscar'),
     path('noticias/', views.noticias_lista, name='noticias_lista'),
+    path('noticias/api/', views.noticias_api, name='noticias_api'),
     # path('noticias/<slug:slug>/', views.noticia_detalle, name='noticia_detalle'),  # No necesario con modal
     path('noticias/crear/', views.crear_noticia, name='crear_noticia'),
     path('noticias/<int:noticia_id>/editar/', views.editar_noticia, name='editar_noticia'),
@@ -1,9 +1,9 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils.translation import gettext as _
+from django.utils.translation import get_language, gettext as _
 from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
@@ -11,11 +11,32 @@ from django.http import JsonResponse, HttpResponse, Http404
 from django.views.decorators.http import require_POST
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django.views.decorators.cache import cache_control
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .file_serving import is_private_path, serve_file
 from .forms import ActividadForm, NoticiaForm, ConcursoDibujoForm, ConsejoEducativoForm
-from .models import Contacto, Actividad, Noticia, ConcursoDibujo, Socio, ConsejoEducativo, ConsejoImagen
+from .menu_forms import MenuUploadForm
+from .menu_days import get_menu_days, serialize_day
+from .menu_images import page_sources
+from .actividades_ical import get_feed
+from .actividades_calendar import MAX_RANGE_DAYS, activities_in_range, get_month, month_range, range_etag, serialize_detalle
+from .actividades_recurrencia import occurrence_dates, upcoming
+from .busqueda import search
+from .payloads import get_actividad, get_noticia, get_noticia_staff, with_day_flags
+from .paginas_cache import documents_version, public_page
+from .noticias_listado import PAGE_SIZE, keyset_page, list_queryset, localize, published, serialize_resumen
+from .menu_catalog import (
+    MESES, IDIOMAS, get_comedor_dir, get_menu_months, menu_filename, mes_numero,
+    parse_menu_filename, unregister_menu
+)
+from .models import Contacto, Actividad, Noticia, ConcursoDibujo, Socio, ConsejoEducativo, ConsejoImagen, MenuComedor, TareaSegundoPlano
+from .tasks import encolar, guardar_subida
+import copy
+import hashlib
 import os
 import mimetypes
-from datetime import datetime
+from datetime import datetime, timedelta
 
 def admin_redirect_view(request):
     """Redirigir admin a pythonanywhere donde funciona"""
@@ -189,6 +210,7 @@ def admin_login_view(request):
     
     return render(request, 'admin/login.html', {'form': form})
 
+@public_page()
 def home(request):
     """Página de inicio pública con información de la Apyma"""
     from django.utils import timezone
@@ -199,10 +221,8 @@ def home(request):
         fecha_publicacion__lte=timezone.now()
     ).order_by('-fecha_publicacion')[:5]
     
-    # Obtener las próximas 5 actividades
-    actividades_proximas = Actividad.objects.filter(
-        fecha__gte=timezone.now().date()
-    ).order_by('fecha', 'hora_comienzo')[:5]
+    # Obtener las próximas 5 actividades (con las fechas de las series)
+    actividades_proximas = upcoming(timezone.localdate(), 5)
     
     context = {
         'noticias_recientes': noticias_recientes,
@@ -301,6 +321,7 @@ def logout_view(request):
     return redirect('home')
 
 
+@public_page(version=documents_version)
 def estatutos(request):
     """Vista pública para consultar y descargar los estatutos"""
     documentos_dir = os.path.join(settings.MEDIA_ROOT, 'documentos')
@@ -348,9 +369,8 @@ def estatutos(request):
 
 def actividades(request):
     """Vista para mostrar el calendario de actividades"""
-    from datetime import datetime, timedelta
+    from datetime import datetime
     import calendar
-    import json
     
     # Obtener el mes y año actual o desde los parámetros GET
     today = datetime.now()
@@ -372,49 +392,9 @@ def actividades(request):
         next_month = month + 1
         next_year = year
     
-    # Crear el calendario del mes
-    cal = calendar.Calendar(firstweekday=0)  # Lunes como primer día
-    month_days = cal.monthdays2calendar(year, month)
-    
-    # Obtener actividades reales de la base de datos para el mes actual
-    from datetime import date
-    first_day = date(year, month, 1)
-    if month == 12:
-        last_day = date(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        last_day = date(year, month + 1, 1) - timedelta(days=1)
-    
-    # Consultar actividades del mes
-    actividades_mes = Actividad.objects.filter(
-        fecha__gte=first_day,
-        fecha__lte=last_day,
-        activa=True
-    ).order_by('fecha', 'hora_comienzo')
-    
-    # Organizar actividades por día
-    actividades_por_dia = {}
-    for actividad in actividades_mes:
-        dia = actividad.fecha.day
-        if dia not in actividades_por_dia:
-            actividades_por_dia[dia] = []
-        
-        actividades_por_dia[dia].append({
-            'id': actividad.id,
-            'titulo': actividad.titulo or f"{actividad.get_tipo_actividad_display()}",
-            'hora': actividad.hora_comienzo.strftime('%H:%M'),
-            'hora_fin': actividad.hora_finalizacion.strftime('%H:%M') if actividad.hora_finalizacion else None,
-            'tipo': actividad.tipo_actividad,
-            'descripcion': actividad.descripcion,
-            'donde': actividad.donde,
-            'link': actividad.link,
-            'imagen_url': actividad.imagen.url if actividad.imagen else ''
-        })
-    
-    # Convertir actividades a formato JSON para JavaScript
-    actividades_json = {}
-    for dia, lista_actividades in actividades_por_dia.items():
-        key = f"{year},{month},{dia}"
-        actividades_json[key] = lista_actividades
+    # Rejilla del mes con las actividades ya colocadas en cada día
+    # (cacheada por año, mes e idioma; se invalida al guardar o borrar una actividad)
+    calendario = get_month(year, month)
     
     # Crear formulario para nuevas actividades (solo para staff)
     form = None
@@ -425,14 +405,13 @@ def actividades(request):
         'year': year,
         'month': month,
         'month_name': calendar.month_name[month],
-        'month_days': month_days,
+        'semanas': calendario['semanas'],
         'prev_year': prev_year,
         'prev_month': prev_month,
         'next_year': next_year,
         'next_month': next_month,
         'today': today,
-        'actividades': actividades_por_dia,
-        'actividades_json': json.dumps(actividades_json),
+        'actividades_json': calendario['actividades_json'],
         'weekday_names': ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom'],
         'form': form,
         'is_staff': request.user.is_staff
@@ -488,6 +467,7 @@ def concurso_votacion(request):
     })
 
 
+@public_page()
 def consejos_educativos(request):
     """Vista para mostrar la lista de consejos educativos"""
     consejos = ConsejoEducativo.objects.filter(activo=True).order_by('orden', '-fecha_publicacion')
@@ -654,6 +634,15 @@ def eliminar_imagen_consejo(request, imagen_id):
     return JsonResponse({'success': True})
 
 
+def actividad_guardada_response(actividad, mensaje):
+    """Respuesta de crear / actualizar con los datos que se acaban de preparar al guardar"""
+    return JsonResponse({
+        'success': True,
+        'message': mensaje,
+        'actividad': get_actividad(actividad.id, actividad.fecha_actualizacion, get_language()),
+    })
+
+
 @login_required
 @require_POST
 def crear_actividad(request):
@@ -664,17 +653,7 @@ def crear_actividad(request):
     form = ActividadForm(request.POST, request.FILES)
     if form.is_valid():
         actividad = form.save()
-        return JsonResponse({
-            'success': True, 
-            'message': 'Actividad creada exitosamente',
-            'actividad': {
-                'id': actividad.id,
-                'fecha': actividad.fecha.strftime('%Y-%m-%d'),
-                'titulo': actividad.titulo or actividad.get_tipo_actividad_display(),
-                'hora': actividad.hora_comienzo.strftime('%H:%M'),
-                'descripcion': actividad.descripcion
-            }
-        })
+        return actividad_guardada_response(actividad, 'Actividad creada exitosamente')
     else:
         errors = {}
         for field, field_errors in form.errors.items():
@@ -685,34 +664,108 @@ def crear_actividad(request):
 @login_required
 def detalle_actividad(request, actividad_id):
     """Vista para obtener los detalles de una actividad via AJAX"""
-    try:
-        actividad = Actividad.objects.get(id=actividad_id, activa=True)
-        
-        return JsonResponse({
-            'success': True,
-            'actividad': {
-                'id': actividad.id,
-                'titulo': actividad.titulo or actividad.get_tipo_actividad_display(),
-                'fecha': actividad.fecha.strftime('%d/%m/%Y'),
-                'fecha_iso': actividad.fecha.strftime('%Y-%m-%d'),
-                'hora_comienzo': actividad.hora_comienzo.strftime('%H:%M'),
-                'hora_finalizacion': actividad.hora_finalizacion.strftime('%H:%M') if actividad.hora_finalizacion else None,
-                'hora_completa': actividad.get_hora_completa(),
-                'duracion': actividad.get_duracion(),
-                'tipo_actividad': actividad.tipo_actividad,
-                'tipo_actividad_display': actividad.get_tipo_actividad_display(),
-                'descripcion': actividad.descripcion,
-                'donde': actividad.donde,
-                'link': actividad.link,
-                'imagen_url': actividad.imagen.url if actividad.imagen else None,
-                'es_hoy': actividad.es_hoy(),
-                'es_pasada': actividad.es_pasada()
-            },
-            'is_staff': request.user.is_staff
-        })
-        
-    except Actividad.DoesNotExist:
+    # Solo la versión de la fila: los datos se prepararon al guardarla (payloads.py)
+    fila = Actividad.objects.filter(id=actividad_id, activa=True).values_list('fecha_actualizacion', 'fecha').first()
+    if fila is None:
         return JsonResponse({'success': False, 'error': 'Actividad no encontrada'})
+    
+    version, fecha = fila
+    return JsonResponse({
+        'success': True,
+        'actividad': with_day_flags(get_actividad(actividad_id, version, get_language()), fecha),
+        'is_staff': request.user.is_staff,
+    })
+
+
+def actividades_api(request):
+    """
+    Actividades activas de un rango de fechas en JSON (público, solo lectura).
+    Parámetros: ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD (por defecto el mes actual,
+    como máximo un año). Responde 304 si el ETag del cliente sigue valiendo.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    hoy = timezone.localdate()
+    try:
+        desde = datetime.strptime(request.GET['desde'], '%Y-%m-%d').date() if request.GET.get('desde') else hoy.replace(day=1)
+        hasta = datetime.strptime(request.GET['hasta'], '%Y-%m-%d').date() if request.GET.get('hasta') else month_range(desde.year, desde.month)[1]
+    except ValueError:
+        return JsonResponse({'error': 'Fecha no válida (formato AAAA-MM-DD)'}, status=400)
+    
+    if hasta < desde or (hasta - desde).days >= MAX_RANGE_DAYS:
+        return JsonResponse({'error': f'Rango no válido (máximo {MAX_RANGE_DAYS} días)'}, status=400)
+    
+    etag = range_etag(desde, hasta)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'actividades': [serialize_detalle(actividad) for actividad in activities_in_range(desde, hasta)],
+        }, json_dumps_params={'ensure_ascii': False})
+    
+    # El navegador puede guardarla, pero tiene que revalidarla siempre (304 si no cambia)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def buscar(request):
+    """
+    Búsqueda en noticias, actividades y consejos (JSON, público).
+    Parámetro: ?q=palabras. Resultados del idioma de la URL, por relevancia.
+    """
+    consulta = request.GET.get('q', '').strip()
+    return JsonResponse({
+        'q': consulta,
+        'resultados': search(consulta, get_language()),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def actividades_ical(request):
+    """
+    Feed iCalendar de las actividades para suscribirse desde el calendario del
+    móvil. Idioma según la URL (/es/ o /eu/); ?tipo=taller para un solo tipo.
+    """
+    tipo = request.GET.get('tipo') or None
+    if tipo and tipo not in dict(Actividad.TIPO_ACTIVIDAD_CHOICES):
+        return HttpResponse('Tipo de actividad no válido', status=400, content_type='text/plain; charset=utf-8')
+    
+    feed = get_feed(tipo)
+    response = get_conditional_response(request, etag=feed['etag'], last_modified=feed['last_modified'])
+    if response is None:
+        response = HttpResponse(feed['ics'], content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="actividades.ics"'
+    
+    response['ETag'] = feed['etag']
+    if feed['last_modified']:
+        response['Last-Modified'] = http_date(feed['last_modified'])
+    patch_cache_control(response, public=True, max_age=900)
+    return response
+
+
+def _fecha_ocurrencia(request, actividad):
+    """
+    Fecha de la serie a la que se limita la edición o el borrado (POST
+    solo_esta=1 y ocurrencia=AAAA-MM-DD), o None para la actividad entera.
+    ValueError (con el mensaje para el usuario) si la fecha no es de la
+    serie, ya se ha borrado o ya tiene una fecha modificada: esa se edita o
+    se borra como una actividad más.
+    """
+    if not actividad.recurrencia or not request.POST.get('solo_esta'):
+        return None
+    try:
+        fecha = datetime.strptime(request.POST.get('ocurrencia', ''), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('La fecha no pertenece a la serie')
+    if fecha not in occurrence_dates(actividad, fecha, fecha):
+        raise ValueError('La fecha no pertenece a la serie')
+    if fecha.isoformat() in (actividad.excepciones or []):
+        raise ValueError('La fecha ya se ha eliminado de la serie')
+    if actividad.ocurrencias_modificadas.filter(fecha_original=fecha).exists():
+        raise ValueError('La fecha ya se ha modificado; edita la actividad de ese día')
+    return fecha
 
 
 @login_required
@@ -724,21 +777,31 @@ def actualizar_actividad(request, actividad_id):
     
     try:
         actividad = Actividad.objects.get(id=actividad_id, activa=True)
-        form = ActividadForm(request.POST, request.FILES, instance=actividad)
+        
+        # Solo una fecha de una serie: se guarda aparte y sustituye a esa fecha
+        try:
+            fecha_original = _fecha_ocurrencia(request, actividad)
+        except ValueError as error:
+            return JsonResponse({'success': False, 'error': str(error)}, status=400)
+        if fecha_original:
+            instancia = copy.copy(actividad)
+            instancia.pk = None
+            instancia._state.adding = True
+            instancia.serie = actividad
+            instancia.fecha_original = fecha_original
+        else:
+            instancia = actividad
+        form = ActividadForm(request.POST, request.FILES, instance=instancia)
         
         if form.is_valid():
-            actividad_actualizada = form.save()
-            return JsonResponse({
-                'success': True, 
-                'message': 'Actividad actualizada exitosamente',
-                'actividad': {
-                    'id': actividad_actualizada.id,
-                    'fecha': actividad_actualizada.fecha.strftime('%Y-%m-%d'),
-                    'titulo': actividad_actualizada.titulo or actividad_actualizada.get_tipo_actividad_display(),
-                    'hora': actividad_actualizada.hora_comienzo.strftime('%H:%M'),
-                    'descripcion': actividad_actualizada.descripcion
-                }
-            })
+            actividad_actualizada = form.save(commit=False)
+            if fecha_original:
+                actividad_actualizada.recurrencia = ''
+                actividad_actualizada.intervalo = 1
+                actividad_actualizada.recurrencia_hasta = None
+                actividad_actualizada.excepciones = []
+            actividad_actualizada.save()
+            return actividad_guardada_response(actividad_actualizada, 'Actividad actualizada exitosamente')
         else:
             errors = {}
             for field, field_errors in form.errors.items():
@@ -759,9 +822,27 @@ def eliminar_actividad(request, actividad_id):
     try:
         actividad = Actividad.objects.get(id=actividad_id, activa=True)
         
+        # Solo una fecha de una serie: se añade a sus excepciones
+        try:
+            fecha_original = _fecha_ocurrencia(request, actividad)
+        except ValueError as error:
+            return JsonResponse({'success': False, 'error': str(error)}, status=400)
+        if fecha_original:
+            actividad.excepciones = sorted(set(actividad.excepciones or []) | {fecha_original.isoformat()})
+            actividad.save()
+            return JsonResponse({
+                'success': True,
+                'message': 'Fecha eliminada de la serie'
+            })
+        
         # En lugar de eliminar completamente, marcamos como inactiva
         actividad.activa = False
         actividad.save()
+        # Con la serie desaparecen también sus fechas modificadas
+        # (una a una, para que las señales las quiten de la búsqueda y las cachés)
+        for ocurrencia in actividad.ocurrencias_modificadas.filter(activa=True):
+            ocurrencia.activa = False
+            ocurrencia.save(update_fields=['activa', 'fecha_actualizacion'])
         
         return JsonResponse({
             'success': True, 
@@ -771,97 +852,41 @@ def eliminar_actividad(request, actividad_id):
     except Actividad.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Actividad no encontrada'})
 
-def get_latest_menus():
-    """Busca automáticamente los menús más recientes disponibles"""
-    import os
-    from datetime import datetime
-    import re
-    
-    # Directorio donde están los menús
-    media_root = getattr(settings, 'MEDIA_ROOT', '')
-    comedor_dir = os.path.join(media_root, 'comedor')
-    
+def get_latest_menus(anio=None, mes=None):
+    """
+    Obtiene los menús de un mes desde el catálogo (por defecto el más reciente).
+    El mes más reciente se decide por año y mes, no por la fecha de los archivos.
+    """
     menus_disponibles = []
     mes_actual = None
     fecha_actualizacion = None
-    
-    if os.path.exists(comedor_dir):
-        # Obtener todos los archivos PDF del directorio
-        pdf_files = [f for f in os.listdir(comedor_dir) if f.endswith('.pdf')]
-        
-        # Diccionario para agrupar menús por mes e idioma
-        menus_por_mes = {}
-        
-        for pdf_file in pdf_files:
-            # Extraer información del nombre del archivo
-            # Formatos esperados: menu_[mes]_castellano.pdf, menu_[mes]_euskera.pdf
-            match = re.match(r'menu_(\w+)_(castellano|euskera)\.pdf', pdf_file, re.IGNORECASE)
-            
-            if match:
-                mes, idioma = match.groups()
-                
-                # Normalizar el nombre del mes
-                mes_normalized = mes.lower()
-                idioma_normalized = idioma.lower()
-                
-                if mes_normalized not in menus_por_mes:
-                    menus_por_mes[mes_normalized] = {}
-                
-                # Obtener fecha de modificación del archivo
-                file_path = os.path.join(comedor_dir, pdf_file)
-                file_mtime = os.path.getmtime(file_path)
-                file_date = datetime.fromtimestamp(file_mtime)
-                
-                menus_por_mes[mes_normalized][idioma_normalized] = {
-                    'archivo': pdf_file,
-                    'fecha_mod': file_mtime,
-                    'fecha_formateada': file_date.strftime('%d/%m/%Y %H:%M'),
-                    'titulo': f"Menú {mes.title()} ({idioma.title()})"
-                }
-        
-        # Encontrar el mes más reciente
-        if menus_por_mes:
-            # Ordenar por fecha de modificación más reciente
-            mes_mas_reciente = None
-            fecha_mas_reciente = 0
-            
-            for mes, idiomas in menus_por_mes.items():
-                # Obtener la fecha más reciente de los archivos de este mes
-                max_fecha = max(info['fecha_mod'] for info in idiomas.values())
-                if max_fecha > fecha_mas_reciente:
-                    fecha_mas_reciente = max_fecha
-                    mes_mas_reciente = mes
-            
-            if mes_mas_reciente:
-                mes_actual = mes_mas_reciente.title()
-                fecha_actualizacion = datetime.fromtimestamp(fecha_mas_reciente)
-                
-                # Agregar menús del mes más reciente
-                idiomas_info = menus_por_mes[mes_mas_reciente]
-                
-                # Orden preferido: castellano primero, luego euskera
-                orden_idiomas = ['castellano', 'euskera']
-                
-                for idioma in orden_idiomas:
-                    if idioma in idiomas_info:
-                        info = idiomas_info[idioma]
-                        menus_disponibles.append({
-                            'titulo': info['titulo'],
-                            'archivo': info['archivo'],
-                            'idioma': idioma.title(),
-                            'fecha_actualizacion': info['fecha_formateada']
-                        })
+
+    menus = MenuComedor.objects.all()
+    if anio and mes:
+        menus = menus.filter(anio=anio, mes=mes)
+
+    ultimo = menus.order_by('-anio', '-mes').first()
+
+    if ultimo:
+        menus_mes = list(menus.filter(anio=ultimo.anio, mes=ultimo.mes))
+        mes_actual = f"{MESES[ultimo.mes - 1].title()} {ultimo.anio}"
+        fecha_actualizacion = timezone.localtime(max(menu.fecha_publicacion for menu in menus_mes))
+
+        # Orden preferido: castellano primero, luego euskera
+        menus_mes.sort(key=lambda menu: IDIOMAS.index(menu.idioma))
+
+        for menu in menus_mes:
+            menus_disponibles.append({
+                'titulo': f"Menú {MESES[menu.mes - 1].title()} ({menu.idioma.title()})",
+                'archivo': menu.archivo,
+                'idioma': menu.idioma.title(),
+                'fecha_actualizacion': timezone.localtime(menu.fecha_publicacion).strftime('%d/%m/%Y %H:%M'),
+                'paginas': page_sources(menu.paginas, version=menu.checksum[:12]),
+            })
     
     # Si no se encuentran menús, usar valores por defecto
     if not menus_disponibles:
-        current_month = datetime.now().strftime('%B').lower()
-        month_translations = {
-            'january': 'enero', 'february': 'febrero', 'march': 'marzo',
-            'april': 'abril', 'may': 'mayo', 'june': 'junio',
-            'july': 'julio', 'august': 'agosto', 'september': 'septiembre',
-            'october': 'octubre', 'november': 'noviembre', 'december': 'diciembre'
-        }
-        mes_actual = month_translations.get(current_month, 'Mes actual').title()
+        mes_actual = MESES[datetime.now().month - 1].title()
         
         menus_disponibles = [
             {
@@ -874,11 +899,24 @@ def get_latest_menus():
     
     return mes_actual, menus_disponibles, fecha_actualizacion
 
+@public_page(params=('anio', 'mes', 'idioma'))
 def comedor(request):
     """Vista para mostrar información del comedor escolar"""
     
-    # Obtener menús dinámicamente
-    mes_actual, menus_disponibles, fecha_actualizacion = get_latest_menus()
+    # Mes solicitado desde el archivo (?anio=2025&mes=9) o el más reciente
+    try:
+        anio = int(request.GET.get('anio', 0))
+        mes = int(request.GET.get('mes', 0))
+    except ValueError:
+        anio = mes = 0
+
+    mes_actual, menus_disponibles, fecha_actualizacion = get_latest_menus(anio, mes)
+
+    # Meses anteriores disponibles en el catálogo
+    archivo_menus = [
+        {'anio': a, 'mes': m, 'nombre': f"{MESES[m - 1].title()} {a}"}
+        for a, m in get_menu_months()
+    ]
     
     # Información del comedor
     menu_info = {
@@ -891,10 +929,50 @@ def comedor(request):
             'email': 'elgustodecrecer@aramark.es',
             'web': 'www.elgustodecrecer.es'
         },
-        'menus_disponibles': menus_disponibles
+        'menus_disponibles': menus_disponibles,
+        'archivo_menus': archivo_menus
     }
     
-    return render(request, 'usuarios/comedor.html', {'menu_info': menu_info})
+    # Menú de hoy y de la semana en el idioma de la página (sin abrir el PDF)
+    menu_hoy, menu_semana = get_menu_days(menu_idioma(request), timezone.localdate())
+    
+    return render(request, 'usuarios/comedor.html', {
+        'menu_info': menu_info,
+        'menu_hoy': menu_hoy,
+        'menu_semana': menu_semana,
+    })
+
+
+def menu_idioma(request):
+    """Idioma del menú: ?idioma=castellano|euskera o el de la página"""
+    idioma = request.GET.get('idioma')
+    if idioma in IDIOMAS:
+        return idioma
+    return 'euskera' if (get_language() or '').startswith('eu') else 'castellano'
+
+
+def menu_dias_api(request):
+    """
+    Menú de hoy y de la semana en JSON.
+    Parámetros opcionales: ?idioma=castellano|euskera y ?fecha=AAAA-MM-DD
+    """
+    idioma = menu_idioma(request)
+    
+    fecha = timezone.localdate()
+    if request.GET.get('fecha'):
+        try:
+            fecha = datetime.strptime(request.GET['fecha'], '%Y-%m-%d').date()
+        except ValueError:
+            return JsonResponse({'error': 'Fecha no válida (formato AAAA-MM-DD)'}, status=400)
+    
+    hoy, semana = get_menu_days(idioma, fecha)
+    
+    return JsonResponse({
+        'idioma': idioma,
+        'fecha': fecha.isoformat(),
+        'hoy': serialize_day(hoy) if hoy else None,
+        'semana': [serialize_day(dia) for dia in semana],
+    }, json_dumps_params={'ensure_ascii': False})
 
 @login_required
 def gestionar_menus(request):
@@ -908,6 +986,8 @@ def gestionar_menus(request):
     # Crear directorio si no existe
     os.makedirs(media_dir, exist_ok=True)
     
+    form = MenuUploadForm()
+
     if request.method == 'POST':
         if 'upload' in request.POST:
             # Manejar subida de archivos
@@ -915,28 +995,53 @@ def gestionar_menus(request):
         elif 'delete' in request.POST:
             # Manejar eliminación de archivos
             return handle_menu_delete(request, media_dir)
-    
-    # Obtener lista de menús existentes
-    pdf_files = []
-    if os.path.exists(media_dir):
-        files = [f for f in os.listdir(media_dir) if f.endswith('.pdf')]
-        for file in sorted(files):
-            file_path = os.path.join(media_dir, file)
-            file_stat = os.stat(file_path)
-            pdf_files.append({
-                'nombre': file,
-                'tamaño': file_stat.st_size,
-                'fecha_mod': datetime.fromtimestamp(file_stat.st_mtime),
-                'url': f'/comedor/pdf/{file}/'
-            })
+
+        # Formulario de subida por mes (completo o separado por idiomas)
+        form = MenuUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            resultado = process_menu_upload(form.cleaned_data, request.user)
+            if resultado['success']:
+                messages.success(request, resultado['message'])
+                return redirect('gestionar_menus')
+            messages.error(request, resultado['message'])
+    
+    # Obtener lista de menús existentes desde el catálogo
+    menus_existentes = get_existing_menus()
+    
+    # Tareas de menús de las últimas 24 horas (la plantilla consulta el estado
+    # de las que no han terminado)
+    tareas_recientes = TareaSegundoPlano.objects.filter(
+        tipo__in=['separar_menu', 'publicar_menu'],
+        fecha_creacion__gte=timezone.now() - timedelta(days=1),
+    )[:10]
     
     context = {
-        'menus_existentes': pdf_files,
-        'total_archivos': len(pdf_files)
+        'form': form,
+        'menus_existentes': menus_existentes,
+        'total_archivos': MenuComedor.objects.count(),
+        'tareas_recientes': tareas_recientes,
     }
     
     return render(request, 'usuarios/gestionar_menus.html', context)
 
+def estado_tarea(request, tarea_id):
+    """Estado de una tarea en segundo plano en JSON (solo staff)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    
+    t = get_object_or_404(TareaSegundoPlano, pk=tarea_id)
+    
+    return JsonResponse({
+        'id': t.pk,
+        'tipo': t.tipo,
+        'estado': t.estado,
+        'estado_display': str(t.get_estado_display()),
+        'progreso': t.progreso,
+        'mensaje': t.mensaje,
+        'terminada': t.terminada,
+    })
+
+@public_page()
 def extraescolares(request):
     """Vista para mostrar información de las actividades extraescolares"""
     
@@ -1037,6 +1142,7 @@ def extraescolares(request):
     
     return render(request, 'usuarios/extraescolares.html', {'info': info_extraescolares})
 
+@public_page()
 def aula_madrugadores(request):
     """Vista para mostrar información del aula matinal"""
     
@@ -1099,7 +1205,28 @@ def handle_menu_upload(request, media_dir):
                 continue
             
             # Limpiar nombre del archivo
-            safe_name = uploaded_file.name.replace(' ', '_').lower()
+            safe_name = os.path.basename(uploaded_file.name.replace(' ', '_').lower())
+            
+            # Los menús (menu_<mes>_<idioma>.pdf) se guardan con el año en el nombre
+            # para que el mismo mes de distintos años no se sobrescriba
+            parsed = parse_menu_filename(safe_name)
+            if parsed:
+                anio, mes, idioma = parsed
+                anio = anio or datetime.now().year
+                safe_name = menu_filename(anio, mes, idioma)
+            
+            if parsed:
+                # Los menús se publican y registran en segundo plano
+                encolar('publicar_menu', {
+                    'ruta': guardar_subida(uploaded_file),
+                    'anio': anio,
+                    'mes': mes,
+                    'idioma': idioma,
+                }, request.user)
+                success_count += 1
+                messages.success(request, f'Archivo {safe_name} recibido, se está procesando.')
+                continue
+            
             file_path = os.path.join(media_dir, safe_name)
             
             # Guardar archivo
@@ -1134,8 +1261,9 @@ def handle_menu_delete(request, media_dir):
             messages.error(request, 'Archivo no encontrado o acceso denegado.')
             return redirect('gestionar_menus')
         
-        # Eliminar archivo
+        # Eliminar archivo y su entrada del catálogo
         os.remove(file_path)
+        unregister_menu(file_to_delete)
         messages.success(request, f'Archivo {file_to_delete} eliminado correctamente.')
         
     except Exception as e:
@@ -1165,13 +1293,31 @@ def serve_documento(request, filename):
     content_type, _ = mimetypes.guess_type(file_path)
     content_type = content_type or 'application/pdf'
 
-    with open(file_path, 'rb') as pdf_file:
-        content = pdf_file.read()
+    return serve_file(
+        request,
+        file_path,
+        filename=safe_name,
+        content_type=content_type,
+        as_attachment=request.GET.get('download') == '1'
+    )
+
+def serve_media(request, path):
+    """Sirve los archivos de media/ (imágenes, documentos) comprobando que no salen del directorio"""
+    # Ni archivos ocultos (.media_manifest.json) ni temporales, igual que media_wsgi
+    if is_private_path(path):
+        raise Http404("Archivo no encontrado")
 
-    disposition = 'attachment' if request.GET.get('download') == '1' else 'inline'
-    response = HttpResponse(content, content_type=content_type)
-    response['Content-Disposition'] = f'{disposition}; filename="{safe_name}"'
-    return response
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    file_path = os.path.realpath(os.path.join(media_root, path))
+
+    # Verificar que el archivo está dentro de MEDIA_ROOT (seguridad)
+    if os.path.commonpath([file_path, media_root]) != media_root:
+        raise Http404("Acceso denegado")
+
+    if not os.path.isfile(file_path):
+        raise Http404("Archivo no encontrado")
+
+    return serve_file(request, file_path)
 
 @xframe_options_exempt
 @cache_control(max_age=3600)  # Cache por 1 hora
@@ -1194,19 +1340,15 @@ def serve_pdf(request, filename):
         raise Http404("Acceso denegado")
     
     try:
-        with open(file_path, 'rb') as pdf_file:
-            content = pdf_file.read()
-        
-        # Crear respuesta HTTP con el contenido del PDF
-        response = HttpResponse(content, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
+        # Transmitir el PDF por bloques (con ETag/Last-Modified y 304)
+        response = serve_file(request, file_path, filename=filename, content_type='application/pdf')
         
         # Importante: NO establecer X-Frame-Options para permitir iframe
         # El decorador @xframe_options_exempt ya se encarga de esto
         
         return response
         
-    except Exception as e:
+    except OSError:
         raise Http404("Error al leer el archivo")
 
 
@@ -1340,44 +1482,53 @@ def debug_redirect(request):
     return HttpResponse(html)
 
 
+@public_page(params=('page',))
 def noticias_lista(request):
     """Vista para mostrar la lista de noticias"""
     from django.core.paginator import Paginator
     
-    # Obtener solo noticias publicadas
-    noticias = Noticia.objects.filter(publicada=True)
-    
     # Obtener idioma actual
     language = request.LANGUAGE_CODE
     
-    # Añadir campos localizados a cada noticia
-    for noticia in noticias:
-        noticia.titulo_localizado = noticia.get_titulo_localized(language)
-        noticia.resumen_localizado = noticia.get_resumen_localized(language)
-        noticia.contenido_localizado = noticia.get_contenido_localized(language)
+    # Solo la página que se muestra y solo las columnas del idioma activo;
+    # el contenido se pide al abrir la noticia (obtener_noticia_publica)
+    noticias = list_queryset(language)
     
     # Paginación
-    paginator = Paginator(noticias, 6)  # 6 noticias por página
+    paginator = Paginator(noticias, PAGE_SIZE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
-    
-    # También añadir los campos localizados a las noticias paginadas
-    for noticia in page_obj:
-        noticia.titulo_localizado = noticia.get_titulo_localized(language)
-        noticia.resumen_localizado = noticia.get_resumen_localized(language)
-        noticia.contenido_localizado = noticia.get_contenido_localized(language)
+    localize(page_obj, language)
     
     context = {
         'noticias': page_obj,  # Para compatibilidad con la plantilla
         'page_obj': page_obj,
         'is_paginated': page_obj.has_other_pages(),
         'language': language,
-        'total_noticias': noticias.count(),
+        'total_noticias': paginator.count,
     }
     
     return render(request, 'usuarios/noticias_lista.html', context)
 
 
+def noticias_api(request):
+    """
+    Noticias publicadas en JSON para el scroll infinito, por cursor:
+    ?cursor=<siguiente de la respuesta anterior>. Sin el contenido completo
+    (se pide al abrir la noticia en /noticia/<id>/).
+    """
+    language = request.LANGUAGE_CODE
+    try:
+        noticias, siguiente = keyset_page(language, request.GET.get('cursor') or None)
+    except ValueError:
+        return JsonResponse({'error': 'Cursor no válido'}, status=400)
+    
+    return JsonResponse({
+        'noticias': [serialize_resumen(noticia) for noticia in noticias],
+        'siguiente': siguiente,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
 # Vista de detalle no necesaria con el modal
 # def noticia_detalle(request, slug):
 #     """Vista para mostrar el detalle de una noticia en modal"""
@@ -1516,234 +1667,123 @@ def obtener_noticia(request, noticia_id):
     if not request.user.is_staff:
         return JsonResponse({'error': 'No tienes permisos'}, status=403)
     
-    try:
-        noticia = Noticia.objects.get(id=noticia_id)
-        data = {
-            'id': noticia.id,
-            'titulo': noticia.titulo,
-            'titulo_eu': noticia.titulo_eu or '',
-            'resumen': noticia.resumen,
-            'resumen_eu': noticia.resumen_eu or '',
-            'contenido': noticia.contenido,
-            'contenido_eu': noticia.contenido_eu or '',
-            'publicada': noticia.publicada,
-            'imagen_url': noticia.imagen.url if noticia.imagen else ''
-        }
-        return JsonResponse(data)
-    except Noticia.DoesNotExist:
+    version = Noticia.objects.filter(id=noticia_id).values_list('fecha_modificacion', flat=True).first()
+    if version is None:
         return JsonResponse({'error': 'Noticia no encontrada'}, status=404)
+    return HttpResponse(get_noticia_staff(noticia_id, version), content_type='application/json')
 
 def obtener_noticia_publica(request, noticia_id):
-    """Vista pública para obtener los datos de una noticia para mostrar en modal"""
-    try:
-        from django.utils import timezone
-        
-        noticia = Noticia.objects.get(
-            id=noticia_id,
-            publicada=True,
-            fecha_publicacion__lte=timezone.now()
-        )
-        
-        # Obtener idioma actual
-        from django.utils.translation import get_language
-        idioma_actual = get_language()
-        
-        # Seleccionar título y contenido según idioma
-        if idioma_actual == 'eu' and noticia.titulo_eu:
-            titulo = noticia.titulo_eu
-            resumen = noticia.resumen_eu or noticia.resumen
-            contenido = noticia.contenido_eu or noticia.contenido
-        else:
-            titulo = noticia.titulo
-            resumen = noticia.resumen
-            contenido = noticia.contenido
-        
-        data = {
-            'success': True,
-            'noticia': {
-                'id': noticia.id,
-                'titulo': titulo,
-                'resumen': resumen,
-                'contenido': contenido,
-                'fecha_publicacion': noticia.fecha_publicacion.strftime('%d %B %Y'),
-                'imagen': noticia.imagen.url if noticia.imagen else None,
-                'destacada': getattr(noticia, 'destacada', False)
-            }
-        }
-        return JsonResponse(data)
-    except Noticia.DoesNotExist:
+    """
+    Vista pública para obtener los datos de una noticia para mostrar en modal.
+    El JSON se prepara al guardar la noticia (payloads.py) y lleva ETag por
+    (noticia, idioma, última modificación): si el navegador ya lo tiene, 304.
+    """
+    version = published().filter(id=noticia_id).values_list('fecha_modificacion', flat=True).first()
+    if version is None:
         return JsonResponse({'success': False, 'error': 'Noticia no encontrada'}, status=404)
-
-
-def get_existing_menus():
-    """Obtiene la lista de menús existentes"""
-    import re
-    from datetime import datetime
     
-    media_root = getattr(settings, 'MEDIA_ROOT', '')
-    comedor_dir = os.path.join(media_root, 'comedor')
+    # Obtener idioma actual
+    idioma_actual = get_language()
+    clave = f'{noticia_id}:{idioma_actual}:{version.timestamp()}'
+    etag = '"%s"' % hashlib.sha1(clave.encode('utf-8')).hexdigest()[:20]
     
-    if not os.path.exists(comedor_dir):
-        return {}
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(get_noticia(noticia_id, version, idioma_actual), content_type='application/json')
     
-    pdf_files = [f for f in os.listdir(comedor_dir) if f.endswith('.pdf')]
+    # El navegador puede guardarla, pero tiene que revalidarla siempre (304 si no cambia)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def get_existing_menus():
+    """Obtiene la lista de menús existentes agrupados por mes (más recientes primero)"""
     menus_por_mes = {}
     
-    for pdf_file in pdf_files:
-        match = re.match(r'menu_(\w+)_(castellano|euskera)\.pdf', pdf_file, re.IGNORECASE)
+    for menu in MenuComedor.objects.order_by('-anio', '-mes', 'idioma'):
+        mes = f"{MESES[menu.mes - 1]} {menu.anio}"
         
-        if match:
-            mes, idioma = match.groups()
-            
-            if mes not in menus_por_mes:
-                menus_por_mes[mes] = {
-                    'castellano': None,
-                    'euskera': None,
-                    'fecha_modificacion': None
-                }
-            
-            file_path = os.path.join(comedor_dir, pdf_file)
-            file_mtime = os.path.getmtime(file_path)
-            file_date = datetime.fromtimestamp(file_mtime)
-            file_size = os.path.getsize(file_path)
-            
-            menus_por_mes[mes][idioma.lower()] = {
-                'archivo': pdf_file,
-                'fecha': file_date.strftime('%d/%m/%Y %H:%M'),
-                'tamaño': f'{file_size:,} bytes'
+        if mes not in menus_por_mes:
+            menus_por_mes[mes] = {
+                'castellano': None,
+                'euskera': None,
+                'fecha_modificacion': None
             }
-            
-            # Actualizar fecha de modificación del mes (la más reciente)
-            if (menus_por_mes[mes]['fecha_modificacion'] is None or 
-                file_mtime > menus_por_mes[mes]['fecha_modificacion']):
-                menus_por_mes[mes]['fecha_modificacion'] = file_mtime
+        
+        menus_por_mes[mes][menu.idioma] = {
+            'archivo': menu.archivo,
+            'fecha': timezone.localtime(menu.fecha_publicacion).strftime('%d/%m/%Y %H:%M'),
+            'tamaño': f'{menu.tamano:,} bytes'
+        }
+        
+        # Fecha de publicación del mes (la más reciente)
+        if (menus_por_mes[mes]['fecha_modificacion'] is None or
+                menu.fecha_publicacion > menus_por_mes[mes]['fecha_modificacion']):
+            menus_por_mes[mes]['fecha_modificacion'] = menu.fecha_publicacion
     
-    # Ordenar por fecha de modificación (más recientes primero)
-    return dict(sorted(
-        menus_por_mes.items(), 
-        key=lambda x: x[1]['fecha_modificacion'] or 0, 
-        reverse=True
-    ))
+    return menus_por_mes
 
 
-def process_menu_upload(form_data):
-    """Procesa la subida de menús"""
+def process_menu_upload(form_data, usuario=None):
+    """
+    Procesa la subida de menús: guarda los PDFs en la carpeta de tareas y
+    encola su procesado (separar páginas, linearizar, registrar en el catálogo)
+    para que lo haga el worker procesar_tareas.
+    """
     mes = form_data['mes']
+    anio = form_data.get('anio') or datetime.now().year
+    mes_num = mes_numero(mes)
     menu_castellano = form_data.get('menu_castellano')
     menu_euskera = form_data.get('menu_euskera')
     menu_completo = form_data.get('menu_completo')
     sobrescribir = form_data.get('sobrescribir', False)
     
-    media_root = getattr(settings, 'MEDIA_ROOT', '')
-    comedor_dir = os.path.join(media_root, 'comedor')
-    
-    # Crear directorio si no existe
-    os.makedirs(comedor_dir, exist_ok=True)
+    comedor_dir = get_comedor_dir()
     
-    archivos_procesados = []
+    tareas_encoladas = []
     
     try:
         # Caso 1: Menú completo (separar páginas)
         if menu_completo:
-            temp_path = os.path.join(comedor_dir, f'temp_{mes}_completo.pdf')
-            
-            # Guardar archivo temporal
-            with open(temp_path, 'wb') as f:
-                for chunk in menu_completo.chunks():
-                    f.write(chunk)
-            
-            # Separar páginas
-            success = split_menu_pdf_upload(temp_path, mes, sobrescribir)
+            if not sobrescribir and any(
+                os.path.exists(os.path.join(comedor_dir, menu_filename(anio, mes_num, idioma)))
+                for idioma in IDIOMAS
+            ):
+                return {'success': False, 'message': f'El menú de {mes} {anio} ya existe. Marca "sobrescribir" si quieres reemplazarlo.'}
             
-            # Eliminar archivo temporal
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
-            if success:
-                archivos_procesados.extend([f'menu_{mes}_castellano.pdf', f'menu_{mes}_euskera.pdf'])
-            else:
-                return {'success': False, 'message': 'Error separando el PDF completo'}
+            tareas_encoladas.append(encolar('separar_menu', {
+                'ruta': guardar_subida(menu_completo),
+                'mes': mes_num,
+                'anio': anio,
+                'sobrescribir': sobrescribir,
+            }, usuario))
         
         # Caso 2: Archivos separados
         else:
-            if menu_castellano:
-                archivo_path = os.path.join(comedor_dir, f'menu_{mes}_castellano.pdf')
-                
-                if os.path.exists(archivo_path) and not sobrescribir:
-                    return {'success': False, 'message': f'El menú de {mes} en castellano ya existe. Marca "sobrescribir" si quieres reemplazarlo.'}
-                
-                with open(archivo_path, 'wb') as f:
-                    for chunk in menu_castellano.chunks():
-                        f.write(chunk)
-                
-                archivos_procesados.append(f'menu_{mes}_castellano.pdf')
+            archivos = [(idioma, archivo) for idioma, archivo in (('castellano', menu_castellano), ('euskera', menu_euskera)) if archivo]
+            
+            for idioma, archivo in archivos:
+                filename = menu_filename(anio, mes_num, idioma)
+                if os.path.exists(os.path.join(comedor_dir, filename)) and not sobrescribir:
+                    return {'success': False, 'message': f'El menú de {mes} {anio} en {idioma} ya existe. Marca "sobrescribir" si quieres reemplazarlo.'}
             
-            if menu_euskera:
-                archivo_path = os.path.join(comedor_dir, f'menu_{mes}_euskera.pdf')
-                
-                if os.path.exists(archivo_path) and not sobrescribir:
-                    return {'success': False, 'message': f'El menú de {mes} en euskera ya existe. Marca "sobrescribir" si quieres reemplazarlo.'}
-                
-                with open(archivo_path, 'wb') as f:
-                    for chunk in menu_euskera.chunks():
-                        f.write(chunk)
-                
-                archivos_procesados.append(f'menu_{mes}_euskera.pdf')
+            for idioma, archivo in archivos:
+                tareas_encoladas.append(encolar('publicar_menu', {
+                    'ruta': guardar_subida(archivo),
+                    'anio': anio,
+                    'mes': mes_num,
+                    'idioma': idioma,
+                }, usuario))
         
-        if archivos_procesados:
+        if tareas_encoladas:
             return {
-                'success': True, 
-                'message': f'Menús subidos correctamente: {", ".join(archivos_procesados)}'
+                'success': True,
+                'message': f'Menús recibidos. Se están procesando en segundo plano ({len(tareas_encoladas)} tarea(s)).',
+                'tareas': [t.pk for t in tareas_encoladas],
             }
         else:
             return {'success': False, 'message': 'No se procesó ningún archivo'}
     
     except Exception as e:
         return {'success': False, 'message': f'Error procesando archivos: {str(e)}'}
-
-
-def split_menu_pdf_upload(pdf_path, mes, sobrescribir=False):
-    """Separa un PDF de menú en castellano y euskera para uploads"""
-    try:
-        from pypdf import PdfReader, PdfWriter
-        
-        # Leer el PDF
-        reader = PdfReader(pdf_path)
-        total_pages = len(reader.pages)
-        
-        if total_pages < 2:
-            return False
-        
-        comedor_dir = os.path.dirname(pdf_path)
-        
-        # Crear PDF para castellano (primera página)
-        castellano_path = os.path.join(comedor_dir, f'menu_{mes}_castellano.pdf')
-        
-        if os.path.exists(castellano_path) and not sobrescribir:
-            return False
-        
-        writer_castellano = PdfWriter()
-        writer_castellano.add_page(reader.pages[0])
-        
-        with open(castellano_path, 'wb') as output_file:
-            writer_castellano.write(output_file)
-        
-        # Crear PDF para euskera (segunda página)
-        euskera_path = os.path.join(comedor_dir, f'menu_{mes}_euskera.pdf')
-        
-        if os.path.exists(euskera_path) and not sobrescribir:
-            # Si castellano se creó pero euskera no por sobrescribir, eliminar castellano
-            if os.path.exists(castellano_path):
-                os.remove(castellano_path)
-            return False
-        
-        writer_euskera = PdfWriter()
-        writer_euskera.add_page(reader.pages[1])
-        
-        with open(euskera_path, 'wb') as output_file:
-            writer_euskera.write(output_file)
-        
-        return True
-        
-    except Exception as e:
-        return False
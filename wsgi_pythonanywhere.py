@@ -10,4 +10,8 @@ if path not in sys.path:
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apyma_site.settings.production')
 
 from django.core.wsgi import get_wsgi_application
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# /media/ se sirve antes de Django (ver usuarios/media_wsgi.py)
+from usuarios.media_wsgi import wrap_application
+application = wrap_application(application)